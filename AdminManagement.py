@@ -1,7 +1,7 @@
-import math
 from datetime import datetime, timezone
 from FinishSignUp import create_signup_invitation
 from SupabaseClient import _sb
+from Pagination import build_listing_query, fetch_page
 
 def get_pending_registration_requests(sb = None):
     """
@@ -34,7 +34,7 @@ def get_pending_registration_requests(sb = None):
             'requests': []
         }
 
-def get_all_registration_requests(page=1, per_page=20, search_term='', status_filter='', sb = None):
+def get_all_registration_requests(page=1, per_page=20, search_term='', status_filter='', sb = None, count='exact'):
     """
     Get all registration requests (pending, approved, rejected) for admin review with pagination.
     
@@ -43,6 +43,7 @@ def get_all_registration_requests(page=1, per_page=20, search_term='', status_fi
         per_page (int): Number of requests per page
         search_term (str): Search term for name or email
         status_filter (str): Filter by status ('Pending', 'Approved', 'Rejected', or empty for all)
+        count (str): Total count mode ('exact', 'planned', 'estimated' or 'none')
     
     Returns:
         dict: Response with success flag, list of requests, and pagination info
@@ -56,76 +57,23 @@ def get_all_registration_requests(page=1, per_page=20, search_term='', status_fi
         
         sb = sb or _sb()
         
-        # Start building the query
-        query = sb.table('registration_requests').select('''
-            *,
-            reviewer:ReviewedByUserID(Username, FirstName, LastName)
-        ''')
-        
-        # Apply search filter if provided
-        if search_term:
-            query = query.or_(
-                f'FirstName.ilike.%{search_term}%,'
-                f'LastName.ilike.%{search_term}%,'
-                f'Email.ilike.%{search_term}%'
-            )
-        
-        # Apply status filter if provided
-        if status_filter:
-            query = query.eq('Status', status_filter)
-        
-        # Get total count for pagination (before applying limit/offset)
-        count_query = sb.table('registration_requests').select('RequestID', count='exact')
-        
-        # Apply same filters to count query
-        if search_term:
-            count_query = count_query.or_(
-                f'FirstName.ilike.%{search_term}%,'
-                f'LastName.ilike.%{search_term}%,'
-                f'Email.ilike.%{search_term}%'
-            )
-        
-        if status_filter:
-            count_query = count_query.eq('Status', status_filter)
-        
-        # Execute count query
-        count_response = count_query.execute()
-        total_requests = count_response.count if hasattr(count_response, 'count') else len(count_response.data)
-        
-        # Calculate pagination
-        total_pages = math.ceil(total_requests / per_page) if total_requests > 0 else 1
-        offset = (page - 1) * per_page
-        
-        # Apply pagination and ordering
-        query = query.order('RequestDate', desc=True).range(offset, offset + per_page - 1)
-        
-        # Execute the main query
-        response = query.execute()
-        
-        # Pagination info
-        pagination = {
-            'current_page': page,
-            'per_page': per_page,
-            'total_requests': total_requests,
-            'total_pages': total_pages,
-            'has_prev': page > 1,
-            'has_next': page < total_pages,
-            'prev_page': page - 1 if page > 1 else None,
-            'next_page': page + 1 if page < total_pages else None
-        }
+        # One query returns both the page and the total count
+        query = build_listing_query(
+            sb, 'registration_requests',
+            '*, reviewer:ReviewedByUserID(Username, FirstName, LastName)',
+            search_term=search_term,
+            search_columns=('FirstName', 'LastName', 'Email'),
+            equals={'Status': status_filter},
+            count=count
+        )
+        rows, pagination = fetch_page(query, page, per_page, 'RequestDate', desc=True,
+                                      count=count, total_key='total_requests')
         
-        if response.data:
-            return {
-                'success': True,
-                'requests': response.data,
-                'pagination': pagination
-            }
-        else:
-            return {
-                'success': True,
-                'requests': [],
-                'pagination': pagination
-            }
+        return {
+            'success': True,
+            'requests': rows,
+            'pagination': pagination
+        }
             
     except Exception as e:
         return {
@@ -0,0 +1,141 @@
+"""
+AuditDelta.py
+
+Compact storage for audit row images. Instead of the full before and after
+rows, an event_logs row stores a delta: JSON-patch style operations on the
+record's top-level fields, each carrying the old value as well as the new one
+("old" is an extra member, which JSON patch readers ignore):
+
+    [{"op": "replace", "path": "/comment", "value": "new", "old": "was"}]
+
+Changed fields are all a change needs to be displayed. Full images are kept
+only on snapshot rows, which store the after image (aftervalue) next to the
+delta. The first event for a record in each process each month is a
+snapshot, and so is every AUDIT_SNAPSHOT_EVERY-th after that. Any row's full
+images are rebuilt on demand by reconstruct_images: start from the nearest
+earlier snapshot and apply the deltas in between. Because snapshots restart
+every month, archiving whole months never cuts a chain.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+AUDIT_SNAPSHOT_EVERY = int(os.environ.get('AUDIT_SNAPSHOT_EVERY', 20))
+# Records whose snapshot counters a process remembers
+_SNAPSHOT_TRACKED = 10000
+
+_since_snapshot = OrderedDict()
+_since_snapshot_lock = threading.Lock()
+
+
+def _pointer(key):
+    return '/' + str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _key(path):
+    return path[1:].replace('~1', '/').replace('~0', '~')
+
+
+def compute_delta(before, after):
+    """
+    Operations turning the before image into the after image (top-level fields).
+
+    Either image may be None (a creation or a deletion).
+    """
+    before = before or {}
+    after = after or {}
+    delta = []
+    for key, value in after.items():
+        if key not in before:
+            delta.append({'op': 'add', 'path': _pointer(key), 'value': value})
+        elif before[key] != value:
+            delta.append({'op': 'replace', 'path': _pointer(key), 'value': value, 'old': before[key]})
+    for key, value in before.items():
+        if key not in after:
+            delta.append({'op': 'remove', 'path': _pointer(key), 'old': value})
+    return delta
+
+
+def apply_delta(image, delta, reverse=False):
+    """Apply a delta to an image (reverse=True undoes it); returns a new dict."""
+    image = dict(image or {})
+    for op in delta or []:
+        key = _key(op['path'])
+        kind = op['op']
+        if reverse:
+            kind = {'add': 'remove', 'remove': 'add'}.get(kind, kind)
+            value = op.get('old')
+        else:
+            value = op.get('value')
+        if kind == 'remove':
+            image.pop(key, None)
+        else:
+            image[key] = value
+    return image
+
+
+def should_snapshot(tablename, recordid, now=None):
+    """Whether this process's next event for the record should carry a full image."""
+    month = (now or datetime.now(timezone.utc)).strftime('%Y-%m')
+    key = (tablename, recordid, month)
+    with _since_snapshot_lock:
+        count = _since_snapshot.pop(key, None)
+        snapshot = count is None or count + 1 >= AUDIT_SNAPSHOT_EVERY
+        _since_snapshot[key] = 0 if snapshot else count + 1
+        while len(_since_snapshot) > _SNAPSHOT_TRACKED:
+            _since_snapshot.popitem(last=False)
+    return snapshot
+
+
+def reset_snapshot_counters():
+    """Forget every record's counter, so each record's next event is a snapshot."""
+    with _since_snapshot_lock:
+        _since_snapshot.clear()
+
+
+def _load(value):
+    # Images have been stored as JSON text inside the jsonb columns
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def event_delta(log):
+    """The delta of an event_logs row; rows written before deltas are diffed from their images."""
+    if log.get('delta') is not None:
+        return log['delta']
+    return compute_delta(_load(log.get('beforevalue')), _load(log.get('aftervalue')))
+
+
+def reconstruct_images(log, chain=()):
+    """
+    Full before and after images of an event.
+
+    Args:
+        log (dict): The event_logs row
+        chain (list): For a delta-only row, the record's rows from its nearest
+            earlier snapshot up to (not including) the event, in the order they
+            happened: (timestamp, logid)
+
+    Returns:
+        dict: before, after, and partial (True when no snapshot was found and
+              only the changed fields are known)
+    """
+    delta = event_delta(log)
+    stored_before = _load(log.get('beforevalue'))
+    stored_after = _load(log.get('aftervalue'))
+    if stored_after is not None:
+        before = stored_before
+        if before is None and log.get('actiontype') != 'INSERT':
+            before = apply_delta(stored_after, delta, reverse=True)
+        return {'before': before, 'after': stored_after, 'partial': False}
+    if stored_before is not None:
+        return {'before': stored_before, 'after': None, 'partial': False}
+
+    partial = not chain or _load(chain[0].get('aftervalue')) is None
+    image = {} if partial else _load(chain[0]['aftervalue'])
+    for row in chain if partial else chain[1:]:
+        image = apply_delta(image, event_delta(row))
+    after = apply_delta(image, delta)
+    return {'before': apply_delta(after, delta, reverse=True), 'after': after, 'partial': partial}
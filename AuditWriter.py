@@ -0,0 +1,278 @@
+"""
+AuditWriter.py
+
+Audit events (event_logs rows) are written off the request path. write()
+appends the row to a local spool file and an in-memory queue and returns at
+once; a background thread bulk-inserts the queue in batches of up to
+AUDIT_BATCH_SIZE rows, at least every AUDIT_FLUSH_SECONDS.
+
+Nothing is dropped when the database is unavailable: failed batches are
+retried with backoff, and rows stay in the spool until they are written. The
+spool is per process (audit-<pid>.jsonl in AUDIT_SPOOL_DIR, by default
+instance/audit-spool next to the app) and is emptied whenever everything
+queued has been written. A process that starts up
+replays any spool left behind by a process that died, including its own
+previous run. Under sustained load the queue may never empty, so the spool is
+also compacted as rows are written: once written rows make up at least half of
+it, it is replaced by a file holding only the rows still queued. Delivery is at
+least once: a crash between an insert and the spool being compacted can write
+a row twice. A row the database refuses
+outright (a constraint or data error) can never be written; it is set aside in
+rejected.jsonl in the spool directory rather than holding up the rows behind it.
+
+The queue is flushed when the process exits (atexit).
+"""
+
+import atexit
+import glob
+import json
+import os
+import re
+import threading
+from collections import deque
+from SupabaseClient import _sb
+
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+AUDIT_FLUSH_SECONDS = float(os.environ.get('AUDIT_FLUSH_SECONDS', 1.0))
+# Must survive restarts: point it at persistent storage in production
+AUDIT_SPOOL_DIR = os.environ.get('AUDIT_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'audit-spool'))
+
+_SPOOL_NAME_RE = re.compile(r'audit-(\d+)\.jsonl$')
+MAX_RETRY_SECONDS = 30
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _is_bad_row(error):
+    # Data (22xxx) and integrity (23xxx) errors: the row itself is invalid
+    code = str(getattr(error, 'code', '') or '')
+    return code.startswith('22') or code.startswith('23')
+
+
+class AuditWriter:
+    def __init__(self, sb=None, table='event_logs', spool_dir=AUDIT_SPOOL_DIR,
+                 batch_size=AUDIT_BATCH_SIZE, flush_seconds=AUDIT_FLUSH_SECONDS):
+        """
+        Initialize the writer and start its background thread.
+
+        Args:
+            sb: Client for rows written without one (and replayed rows); defaults
+                to the shared per-process client
+            table (str): Table the rows are inserted into
+            spool_dir (str): Directory for the spool file; None keeps rows in memory only
+            batch_size (int): Most rows per insert
+            flush_seconds (float): Longest a row waits for its batch to fill
+        """
+        self._supabase = sb
+        self.table = table
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = flush_seconds
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._flush_requested = False
+        self._closed = False
+        self._spool = None
+        # Rows written since the spool was last emptied or compacted
+        self._spool_written = 0
+
+        recovered = []
+        self.rejected_path = None
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            self.spool_path = os.path.join(spool_dir, f'audit-{os.getpid()}.jsonl')
+            self.rejected_path = os.path.join(spool_dir, 'rejected.jsonl')
+            recovered = self._recover(spool_dir)
+            self._spool = open(self.spool_path, 'a', encoding='utf-8')
+        for row in recovered:
+            self.write(row)
+        if recovered:
+            print(f"Audit writer: replaying {len(recovered)} spooled events")
+
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def supabase(self):
+        return self._supabase or _sb()
+
+    def _recover(self, spool_dir):
+        """Take over the spools of processes that are gone and return their rows."""
+        rows = []
+        for path in glob.glob(os.path.join(spool_dir, 'audit-*.jsonl')):
+            match = _SPOOL_NAME_RE.search(path)
+            pid = int(match.group(1)) if match else None
+            if pid is None or (pid != os.getpid() and _pid_alive(pid)):
+                continue
+            # Renaming claims the file, so two new processes can't both replay it
+            claimed = f'{path}.{os.getpid()}.recovering'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        # A line cut short by the crash
+                        continue
+            os.remove(claimed)
+        return rows
+
+    def write(self, row, sb=None):
+        """
+        Queue a row for the next batch.
+
+        Args:
+            row (dict): The row, complete (capture request context before calling)
+            sb: Client to insert it with; defaults to the writer's
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('AuditWriter is closed')
+            if self._spool:
+                self._spool.write(json.dumps(row, default=str) + '\n')
+                self._spool.flush()
+            self._queue.append((sb, row))
+            self._pending += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _insert(self, batch):
+        """Insert a batch, one request per client; return the entries to retry."""
+        groups = {}
+        for entry in batch:
+            groups.setdefault(id(entry[0]), []).append(entry)
+        failed = []
+        for entries in groups.values():
+            client = entries[0][0] or self.supabase
+            try:
+                client.table(self.table).insert([row for _, row in entries]).execute()
+            except Exception as e:
+                if not _is_bad_row(e):
+                    print(f"Audit writer: failed to write {len(entries)} events: {e}")
+                    failed.extend(entries)
+                elif len(entries) > 1:
+                    # Find the rows the database refuses, so they don't hold up the rest
+                    failed.extend(self._insert(entries[:len(entries) // 2]))
+                    failed.extend(self._insert(entries[len(entries) // 2:]))
+                else:
+                    self._reject(entries[0][1], e)
+        return failed
+
+    def _reject(self, row, error):
+        # Retrying can't help; keep the row for a person to look at
+        print(f"Audit writer: event rejected by the database ({error}): {row}")
+        if self.rejected_path:
+            with open(self.rejected_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'row': row, 'error': str(error)}, default=str) + '\n')
+
+    def _run(self):
+        retry_seconds = 0
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                if retry_seconds:
+                    # Back off, unless we're shutting down
+                    self._cond.wait_for(lambda: self._closed, retry_seconds)
+                elif len(self._queue) < self.batch_size and not (self._closed or self._flush_requested):
+                    self._cond.wait_for(lambda: len(self._queue) >= self.batch_size or self._closed
+                                        or self._flush_requested, self.flush_seconds)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                closing = self._closed
+
+            failed = self._insert(batch)
+
+            with self._cond:
+                self._pending -= len(batch) - len(failed)
+                if failed:
+                    # Back to the front, in order; they are still in the spool
+                    self._queue.extendleft(reversed(failed))
+                    retry_seconds = min(max(retry_seconds * 2, 1), MAX_RETRY_SECONDS)
+                    if closing:
+                        return
+                else:
+                    retry_seconds = 0
+                self._spool_written += len(batch) - len(failed)
+                if self._spool and self._spool_written:
+                    if self._pending == 0:
+                        self._spool.seek(0)
+                        self._spool.truncate()
+                        self._spool_written = 0
+                    elif self._spool_written >= self._pending:
+                        self._compact_spool()
+                self._cond.notify_all()
+
+    def _compact_spool(self):
+        # Called with the lock held and no batch in flight, so the queue is
+        # exactly the unwritten rows. The rename is atomic: a crash leaves
+        # either the old spool or the new one.
+        compacted = f'{self.spool_path}.compact'
+        with open(compacted, 'w', encoding='utf-8') as f:
+            for _, row in self._queue:
+                f.write(json.dumps(row, default=str) + '\n')
+        self._spool.close()
+        os.replace(compacted, self.spool_path)
+        self._spool = open(self.spool_path, 'a', encoding='utf-8')
+        self._spool_written = 0
+
+    def pending(self):
+        """Rows queued but not yet written."""
+        with self._cond:
+            return self._pending
+
+    def flush(self, timeout=None):
+        """
+        Write everything queued so far without waiting for batches to fill.
+
+        Returns:
+            bool: True when nothing is left to write
+        """
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: self._pending == 0 or not self._thread.is_alive(), timeout)
+            self._flush_requested = False
+            return done and self._pending == 0
+
+    def close(self, timeout=10):
+        """Flush and stop the thread; anything unwritten stays in the spool for the next start."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            if self._spool:
+                self._spool.close()
+                self._spool = None
+            if self._pending:
+                print(f"Audit writer: {self._pending} events left unwritten")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """Return the per-process AuditWriter, creating it (and its exit flush) on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter()
+                atexit.register(_writer.close)
+    return _writer
@@ -3,6 +3,9 @@ from datetime import datetime, timezone
 import json
 import re
 from SupabaseClient import _sb, get_current_user
+from AuditWriter import get_audit_writer
+from AuditDelta import compute_delta, should_snapshot
+from Pagination import build_listing_query, fetch_page, fetch_keyset_page
 
 ACCOUNT_NUMBER_RE = re.compile(r'^\d+$')  # only digits, leading zeros allowed
 
@@ -24,20 +27,27 @@ def _parse_money(value) -> Decimal:
 
 def _log_event(sb, tablename, recordid, actiontype, before, after):
     try:
-        # event_logs schema (DBSchema.sql) expects: userid, timestamp, actiontype, tablename, recordid, beforevalue, aftervalue
+        # event_logs schema (DBSchema.sql) expects: userid, timestamp, actiontype, tablename, recordid, beforevalue, aftervalue, delta
+        # Changes are stored as a delta; only snapshots (and creations) keep the
+        # full after image, and deletions the before image (see AuditDelta.py)
+        recordid = int(recordid) if recordid is not None else None
+        snapshot = should_snapshot(tablename, recordid) or actiontype == 'INSERT'
         payload = {
             'userid': get_current_user(),
             'timestamp': datetime.now(timezone.utc).isoformat(),
             'actiontype': actiontype,
             'tablename': tablename,
-            'recordid': int(recordid) if recordid is not None else None,
-            'beforevalue': json.dumps(before) if before is not None else None,
-            'aftervalue': json.dumps(after) if after is not None else None
+            'recordid': recordid,
+            'beforevalue': json.dumps(before) if before is not None and after is None else None,
+            'aftervalue': json.dumps(after) if after is not None and snapshot else None,
+            'delta': compute_delta(before, after) if before is not None else None
         }
-        sb.table('event_logs').insert(payload).execute()
-    except Exception:
-        # best-effort logging; do not fail primary operation
-        pass
+        # Written in batches by the background audit writer; the user is captured
+        # here, while the request's context is still current
+        get_audit_writer().write(payload, sb=sb)
+    except Exception as e:
+        # do not fail primary operation, but say so
+        print(f"Failed to queue audit event for {tablename} {recordid}: {e}")
 
 
 def _category_prefix_rules():
@@ -226,64 +236,35 @@ def deactivate_account(account_id, sb=None):
     except Exception as e:
         return {'success': False, 'message': str(e)}
 
-def list_accounts(page=1, per_page=50, search_term='', filters=None, sb=None):
+def list_accounts(page=1, per_page=50, search_term='', filters=None, sb=None, count='exact', cursor=None):
     sb = sb or _sb()
     filters = filters or {}
-    query = sb.table('chart_of_accounts').select('*')
-
-    if search_term:
-        query = query.or_(
-            f'accountname.ilike.%{search_term}%,accountnumber.ilike.%{search_term}%'
-        )
-
-    # apply filters
-    if filters.get('category'):
-        query = query.eq('category', filters['category'])
-    if filters.get('subcategory'):
-        query = query.eq('subcategory', filters['subcategory'])
-    if filters.get('is_active') is not None:
-        query = query.eq('isactive', filters['is_active'])
-
-    # count
-    count_query = sb.table('chart_of_accounts').select('accountid', count='exact')
-    if search_term:
-        count_query = count_query.or_(
-            f'accountname.ilike.%{search_term}%,accountnumber.ilike.%{search_term}%'
-        )
-    if filters.get('category'):
-        count_query = count_query.eq('category', filters['category'])
-    if filters.get('subcategory'):
-        count_query = count_query.eq('subcategory', filters['subcategory'])
-
-    count_resp = count_query.execute()
-    total = count_resp.count if hasattr(count_resp, 'count') else (len(count_resp.data) if count_resp.data else 0)
-
-    total_pages = (total // per_page) + (1 if total % per_page else 0) if total > 0 else 1
-    offset = (page - 1) * per_page
-
-    query = query.order('accountnumber', desc=False).range(offset, offset + per_page - 1)
-    resp = query.execute()
-    accounts = resp.data or []
-
-    # Fetch usernames for all creators
-    user_ids = list(set([a.get('createdbyuserid') for a in accounts if a.get('createdbyuserid')]))
-    username_map = {}
-    
-    if user_ids:
-        try:
-            # Note: PostgreSQL column names are case-insensitive, but the response will use lowercase
-            users_resp = sb.table('users').select('UserID, Username').in_('UserID', user_ids).execute()
-            if users_resp.data:
-                # The response data will have lowercase keys from Supabase
-                username_map = {u.get('userid') or u.get('UserID'): u.get('username') or u.get('Username') for u in users_resp.data}
-        except Exception as e:
-            print(f"Error fetching usernames: {e}")
+
+    # One query returns the page, the total count and each creator's username
+    query = build_listing_query(
+        sb, 'chart_of_accounts',
+        '*, creator:createdbyuserid(Username)',
+        search_term=search_term,
+        search_columns=('accountname', 'accountnumber'),
+        equals={
+            'category': filters.get('category'),
+            'subcategory': filters.get('subcategory'),
+            'isactive': filters.get('is_active'),
+        },
+        count=count
+    )
+    if cursor is None:
+        accounts, pagination = fetch_page(query, page, per_page, 'accountnumber', desc=False,
+                                          count=count, total_key='total_accounts')
+    else:
+        accounts, pagination = fetch_keyset_page(query, per_page, 'accountnumber', 'accountid',
+                                                 cursor=cursor, count=count, total_key='total_accounts')
 
     # format money fields for display and add username
     for a in accounts:
-        # Add username from the map
-        creator_id = a.get('createdbyuserid')
-        a['createdby_username'] = username_map.get(creator_id, '')
+        # Flatten the embedded creator into the field the UI reads
+        creator = a.pop('creator', None) or {}
+        a['createdby_username'] = creator.get('Username') or creator.get('username') or ''
         
         for k in ['initialbalance']:
             if a.get(k) is not None:
@@ -292,17 +273,6 @@ def list_accounts(page=1, per_page=50, search_term='', filters=None, sb=None):
                 except Exception:
                     a[k+'_formatted'] = a.get(k)
 
-    pagination = {
-        'current_page': page,
-        'per_page': per_page,
-        'total_accounts': total,
-        'total_pages': total_pages,
-        'has_prev': page > 1,
-        'has_next': page < total_pages,
-        'prev_page': page - 1 if page > 1 else None,
-        'next_page': page + 1 if page < total_pages else None
-    }
-
     return {'success': True, 'accounts': accounts, 'pagination': pagination}
 
 
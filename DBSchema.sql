@@ -28,6 +28,22 @@ CREATE TABLE public.cron_job_logs (
   notes text,
   CONSTRAINT cron_job_logs_pkey PRIMARY KEY (id)
 );
+CREATE TABLE public.email_outbox (
+  id integer GENERATED ALWAYS AS IDENTITY NOT NULL,
+  sender_email text NOT NULL,
+  sender_name text NOT NULL,
+  receiver_email text NOT NULL,
+  subject_line text NOT NULL,
+  body text NOT NULL,
+  status text NOT NULL DEFAULT 'pending'::text CHECK (status = ANY (ARRAY['pending'::text, 'sending'::text, 'sent'::text, 'dead'::text])),
+  attempts integer NOT NULL DEFAULT 0,
+  next_attempt_at timestamp with time zone NOT NULL DEFAULT now(),
+  locked_at timestamp with time zone,
+  last_error text,
+  created_at timestamp with time zone NOT NULL DEFAULT now(),
+  sent_at timestamp with time zone,
+  CONSTRAINT email_outbox_pkey PRIMARY KEY (id)
+);
 CREATE TABLE public.event_logs (
   logid integer GENERATED ALWAYS AS IDENTITY NOT NULL,
   userid integer NOT NULL,
@@ -37,9 +53,26 @@ CREATE TABLE public.event_logs (
   recordid integer NOT NULL,
   beforevalue jsonb,
   aftervalue jsonb,
+  delta jsonb,
   CONSTRAINT event_logs_pkey PRIMARY KEY (logid),
   CONSTRAINT fk_eventlogs_user FOREIGN KEY (userid) REFERENCES public.users(UserID)
 );
+CREATE INDEX event_logs_record_idx ON public.event_logs (tablename, recordid, timestamp DESC, logid DESC);
+CREATE TABLE public.job_checkpoints (
+  job_name text NOT NULL,
+  run_key text NOT NULL,
+  position text,
+  status text NOT NULL DEFAULT 'running'::text CHECK (status = ANY (ARRAY['running'::text, 'complete'::text])),
+  updated_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT job_checkpoints_pkey PRIMARY KEY (job_name)
+);
+CREATE TABLE public.password_expiry_notices (
+  UserID integer NOT NULL,
+  PasswordExpiryDate timestamp with time zone NOT NULL,
+  SentAt timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT password_expiry_notices_pkey PRIMARY KEY (UserID, PasswordExpiryDate),
+  CONSTRAINT fk_password_expiry_notices_user FOREIGN KEY (UserID) REFERENCES public.users(UserID)
+);
 CREATE TABLE public.password_history (
   PasswordHistoryID integer GENERATED ALWAYS AS IDENTITY NOT NULL,
   UserID integer NOT NULL,
@@ -68,6 +101,17 @@ CREATE TABLE public.roles (
   RoleName character varying NOT NULL UNIQUE,
   CONSTRAINT roles_pkey PRIMARY KEY (RoleID)
 );
+CREATE TABLE public.scheduled_jobs (
+  job_name text NOT NULL,
+  schedule text NOT NULL,
+  next_run_at timestamp with time zone NOT NULL,
+  locked_by text,
+  locked_until timestamp with time zone NOT NULL DEFAULT now(),
+  last_run_at timestamp with time zone,
+  last_status text,
+  last_duration_ms integer,
+  CONSTRAINT scheduled_jobs_pkey PRIMARY KEY (job_name)
+);
 CREATE TABLE public.security_questions (
   QuestionID integer GENERATED ALWAYS AS IDENTITY NOT NULL,
   QuestionText character varying NOT NULL UNIQUE,
@@ -101,6 +145,7 @@ CREATE TABLE public.users (
   DOB date,
   Address text,
   ProfilePictureURL text,
+  ProfilePictureVariants jsonb,
   RoleID integer NOT NULL DEFAULT 3,
   IsActive boolean NOT NULL DEFAULT true,
   IsSuspended boolean NOT NULL DEFAULT false,
@@ -0,0 +1,119 @@
+"""
+EmailDispatcher.py
+
+Concurrent, rate-limited sending for emails that can't share one SendGrid
+request. A small thread pool overlaps the HTTP round trips, and a token bucket
+keeps the whole process under EMAIL_RATE_PER_SECOND requests per second (with
+bursts up to EMAIL_RATE_BURST), so a large send doesn't trip SendGrid's rate
+limits. Every dispatch reports how many messages went out and how fast.
+
+Only call dispatch() from outside the pool: a send function that dispatched
+again could wait forever on its own workers.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EMAIL_DISPATCH_WORKERS = int(os.environ.get('EMAIL_DISPATCH_WORKERS', 4))
+EMAIL_RATE_PER_SECOND = float(os.environ.get('EMAIL_RATE_PER_SECOND', 10))
+EMAIL_RATE_BURST = int(os.environ.get('EMAIL_RATE_BURST', 10))
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, `burst` at once."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmailDispatcher:
+    def __init__(self, max_workers=EMAIL_DISPATCH_WORKERS, rate_per_second=EMAIL_RATE_PER_SECOND,
+                 burst=EMAIL_RATE_BURST):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            max_workers (int): Sends in flight at once
+            rate_per_second (float): Most sends started per second
+            burst (int): Sends that may start back to back after an idle spell
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix='email-dispatch')
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._lock = threading.Lock()
+        self._totals = {'sent': 0, 'failed': 0}
+
+    def _send(self, send, item):
+        self._bucket.acquire()
+        try:
+            result = send(item)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        with self._lock:
+            self._totals['sent' if result.get('success') else 'failed'] += 1
+        return result
+
+    def dispatch(self, send, items):
+        """
+        Send every item concurrently, within the rate limit.
+
+        Args:
+            send: Callable taking one item and returning a dict with 'success'
+                (exceptions become failed results)
+            items (list): What to send
+
+        Returns:
+            tuple: (results in the order of items, metrics dict with messages,
+                    failed, seconds and per_second)
+        """
+        started = time.perf_counter()
+        futures = [self._pool.submit(self._send, send, item) for item in items]
+        results = [future.result() for future in futures]
+        seconds = time.perf_counter() - started
+        metrics = {
+            'messages': len(results),
+            'failed': sum(1 for result in results if not result.get('success')),
+            'seconds': round(seconds, 3),
+            'per_second': round(len(results) / seconds, 1) if seconds > 0 else None
+        }
+        return results, metrics
+
+    def stats(self):
+        """Messages sent and failed since this dispatcher was created."""
+        with self._lock:
+            return dict(self._totals)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Return the per-process EmailDispatcher, creating it on first use."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = EmailDispatcher()
+    return _dispatcher
@@ -0,0 +1,262 @@
+"""
+EmailOutbox.py
+
+Durable email delivery. Request handlers call enqueue_email(), which only
+inserts a row into email_outbox (see email_outbox.sql), so an approval or
+registration never waits on SendGrid and never fails because SendGrid is down.
+
+A separate worker process drains the outbox:
+
+    python EmailOutbox.py          (the Procfile "worker:" entry)
+
+Failed sends are retried with exponential backoff; after EMAIL_MAX_ATTEMPTS
+tries a message is marked 'dead' and kept, with its last error, for
+inspection. Delivery goes through a transport, a callable taking an outbox row
+and returning a send_email-style result dict. A transport may also have a
+send_many(messages) attribute returning one result per message; the worker uses
+it to send identical messages (e.g. one notice to every administrator) in a
+single request. EMAIL_TRANSPORT=log swaps SendGrid for a transport that only
+prints, for local runs.
+"""
+
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from SupabaseClient import _sb
+from EmailDispatcher import get_dispatcher
+
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 6))
+EMAIL_RETRY_BASE_SECONDS = float(os.environ.get('EMAIL_RETRY_BASE_SECONDS', 30))
+EMAIL_RETRY_MAX_SECONDS = float(os.environ.get('EMAIL_RETRY_MAX_SECONDS', 3600))
+# A message claimed longer ago than this belongs to a worker that died mid-send
+EMAIL_LEASE_SECONDS = float(os.environ.get('EMAIL_LEASE_SECONDS', 300))
+EMAIL_POLL_SECONDS = float(os.environ.get('EMAIL_POLL_SECONDS', 5))
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 50))
+
+MESSAGE_FIELDS = ('sender_email', 'sender_name', 'receiver_email', 'subject_line', 'body')
+
+
+def _now_utc():
+    return datetime.now(timezone.utc)
+
+
+def enqueue_emails(messages, sb=None):
+    """
+    Queue several emails for delivery in one insert.
+
+    Args:
+        messages (list): dicts with sender_email, sender_name, receiver_email,
+            subject_line and body (the arguments of EmailUser.send_email)
+
+    Returns:
+        dict: success flag, number queued and the outbox row IDs
+    """
+    try:
+        sb = sb or _sb()
+        if not messages:
+            return {'success': True, 'queued': 0, 'ids': [], 'message': 'Nothing to send'}
+        rows = [{field: message[field] for field in MESSAGE_FIELDS} for message in messages]
+        response = sb.table('email_outbox').insert(rows).execute()
+        if not response.data:
+            return {'success': False, 'error': 'Failed to queue email'}
+        return {
+            'success': True,
+            'queued': len(response.data),
+            'ids': [row['id'] for row in response.data],
+            'message': 'Email queued for delivery'
+        }
+    except Exception as e:
+        return {'success': False, 'error': f'Error queueing email: {str(e)}'}
+
+
+def enqueue_email(sender_email, sender_name, receiver_email, subject_line, body, sb=None):
+    """
+    Queue one email for delivery by the outbox worker.
+
+    Takes the same arguments as EmailUser.send_email and returns as soon as
+    the message is stored.
+
+    Returns:
+        dict: success flag, message and the outbox row ID
+    """
+    result = enqueue_emails([{
+        'sender_email': sender_email,
+        'sender_name': sender_name,
+        'receiver_email': receiver_email,
+        'subject_line': subject_line,
+        'body': body
+    }], sb=sb)
+    if result.get('success'):
+        result['id'] = result['ids'][0]
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+def sendgrid_transport(message):
+    """Deliver an outbox row through SendGrid."""
+    from EmailUser import send_email
+    return send_email(**{field: message[field] for field in MESSAGE_FIELDS})
+
+
+def _sendgrid_send_many(messages):
+    """Deliver outbox rows sharing sender, subject and body as batched SendGrid requests."""
+    from EmailUser import send_bulk_email
+    first = messages[0]
+    result = send_bulk_email(
+        sender_email=first['sender_email'],
+        sender_name=first['sender_name'],
+        recipients=[{'email': message['receiver_email']} for message in messages],
+        subject_line=first['subject_line'],
+        body=first['body']
+    )
+    return result['results']
+
+
+sendgrid_transport.send_many = _sendgrid_send_many
+
+
+def log_transport(message):
+    """Print an outbox row instead of sending it (local development)."""
+    print(f"[email] to={message['receiver_email']} subject={message['subject_line']!r}")
+    return {'success': True, 'message': 'Logged'}
+
+
+TRANSPORTS = {
+    'sendgrid': sendgrid_transport,
+    'log': log_transport,
+}
+
+
+def get_transport():
+    """The transport selected by EMAIL_TRANSPORT (default sendgrid)."""
+    name = os.environ.get('EMAIL_TRANSPORT', 'sendgrid').lower()
+    if name not in TRANSPORTS:
+        raise RuntimeError(f"Unknown EMAIL_TRANSPORT: {name}")
+    return TRANSPORTS[name]
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def retry_delay(attempts):
+    """Seconds to wait before retry number `attempts` (1-based), with +/-20% jitter."""
+    delay = min(EMAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), EMAIL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _release_stale_claims(sb, now):
+    # Hand messages held by a crashed worker back to the queue
+    cutoff = (now - timedelta(seconds=EMAIL_LEASE_SECONDS)).isoformat()
+    sb.table('email_outbox').update({'status': 'pending', 'locked_at': None}) \
+        .eq('status', 'sending').lt('locked_at', cutoff).execute()
+
+
+def deliver_pending(transport=None, batch_size=None, sb=None):
+    """
+    Send one batch of due messages.
+
+    Due messages are claimed with a single conditional update (pending ->
+    sending), so several workers can poll the same outbox without sending a
+    message twice.
+
+    Args:
+        transport: Callable taking an outbox row; defaults to get_transport()
+        batch_size (int): Most messages to claim in this pass
+
+    Returns:
+        dict: Counts of messages sent, rescheduled for retry and marked dead
+    """
+    sb = sb or _sb()
+    transport = transport or get_transport()
+    batch_size = batch_size or EMAIL_BATCH_SIZE
+    now = _now_utc()
+    summary = {'sent': 0, 'retried': 0, 'dead': 0}
+
+    _release_stale_claims(sb, now)
+
+    due = sb.table('email_outbox').select('id').eq('status', 'pending') \
+        .lte('next_attempt_at', now.isoformat()).order('next_attempt_at').limit(batch_size).execute()
+    ids = [row['id'] for row in due.data or []]
+    if not ids:
+        return summary
+
+    claimed = sb.table('email_outbox').update({'status': 'sending', 'locked_at': now.isoformat()}) \
+        .in_('id', ids).eq('status', 'pending').execute()
+    messages = claimed.data or []
+
+    for message, result in zip(messages, _send_all(transport, messages)):
+        attempts = (message.get('attempts') or 0) + 1
+        if result.get('success'):
+            update = {'status': 'sent', 'attempts': attempts, 'sent_at': _now_utc().isoformat(),
+                      'locked_at': None, 'last_error': None}
+            summary['sent'] += 1
+        elif attempts >= EMAIL_MAX_ATTEMPTS:
+            update = {'status': 'dead', 'attempts': attempts, 'locked_at': None,
+                      'last_error': str(result.get('error', 'Unknown error'))}
+            summary['dead'] += 1
+            print(f"Email {message['id']} to {message['receiver_email']} failed {attempts} times; giving up")
+        else:
+            next_attempt = _now_utc() + timedelta(seconds=retry_delay(attempts))
+            update = {'status': 'pending', 'attempts': attempts, 'locked_at': None,
+                      'next_attempt_at': next_attempt.isoformat(),
+                      'last_error': str(result.get('error', 'Unknown error'))}
+            summary['retried'] += 1
+
+        sb.table('email_outbox').update(update).eq('id', message['id']).execute()
+
+    return summary
+
+
+def _send_all(transport, messages):
+    """Send claimed messages, batching identical ones when the transport can; results in order."""
+    results = {}
+    send_many = getattr(transport, 'send_many', None)
+    if send_many:
+        groups = {}
+        for message in messages:
+            key = (message['sender_email'], message['sender_name'], message['subject_line'], message['body'])
+            groups.setdefault(key, []).append(message)
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+            try:
+                group_results = send_many(group)
+            except Exception as e:
+                group_results = [{'success': False, 'error': str(e)}] * len(group)
+            for message, result in zip(group, group_results):
+                results[message['id']] = result
+
+    # The rest go out one request each, concurrently within the rate limit
+    singles = [message for message in messages if message['id'] not in results]
+    if singles:
+        single_results, metrics = get_dispatcher().dispatch(transport, singles)
+        results.update(zip((message['id'] for message in singles), single_results))
+        print(f"Email outbox: {metrics}")
+    return [results[message['id']] for message in messages]
+
+
+def run_worker(transport=None, poll_seconds=None, sb=None):
+    """Deliver outbox messages until interrupted, polling when the queue is idle."""
+    poll_seconds = EMAIL_POLL_SECONDS if poll_seconds is None else poll_seconds
+    print("Email outbox worker started")
+    while True:
+        try:
+            summary = deliver_pending(transport=transport, sb=sb)
+        except Exception as e:
+            print(f"Email outbox worker error: {e}")
+            summary = None
+        # Keep draining while there is work; otherwise wait for new messages
+        if not summary or not any(summary.values()):
+            time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    try:
+        run_worker()
+    except KeyboardInterrupt:
+        pass
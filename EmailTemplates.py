@@ -0,0 +1,82 @@
+"""
+EmailTemplates.py
+
+HTML bodies for outgoing email, kept as Jinja templates in templates/email/.
+Styles are written inline in the template source, so nothing is inlined per
+send.
+
+The environment is built once per process and compiled templates are cached
+(auto_reload is off), so rendering never re-reads or re-parses a file. For
+sends to many recipients, email_shell() renders a template once with SendGrid
+substitution tags (-first_name-) in place of the per-recipient fields and
+caches the result; each recipient then only contributes its substitutions().
+"""
+
+import os
+import threading
+from functools import lru_cache
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import escape
+
+EMAIL_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates', 'email')
+
+_env = None
+_env_lock = threading.Lock()
+
+
+def _get_env():
+    global _env
+    if _env is None:
+        with _env_lock:
+            if _env is None:
+                _env = Environment(
+                    loader=FileSystemLoader(EMAIL_TEMPLATES_DIR),
+                    autoescape=select_autoescape(['html']),
+                    auto_reload=False,
+                    cache_size=-1,
+                )
+    return _env
+
+
+def render_email(name, **context):
+    """
+    Render an email template for a single recipient.
+
+    Args:
+        name (str): Template file in templates/email/, e.g. 'new_user_admin.html'
+        **context: Template variables (HTML-escaped on output)
+
+    Returns:
+        str: The email body
+    """
+    return _get_env().get_template(name).render(**context)
+
+
+def substitution_tag(field):
+    """SendGrid substitution tag for a per-recipient field."""
+    return f'-{field}-'
+
+
+@lru_cache(maxsize=None)
+def email_shell(name, fields):
+    """
+    Render a template once with substitution tags for its per-recipient fields.
+
+    Args:
+        name (str): Template file in templates/email/
+        fields (tuple): Names of the per-recipient variables
+
+    Returns:
+        str: The shared body; pair it with substitutions() for each recipient
+    """
+    return render_email(name, **{field: substitution_tag(field) for field in fields})
+
+
+def substitutions(values):
+    """
+    SendGrid substitutions for one recipient of an email_shell() body.
+
+    Values are HTML-escaped here, as render_email would, since SendGrid
+    inserts them verbatim.
+    """
+    return {substitution_tag(field): str(escape(value)) for field, value in values.items()}
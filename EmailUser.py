@@ -1,9 +1,47 @@
 # EmailUser.py
 
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import httpx
+from sendgrid.helpers.mail import Mail, Personalization, To, Substitution
 from SupabaseClient import _sb
+from EmailOutbox import enqueue_emails
+from EmailTemplates import render_email, email_shell, substitutions
+from EmailDispatcher import get_dispatcher
+from JobCheckpoints import load_checkpoint, save_checkpoint
+
+SENDGRID_MAIL_SEND_URL = 'https://api.sendgrid.com/v3/mail/send'
+
+# One keep-alive HTTP client per process for SendGrid, shared by every send
+# (and every dispatcher thread) instead of a new connection per message
+_http = None
+_http_lock = threading.Lock()
+
+def _sendgrid_http():
+    global _http
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                _http = httpx.Client(timeout=30)
+    return _http
+
+def _post_mail(message, api_key):
+    """
+    POST a Mail to SendGrid's v3 API on the shared connection pool
+
+    Raises:
+        RuntimeError: If SendGrid doesn't accept the request
+    """
+    response = _sendgrid_http().post(
+        SENDGRID_MAIL_SEND_URL,
+        json=message.get(),
+        headers={'Authorization': f'Bearer {api_key}'}
+    )
+    if response.status_code >= 300:
+        raise RuntimeError(f'SendGrid returned status {response.status_code}: {response.text}')
+    return response
 
 def send_email(sender_email, sender_name, receiver_email, subject_line, body):
     """
@@ -47,9 +85,7 @@ def send_email(sender_email, sender_name, receiver_email, subject_line, body):
                 'error': 'SENDGRID_API_KEY not found in environment variables'
             }
         
-        # Initialize SendGrid client and send email
-        sg = SendGridAPIClient(api_key)
-        response = sg.send(message)
+        response = _post_mail(message, api_key)
         
         return {
             'success': True,
@@ -63,6 +99,73 @@ def send_email(sender_email, sender_name, receiver_email, subject_line, body):
             'error': str(e)
         }
 
+# SendGrid accepts at most this many personalizations (recipients) per request
+MAX_PERSONALIZATIONS = 1000
+
+def send_bulk_email(sender_email, sender_name, recipients, subject_line, body, batch_size=MAX_PERSONALIZATIONS):
+    """
+    Send one email to many recipients with as few SendGrid requests as possible
+    
+    Each request carries up to batch_size personalizations. Every recipient gets
+    their own personalization, so nobody sees anyone else's address, and its
+    substitutions replace tags such as -first_name- in the subject and body.
+    Requests go out concurrently through the rate-limited EmailDispatcher.
+    
+    Args:
+        sender_email (str): The email address to set as reply-to
+        sender_name (str): The name of the sender
+        recipients (list): dicts with 'email' and optional 'substitutions'
+            ({tag: value})
+        subject_line (str): The original subject line
+        body (str): The email body content, with substitution tags
+        batch_size (int): Recipients per request (at most MAX_PERSONALIZATIONS)
+    
+    Returns:
+        dict: success flag, number of requests made, dispatcher metrics and a
+              per-recipient list of {'email', 'success', 'error'} in the order given
+    """
+    from_address = 'notifications@job-fit-ai.com'
+    formatted_subject = f"{sender_name} via FinKen - {subject_line}"
+    batch_size = max(1, min(batch_size, MAX_PERSONALIZATIONS))
+    
+    api_key = os.environ.get('SENDGRID_API_KEY')
+    if not api_key:
+        error = 'SENDGRID_API_KEY not found in environment variables'
+        return {
+            'success': False,
+            'error': error,
+            'requests': 0,
+            'results': [{'email': r['email'], 'success': False, 'error': error} for r in recipients]
+        }
+    
+    def send_batch(batch):
+        message = Mail(from_email=from_address, subject=formatted_subject, html_content=body)
+        message.reply_to = (sender_email, sender_name)
+        for recipient in batch:
+            personalization = Personalization()
+            personalization.add_to(To(recipient['email']))
+            for tag, value in (recipient.get('substitutions') or {}).items():
+                personalization.add_substitution(Substitution(tag, str(value)))
+            message.add_personalization(personalization)
+        _post_mail(message, api_key)
+        return {'success': True}
+    
+    batches = [recipients[start:start + batch_size] for start in range(0, len(recipients), batch_size)]
+    batch_results, metrics = get_dispatcher().dispatch(send_batch, batches)
+    
+    # SendGrid accepts or rejects a request as a whole
+    results = []
+    for batch, outcome in zip(batches, batch_results):
+        results.extend({'email': r['email'], 'success': outcome['success'], 'error': outcome.get('error')}
+                       for r in batch)
+    
+    return {
+        'success': any(r['success'] for r in results),
+        'requests': len(batches),
+        'metrics': metrics,
+        'results': results
+    }
+
 def NewUserAdminNotification(first_name, last_name, email, sb = None):
     """
     Send notification to all administrators about a new user registration request
@@ -102,79 +205,26 @@ def NewUserAdminNotification(first_name, last_name, email, sb = None):
         full_name = f"{first_name} {last_name}"
         subject = "New User Registration Request - FinKen"
         
-        # HTML email body
-        email_body = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #333; border-bottom: 2px solid #4CAF50; padding-bottom: 10px;">
-                New User Registration Request
-            </h2>
-            
-            <p style="font-size: 16px; color: #555; margin: 20px 0;">
-                A new user has submitted a registration request and is awaiting approval.
-            </p>
-            
-            <div style="background-color: #f9f9f9; padding: 20px; border-left: 4px solid #4CAF50; margin: 20px 0;">
-                <h3 style="color: #333; margin-top: 0;">User Information:</h3>
-                <p style="margin: 5px 0;"><strong>Name:</strong> {full_name}</p>
-                <p style="margin: 5px 0;"><strong>Email:</strong> {email}</p>
-            </div>
-            
-            <p style="font-size: 14px; color: #777; margin: 20px 0;">
-                Please log into the FinKen admin panel to review and approve or reject this registration request.
-            </p>
-            
-            <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
-            
-            <p style="font-size: 12px; color: #999; text-align: center;">
-                This is an automated notification from FinKen.<br>
-                Please do not reply to this email.
-            </p>
-        </div>
-        """
-        
-        # Send email to each administrator
-        successful_sends = 0
-        failed_sends = 0
-        errors = []
+        email_body = render_email('new_user_admin.html', full_name=full_name, email=email)
         
-        for admin_email in admin_emails:
-            try:
-                # Use the existing send_email function
-                result = send_email(
-                    sender_email='notifications@job-fit-ai.com',
-                    sender_name='FinKen System',
-                    receiver_email=admin_email,
-                    subject_line=subject,
-                    body=email_body
-                )
-                
-                if result.get('success'):
-                    successful_sends += 1
-                else:
-                    failed_sends += 1
-                    errors.append(f"Failed to send to {admin_email}: {result.get('error', 'Unknown error')}")
-                    
-            except Exception as e:
-                failed_sends += 1
-                errors.append(f"Failed to send to {admin_email}: {str(e)}")
+        # Queue one email per administrator; the outbox worker delivers them
+        result = enqueue_emails([{
+            'sender_email': 'notifications@job-fit-ai.com',
+            'sender_name': 'FinKen System',
+            'receiver_email': admin_email,
+            'subject_line': subject,
+            'body': email_body
+        } for admin_email in admin_emails], sb=sb)
         
-        # Return summary of results
-        if successful_sends > 0 and failed_sends == 0:
-            return {
-                'success': True,
-                'message': f'Successfully notified all {successful_sends} administrators about the new user registration request'
-            }
-        elif successful_sends > 0 and failed_sends > 0:
-            return {
-                'success': True,
-                'message': f'Notified {successful_sends} administrators successfully, but {failed_sends} failed',
-                'errors': errors
-            }
-        else:
+        if not result.get('success'):
             return {
                 'success': False,
-                'error': f'Failed to notify any administrators. Errors: {"; ".join(errors)}'
+                'error': f'Failed to notify any administrators. Errors: {result.get("error", "Unknown error")}'
             }
+        return {
+            'success': True,
+            'message': f'Queued notifications for all {result["queued"]} administrators about the new user registration request'
+        }
             
     except Exception as e:
         return {
@@ -182,185 +232,204 @@ def NewUserAdminNotification(first_name, last_name, email, sb = None):
             'error': f'Error sending admin notifications: {str(e)}'
         }
 
-def send_password_expiry_notifications(sb=None):
+# Per-user variables of templates/email/password_expiry.html
+PASSWORD_EXPIRY_FIELDS = ('first_name', 'username', 'email', 'urgency', 'urgency_color', 'urgency_message', 'expiry_date')
+
+# The sweep pages through users in UserID order, checkpointing after each page
+# (see password_expiry_ledger.sql)
+PASSWORD_EXPIRY_JOB = 'password-expiry-notifications'
+PASSWORD_EXPIRY_PAGE_SIZE = int(os.environ.get('PASSWORD_EXPIRY_PAGE_SIZE', 500))
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _expiry_recipient(user, now):
+    """SendGrid recipient and summary entry for one user, or None if already expired"""
+    # Calculate days until expiry
+    expiry_date = _parse_timestamp(user['PasswordExpiryDate'])
+    days_until_expiry = (expiry_date - now).days
+    
+    # Skip if password has already expired (negative days)
+    if days_until_expiry < 0:
+        return None
+    
+    # Determine urgency level
+    if days_until_expiry == 0:
+        urgency = "today"
+        urgency_color = "#dc3545"  # Red
+        urgency_message = "Your password expires today!"
+    elif days_until_expiry == 1:
+        urgency = "tomorrow"
+        urgency_color = "#fd7e14"  # Orange
+        urgency_message = "Your password expires tomorrow!"
+    else:
+        urgency = f"in {days_until_expiry} days"
+        urgency_color = "#ffc107"  # Yellow
+        urgency_message = f"Your password expires in {days_until_expiry} days."
+    
+    first_name = user.get('FirstName', 'User')
+    email_address = user.get('Email')
+    
+    recipient = {
+        'email': email_address,
+        'substitutions': substitutions({
+            'first_name': first_name,
+            'username': user.get('Username', 'your username'),
+            'email': email_address,
+            'urgency': urgency,
+            'urgency_color': urgency_color,
+            'urgency_message': urgency_message,
+            'expiry_date': expiry_date.strftime('%B %d, %Y at %I:%M %p UTC')
+        })
+    }
+    notification = {
+        'user_id': user['UserID'],
+        'name': first_name,
+        'email': email_address,
+        'days_until_expiry': days_until_expiry,
+        'expiry_date': user['PasswordExpiryDate']
+    }
+    return recipient, notification
+
+def _notify_expiry_page(users, now, subject, email_body, sb):
+    """
+    Email one page of users, skipping anyone already warned about this expiry date
+    
+    Returns:
+        dict: notifications_sent, failed, errors and already_notified for the page
+    """
+    outcome = {'notifications_sent': [], 'failed': 0, 'errors': [], 'already_notified': 0}
+    
+    # The ledger says who was already emailed about their current expiry date
+    ledger = sb.table('password_expiry_notices').select('UserID, PasswordExpiryDate') \
+        .in_('UserID', [user['UserID'] for user in users]).execute()
+    notified = {(row['UserID'], _parse_timestamp(row['PasswordExpiryDate'])) for row in ledger.data or []}
+    
+    recipients = []
+    pending = []
+    for user in users:
+        try:
+            if (user['UserID'], _parse_timestamp(user['PasswordExpiryDate'])) in notified:
+                outcome['already_notified'] += 1
+                continue
+            entry = _expiry_recipient(user, now)
+            if entry:
+                recipients.append(entry[0])
+                pending.append(entry[1])
+        except Exception as e:
+            outcome['failed'] += 1
+            outcome['errors'].append(f"Failed to process user {user.get('UserID', 'unknown')}: {str(e)}")
+    
+    if not recipients:
+        return outcome
+    
+    # Up to MAX_PERSONALIZATIONS users per SendGrid request
+    send_result = send_bulk_email(
+        sender_email='notifications@job-fit-ai.com',
+        sender_name='FinKen Security',
+        recipients=recipients,
+        subject_line=subject,
+        body=email_body
+    )
+    print(f"Password expiry emails: {send_result.get('metrics')}")
+    for notification, result in zip(pending, send_result['results']):
+        if result['success']:
+            outcome['notifications_sent'].append(notification)
+        else:
+            outcome['failed'] += 1
+            outcome['errors'].append(f"Failed to send to {notification['email']}: {result.get('error') or 'Unknown error'}")
+    
+    # Record successes only, so failed sends are retried by the next run
+    if outcome['notifications_sent']:
+        sb.table('password_expiry_notices').upsert([{
+            'UserID': notification['user_id'],
+            'PasswordExpiryDate': notification['expiry_date']
+        } for notification in outcome['notifications_sent']], ignore_duplicates=True).execute()
+    return outcome
+
+def send_password_expiry_notifications(sb=None, page_size=PASSWORD_EXPIRY_PAGE_SIZE, time_budget_seconds=None):
     """
     Send email notifications to users whose passwords are expiring within 3 days
     
+    Users are processed a page at a time and progress is checkpointed, so a run
+    stopped early (time budget, timeout, crash) resumes where it left off when
+    called again the same day. Users already warned about their current expiry
+    date are skipped, so reruns never email anyone twice.
+    
+    Args:
+        page_size (int): Users fetched (and emailed) per page
+        time_budget_seconds (float): Stop after the page that exceeds this, leaving
+            the rest for the next call; None runs to the end
+    
     Returns:
-        dict: Response containing status and message with details about notifications sent
+        dict: Response containing status and message with details about notifications sent;
+              'complete' is False when the sweep stopped early and should be called again
     """
     try:
         # Initialize Supabase client
         sb = sb or _sb()
         
-        # Calculate the cutoff date (3 days from now)
-        from datetime import datetime, timedelta, timezone
-        cutoff_date = datetime.now(timezone.utc) + timedelta(days=3)
-        cutoff_date_str = cutoff_date.isoformat()
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        run_key = now.date().isoformat()
         
-        # Get users whose passwords expire within 3 days and are active
-        response = sb.table('users').select(
-            'UserID, Username, FirstName, LastName, Email, PasswordExpiryDate'
-        ).lte('PasswordExpiryDate', cutoff_date_str).eq('IsActive', True).eq('IsSuspended', False).execute()
+        # Calculate the cutoff date (3 days from now)
+        cutoff_date_str = (now + timedelta(days=3)).isoformat()
         
-        if not response.data:
-            return {
-                'success': True,
-                'message': 'No users with passwords expiring in the next 3 days',
-                'users_notified': 0
-            }
+        # One body for everyone, rendered once per process; the per-user parts
+        # are SendGrid substitution tags
+        subject = "Password Expiry Warning - Action Required"
+        email_body = email_shell('password_expiry.html', PASSWORD_EXPIRY_FIELDS)
         
-        successful_sends = 0
-        failed_sends = 0
-        errors = []
+        last_user_id = int(load_checkpoint(PASSWORD_EXPIRY_JOB, run_key, sb=sb) or 0)
         notifications_sent = []
+        errors = []
+        failed_sends = 0
+        already_notified = 0
+        complete = False
         
-        for user in response.data:
-            try:
-                # Calculate days until expiry
-                expiry_date = datetime.fromisoformat(user['PasswordExpiryDate'].replace('Z', '+00:00'))
-                now = datetime.now(timezone.utc)
-                days_until_expiry = (expiry_date - now).days
-                
-                # Skip if password has already expired (negative days)
-                if days_until_expiry < 0:
-                    continue
-                
-                # Determine urgency level
-                if days_until_expiry == 0:
-                    urgency = "today"
-                    urgency_color = "#dc3545"  # Red
-                    urgency_message = "Your password expires today!"
-                elif days_until_expiry == 1:
-                    urgency = "tomorrow"
-                    urgency_color = "#fd7e14"  # Orange
-                    urgency_message = "Your password expires tomorrow!"
-                else:
-                    urgency = f"in {days_until_expiry} days"
-                    urgency_color = "#ffc107"  # Yellow
-                    urgency_message = f"Your password expires in {days_until_expiry} days."
-                
-                # Create personalized email content
-                first_name = user.get('FirstName', 'User')
-                username = user.get('Username', 'your username')
-                email_address = user.get('Email')
-                
-                subject = f"Password Expiry Warning - Action Required"
-                
-                # HTML email body
-                email_body = f"""
-                <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; background-color: #f8f9fa; padding: 20px;">
-                    <div style="background-color: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                        
-                        <!-- Header -->
-                        <div style="text-align: center; margin-bottom: 30px;">
-                            <h1 style="color: #333; margin: 0; font-size: 24px;">FinKen - Password Expiry Warning</h1>
-                        </div>
-                        
-                        <!-- Urgency Alert -->
-                        <div style="background-color: {urgency_color}; color: white; padding: 15px; border-radius: 6px; text-align: center; margin-bottom: 25px;">
-                            <h2 style="margin: 0; font-size: 18px;">{urgency_message}</h2>
-                        </div>
-                        
-                        <!-- Greeting -->
-                        <p style="font-size: 16px; color: #333; margin-bottom: 20px;">
-                            Hello {first_name},
-                        </p>
-                        
-                        <!-- Main Message -->
-                        <p style="font-size: 16px; color: #555; line-height: 1.6; margin-bottom: 20px;">
-                            This is an automated reminder that your FinKen account password is set to expire <strong>{urgency}</strong>.
-                        </p>
-                        
-                        <!-- Account Details -->
-                        <div style="background-color: #f8f9fa; padding: 20px; border-left: 4px solid #007bff; margin: 20px 0;">
-                            <h3 style="color: #333; margin-top: 0; font-size: 16px;">Account Information:</h3>
-                            <p style="margin: 5px 0; color: #555;"><strong>Username:</strong> {username}</p>
-                            <p style="margin: 5px 0; color: #555;"><strong>Email:</strong> {email_address}</p>
-                            <p style="margin: 5px 0; color: #555;"><strong>Password Expires:</strong> {expiry_date.strftime('%B %d, %Y at %I:%M %p UTC')}</p>
-                        </div>
-                        
-                        <!-- Action Required -->
-                        <div style="background-color: #fff3cd; border: 1px solid #ffeaa7; padding: 20px; border-radius: 6px; margin: 20px 0;">
-                            <h3 style="color: #856404; margin-top: 0; font-size: 16px;">Action Required:</h3>
-                            <p style="color: #856404; margin: 5px 0; line-height: 1.6;">
-                                To maintain access to your FinKen account, please log in and change your password before it expires. 
-                                If your password expires, you may need to contact an administrator to regain access.
-                            </p>
-                        </div>
-                        
-                        <!-- Instructions -->
-                        <div style="margin: 25px 0;">
-                            <h3 style="color: #333; font-size: 16px;">How to Change Your Password:</h3>
-                            <ol style="color: #555; line-height: 1.6; padding-left: 20px;">
-                                <li>Log into your FinKen account</li>
-                                <li>Navigate to your profile or account settings</li>
-                                <li>Select "Change Password"</li>
-                                <li>Enter your current password and choose a new secure password</li>
-                                <li>Save your changes</li>
-                            </ol>
-                        </div>
-                        
-                        <!-- Security Tips -->
-                        <div style="background-color: #e8f5e8; border: 1px solid #c3e6c3; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                            <h4 style="color: #2d5a2d; margin-top: 0; font-size: 14px;">💡 Password Security Tips:</h4>
-                            <ul style="color: #2d5a2d; font-size: 14px; margin: 5px 0; padding-left: 20px; line-height: 1.5;">
-                                <li>Use a combination of uppercase and lowercase letters, numbers, and special characters</li>
-                                <li>Make your password at least 8 characters long</li>
-                                <li>Avoid using personal information or common words</li>
-                                <li>Consider using a password manager for stronger security</li>
-                            </ul>
-                        </div>
-                        
-                        <!-- Footer -->
-                        <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
-                        
-                        <p style="font-size: 12px; color: #999; text-align: center; margin: 10px 0;">
-                            This is an automated security notification from FinKen.<br>
-                            Please do not reply to this email. If you need assistance, contact your system administrator.
-                        </p>
-                        
-                        <p style="font-size: 11px; color: #ccc; text-align: center; margin: 0;">
-                            FinKen Financial Management System<br>
-                            Automated Password Management Service
-                        </p>
-                    </div>
-                </div>
-                """
-                
-                # Send the email
-                result = send_email(
-                    sender_email='notifications@job-fit-ai.com',
-                    sender_name='FinKen Security',
-                    receiver_email=email_address,
-                    subject_line=subject,
-                    body=email_body
-                )
-                
-                if result.get('success'):
-                    successful_sends += 1
-                    notifications_sent.append({
-                        'user_id': user['UserID'],
-                        'name': first_name,
-                        'email': email_address,
-                        'days_until_expiry': days_until_expiry,
-                        'expiry_date': user['PasswordExpiryDate']
-                    })
-                else:
-                    failed_sends += 1
-                    errors.append(f"Failed to send to {email_address}: {result.get('error', 'Unknown error')}")
-                    
-            except Exception as e:
-                failed_sends += 1
-                errors.append(f"Failed to process user {user.get('UserID', 'unknown')}: {str(e)}")
+        while True:
+            # Active users whose passwords expire within 3 days (and haven't yet), by keyset
+            page = sb.table('users').select(
+                'UserID, Username, FirstName, LastName, Email, PasswordExpiryDate'
+            ).lte('PasswordExpiryDate', cutoff_date_str).gte('PasswordExpiryDate', now.isoformat()) \
+                .eq('IsActive', True).eq('IsSuspended', False) \
+                .gt('UserID', last_user_id).order('UserID').limit(page_size).execute().data or []
+            
+            if page:
+                outcome = _notify_expiry_page(page, now, subject, email_body, sb)
+                notifications_sent.extend(outcome['notifications_sent'])
+                failed_sends += outcome['failed']
+                errors.extend(outcome['errors'])
+                already_notified += outcome['already_notified']
+                last_user_id = page[-1]['UserID']
+            
+            if len(page) < page_size:
+                complete = True
+                save_checkpoint(PASSWORD_EXPIRY_JOB, run_key, last_user_id, complete=True, sb=sb)
+                break
+            save_checkpoint(PASSWORD_EXPIRY_JOB, run_key, last_user_id, sb=sb)
+            if time_budget_seconds is not None and time.monotonic() - started >= time_budget_seconds:
+                break
+        
+        successful_sends = len(notifications_sent)
+        progress = {'complete': complete, 'already_notified': already_notified}
         
         # Return summary of results
-        if successful_sends > 0 and failed_sends == 0:
+        if successful_sends == 0 and failed_sends == 0:
+            return {
+                'success': True,
+                'message': 'No users with passwords expiring in the next 3 days need a notification',
+                'users_notified': 0,
+                **progress
+            }
+        elif successful_sends > 0 and failed_sends == 0:
             return {
                 'success': True,
                 'message': f'Successfully sent password expiry notifications to {successful_sends} users',
                 'users_notified': successful_sends,
-                'notifications_sent': notifications_sent
+                'notifications_sent': notifications_sent,
+                **progress
             }
         elif successful_sends > 0 and failed_sends > 0:
             return {
@@ -368,13 +437,15 @@ def send_password_expiry_notifications(sb=None):
                 'message': f'Sent notifications to {successful_sends} users successfully, but {failed_sends} failed',
                 'users_notified': successful_sends,
                 'notifications_sent': notifications_sent,
-                'errors': errors
+                'errors': errors,
+                **progress
             }
         else:
             return {
                 'success': False,
                 'error': f'Failed to send notifications to any users. Errors: {"; ".join(errors)}',
-                'users_notified': 0
+                'users_notified': 0,
+                **progress
             }
             
     except Exception as e:
@@ -0,0 +1,282 @@
+"""
+EventLogArchive.py
+
+event_logs only ever grows, so old months are moved out of the database.
+archive_event_logs (the scheduler's archive-event-logs job) writes each month
+older than EVENT_LOG_RETENTION_MONTHS to a gzipped NDJSON file, newest first,
+and then drops that month from the table. With event_logs partitioned by month
+(see event_logs_partitioning.sql) this drops the month's partition; without
+partitions the archived rows are deleted instead. The live table, and every
+query against it, stays roughly the size of the retention window.
+
+Archives are kept in an ImageStore-style blob store: a local directory
+(EVENT_LOG_ARCHIVE_DIR) or, with EVENT_LOG_ARCHIVE_BUCKET set, a Supabase
+Storage bucket. Each row carries its username, so an archive can be read on its
+own. The Event Logs page reads archived months on demand through
+get_archived_event_logs.
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime, timezone
+from postgrest.exceptions import APIError
+from SupabaseClient import _sb
+from Pagination import fetch_keyset_page
+from EventLogs import EXPORT_BATCH_SIZE, _format_log, resolve_usernames
+from ImageStore import ImageNotFound, LocalImageStore, SupabaseImageStore
+
+EVENT_LOG_RETENTION_MONTHS = int(os.environ.get('EVENT_LOG_RETENTION_MONTHS', 12))
+EVENT_LOG_ARCHIVE_DIR = os.environ.get('EVENT_LOG_ARCHIVE_DIR', 'event_log_archive')
+# Months of partitions created ahead of time
+EVENT_LOG_PARTITIONS_AHEAD = 3
+
+_ARCHIVE_COLUMNS = 'logid, userid, timestamp, actiontype, tablename, recordid, beforevalue, aftervalue, delta'
+_ARCHIVE_NAME_RE = re.compile(r'^event_logs-(\d{4}-\d{2})\.ndjson\.gz$')
+
+
+def archive_name(month):
+    """Archive file for a month ('YYYY-MM')."""
+    return f'event_logs-{month}.ndjson.gz'
+
+
+def _month_start(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=index // 12, month=index % 12 + 1)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_archive_store():
+    """Return the per-process archive store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                bucket = os.environ.get('EVENT_LOG_ARCHIVE_BUCKET')
+                _store = SupabaseImageStore(bucket) if bucket else LocalImageStore(EVENT_LOG_ARCHIVE_DIR)
+    return _store
+
+
+# ---------------------------------------------------------------------------
+# Writing archives
+# ---------------------------------------------------------------------------
+
+def _iter_month(sb, start, end, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a month's rows, newest first, with their usernames."""
+    query = sb.table('event_logs').select(_ARCHIVE_COLUMNS) \
+        .gte('timestamp', start.isoformat()).lt('timestamp', end.isoformat())
+    usernames = {}
+    cursor = ''
+    while True:
+        rows, pagination = fetch_keyset_page(query, batch_size, 'timestamp', 'logid', desc=True,
+                                             cursor=cursor, count='none')
+        resolve_usernames(sb, rows, usernames)
+        for row in rows:
+            yield dict(row, username=usernames.get(row['userid']))
+        if not pagination['has_next']:
+            return
+        cursor = pagination['next_cursor']
+
+
+def _read_archive(store, name):
+    """Yield the rows of an archive file, decompressing as it streams."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pending = b''
+    for chunk in store.iter_chunks(name):
+        pending += decompressor.decompress(chunk)
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            if line:
+                yield json.loads(line)
+    pending += decompressor.flush()
+    if pending.strip():
+        yield json.loads(pending)
+
+
+def _gzip_rows(rows, stats):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for row in rows:
+        stats['rows'] += 1
+        stats['max_logid'] = max(stats['max_logid'], row['logid'])
+        data = compressor.compress((json.dumps(row, default=str) + '\n').encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _drop_month(sb, start, max_logid):
+    try:
+        sb.rpc('drop_event_log_partition', {'month_start': start.date().isoformat(), 'max_logid': max_logid}).execute()
+    except APIError as e:
+        # Not partitioned (see event_logs_partitioning.sql); delete exactly the archived rows
+        if e.code != 'PGRST202':
+            raise
+        end = _add_months(start, 1)
+        sb.table('event_logs').delete().gte('timestamp', start.isoformat()) \
+            .lt('timestamp', end.isoformat()).lte('logid', max_logid).execute()
+
+
+def archive_month(month_start, sb=None, store=None):
+    """
+    Move one month of event logs into its archive file.
+
+    Rows already in an existing archive for the month (a run that stopped
+    before dropping the month, or late rows) are merged, not duplicated.
+
+    Returns:
+        int: Rows in the month's archive
+    """
+    sb = sb or _sb()
+    store = store or get_archive_store()
+    month_end = _add_months(month_start, 1)
+    name = archive_name(month_start.strftime('%Y-%m'))
+
+    rows = _iter_month(sb, month_start, month_end)
+    if store.exists(name):
+        # Rare: merge in memory, keeping the archive newest first
+        merged = {row['logid']: row for row in _read_archive(store, name)}
+        merged.update((row['logid'], row) for row in rows)
+        rows = sorted(merged.values(), key=lambda row: (row['timestamp'], row['logid']), reverse=True)
+
+    stats = {'rows': 0, 'max_logid': 0}
+    store.put(name, _gzip_rows(rows, stats), content_type='application/gzip')
+    if stats['rows']:
+        _drop_month(sb, month_start, stats['max_logid'])
+    return stats['rows']
+
+
+def _ensure_partitions(sb):
+    try:
+        sb.rpc('ensure_event_log_partitions', {'months_ahead': EVENT_LOG_PARTITIONS_AHEAD}).execute()
+    except APIError as e:
+        if e.code != 'PGRST202':
+            raise
+
+
+def archive_event_logs(retention_months=None, sb=None, store=None, now=None):
+    """
+    Archive every month older than the retention window and create upcoming partitions.
+
+    Args:
+        retention_months (int): Whole months kept in the database besides the current one;
+            defaults to EVENT_LOG_RETENTION_MONTHS
+
+    Returns:
+        dict: success flag and the months archived with their row counts
+    """
+    try:
+        sb = sb or _sb()
+        store = store or get_archive_store()
+        retention_months = EVENT_LOG_RETENTION_MONTHS if retention_months is None else retention_months
+        cutoff = _add_months(_month_start(now or datetime.now(timezone.utc)), -retention_months)
+
+        _ensure_partitions(sb)
+
+        archived = []
+        while True:
+            oldest = sb.table('event_logs').select('timestamp').lt('timestamp', cutoff.isoformat()) \
+                .order('timestamp').limit(1).execute().data
+            if not oldest:
+                break
+            month = _month_start(oldest[0]['timestamp'])
+            if archived and archived[-1]['month'] == month.strftime('%Y-%m'):
+                raise RuntimeError(f"{archived[-1]['month']} was archived but its rows were not removed")
+            archived.append({'month': month.strftime('%Y-%m'), 'rows': archive_month(month, sb, store)})
+
+        return {
+            'success': True,
+            'message': f'Archived {len(archived)} months of event logs' if archived else 'Nothing to archive',
+            'archived': archived
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Error archiving event logs: {str(e)}'
+        }
+
+
+# ---------------------------------------------------------------------------
+# Reading archives
+# ---------------------------------------------------------------------------
+
+def list_archived_months(store=None):
+    """Archived months ('YYYY-MM'), newest first."""
+    store = store or get_archive_store()
+    months = [m.group(1) for m in map(_ARCHIVE_NAME_RE.match, store.list('event_logs-')) if m]
+    return sorted(months, reverse=True)
+
+
+def _matches(row, action_filter, table_filter, user_filter, date_from, date_to, record_filter=None):
+    if action_filter and row['actiontype'] != action_filter:
+        return False
+    if table_filter and row['tablename'] != table_filter:
+        return False
+    if record_filter is not None and row['recordid'] != record_filter:
+        return False
+    if user_filter and user_filter.lower() not in (row.get('username') or '').lower():
+        return False
+    day = row['timestamp'][:10]
+    if date_from and day < date_from:
+        return False
+    if date_to and day > date_to:
+        return False
+    return True
+
+
+def get_archived_event_logs(month, page=1, per_page=20, action_filter='', table_filter='', user_filter='',
+                            date_from='', date_to='', record_filter=None, store=None):
+    """
+    One page of an archived month, newest first, with the Event Logs filters
+    (record_filter, as for get_event_logs, keeps one record's events).
+
+    The archive is read from start to end, so the total is exact.
+
+    Returns:
+        dict: success flag, formatted logs and pagination info
+    """
+    store = store or get_archive_store()
+    if not re.fullmatch(r'\d{4}-\d{2}', month or ''):
+        raise ValueError(f'Invalid archive month: {month}')
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+
+    logs = []
+    total = 0
+    try:
+        for row in _read_archive(store, archive_name(month)):
+            if not _matches(row, action_filter, table_filter, user_filter, date_from, date_to, record_filter):
+                continue
+            if offset <= total < offset + per_page:
+                username = row.get('username')
+                logs.append(_format_log(dict(row, users={'Username': username} if username else None)))
+            total += 1
+    except ImageNotFound:
+        return {'success': False, 'message': f'No archive for {month}'}
+
+    total_pages = max(-(-total // per_page), 1)
+    return {
+        'success': True,
+        'logs': logs,
+        'pagination': {
+            'current_page': page,
+            'per_page': per_page,
+            'total_count': total,
+            'total_pages': total_pages,
+            'count_mode': 'exact',
+            'has_prev': page > 1,
+            'has_next': page < total_pages,
+            'prev_page': page - 1 if page > 1 else None,
+            'next_page': page + 1 if page < total_pages else None
+        }
+    }
@@ -0,0 +1,346 @@
+# EventLogs.py
+
+import csv
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from postgrest.exceptions import APIError
+from SupabaseClient import _sb
+from Pagination import normalize_count_mode, fetch_page, fetch_keyset_page, _quote
+from AuditDelta import event_delta, reconstruct_images
+
+EVENT_LOG_COLUMNS = 'logid, userid, timestamp, actiontype, tablename, recordid, beforevalue, aftervalue, delta, users(Username)'
+
+
+def _format_log(log, images=True):
+    formatted = {
+        'logid': log['logid'],
+        'userid': log['userid'],
+        'username': log['users']['Username'] if log.get('users') else 'Unknown',
+        'timestamp': log['timestamp'],
+        'actiontype': log['actiontype'],
+        'tablename': log['tablename'],
+        'recordid': log['recordid'],
+        'delta': event_delta(log)
+    }
+    if images:
+        # As stored: full images only on snapshots (see get_event_log_detail)
+        formatted['beforevalue'] = log['beforevalue']
+        formatted['aftervalue'] = log['aftervalue']
+    return formatted
+
+
+# The table list changes only when a new kind of record is first audited, so
+# it is looked up at most once per EVENT_LOG_TABLES_TTL seconds per process
+EVENT_LOG_TABLES_TTL = float(os.environ.get('EVENT_LOG_TABLES_TTL', 300))
+
+_tables_cache = None
+_tables_cache_lock = threading.Lock()
+
+
+def _fetch_event_log_tables(sb):
+    try:
+        rows = sb.rpc('event_log_tables').execute().data or []
+        return sorted(row['tablename'] for row in rows)
+    except APIError as e:
+        # Function not installed yet (see event_log_tables.sql); scan the log instead
+        if e.code != 'PGRST202':
+            raise
+        tables_query = sb.table('event_logs').select('tablename').execute()
+        return sorted(set(t['tablename'] for t in tables_query.data))
+
+
+def get_event_log_tables(sb=None, refresh=False):
+    """
+    Distinct table names that appear in the event log (for the filter dropdown).
+
+    Args:
+        refresh (bool): Ignore the cached list and look it up again
+
+    Returns:
+        list: Sorted table names
+    """
+    global _tables_cache
+    with _tables_cache_lock:
+        if not refresh and _tables_cache and _tables_cache[0] > time.monotonic():
+            return list(_tables_cache[1])
+    tables = _fetch_event_log_tables(sb or _sb())
+    with _tables_cache_lock:
+        _tables_cache = (time.monotonic() + EVENT_LOG_TABLES_TTL, tables)
+    return list(tables)
+
+
+def invalidate_event_log_tables():
+    """Forget the cached table list."""
+    global _tables_cache
+    with _tables_cache_lock:
+        _tables_cache = None
+
+
+def _apply_filters(query, action_filter='', table_filter='', date_from='', date_to='', record_filter=None):
+    """Apply the Event Logs page's action, table, record and date filters."""
+    if action_filter:
+        query = query.eq('actiontype', action_filter)
+    if table_filter:
+        query = query.eq('tablename', table_filter)
+    if record_filter is not None:
+        query = query.eq('recordid', record_filter)
+    if date_from:
+        query = query.gte('timestamp', date_from)
+    if date_to:
+        # Add one day to include the entire end date
+        end_date = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+        query = query.lt('timestamp', end_date.strftime('%Y-%m-%d'))
+    return query
+
+
+# The user filter is resolved to UserIDs first (users_username_trgm_idx, see
+# event_log_record_history.sql), so the log itself is filtered on userid
+EVENT_LOG_USER_MATCHES = int(os.environ.get('EVENT_LOG_USER_MATCHES', 500))
+
+
+def _matching_user_ids(sb, user_filter, usernames=None):
+    """
+    UserIDs whose username contains user_filter (their names go into usernames).
+
+    Raises:
+        ValueError: If more than EVENT_LOG_USER_MATCHES users match
+    """
+    users = sb.table('users').select('UserID, Username').ilike('Username', f'%{user_filter}%') \
+        .limit(EVENT_LOG_USER_MATCHES + 1).execute().data or []
+    if len(users) > EVENT_LOG_USER_MATCHES:
+        raise ValueError(f'More than {EVENT_LOG_USER_MATCHES} users match "{user_filter}"; please be more specific')
+    if usernames is not None:
+        for user in users:
+            usernames[user['UserID']] = user['Username']
+    return [user['UserID'] for user in users]
+
+
+def get_event_logs(page=1, per_page=20, action_filter='', table_filter='', user_filter='',
+                   date_from='', date_to='', cursor=None, count='exact', record_filter=None, sb=None):
+    """
+    Get event logs, newest first, with filters and pagination.
+
+    Args:
+        page (int): Page number (offset mode)
+        per_page (int): Logs per page
+        action_filter (str): Exact action type
+        table_filter (str): Exact table name
+        user_filter (str): Part of the username
+        date_from (str): Earliest date (YYYY-MM-DD), inclusive
+        date_to (str): Latest date (YYYY-MM-DD), inclusive
+        cursor (str): Keyset cursor from a previous page's next_cursor ('' for the
+            first page); None pages by offset instead
+        count (str): Total count mode ('exact', 'planned', 'estimated' or 'none')
+        record_filter (int): Only this record's events (with table_filter)
+
+    Returns:
+        dict: success flag, formatted logs (with their deltas; full images come
+            from get_event_log_detail) and pagination info (the table filter
+            options come from get_event_log_tables)
+    """
+    sb = sb or _sb()
+    count = normalize_count_mode(count)
+
+    # Build query
+    query = sb.table('event_logs').select(EVENT_LOG_COLUMNS, count=None if count == 'none' else count)
+    query = _apply_filters(query, action_filter, table_filter, date_from, date_to, record_filter)
+    if user_filter:
+        query = query.in_('userid', _matching_user_ids(sb, user_filter))
+
+    # Newest first; logid breaks ties between identical timestamps
+    if cursor is None:
+        rows, pagination = fetch_page(query, page, per_page, 'timestamp', desc=True, count=count)
+    else:
+        rows, pagination = fetch_keyset_page(query, per_page, 'timestamp', 'logid', desc=True,
+                                             cursor=cursor, count=count)
+
+    return {
+        'success': True,
+        'logs': [_format_log(log, images=False) for log in rows],
+        'pagination': pagination
+    }
+
+
+def get_record_history(tablename, recordid, per_page=20, cursor='', action_filter='', user_filter='',
+                       date_from='', date_to='', count='exact', sb=None):
+    """
+    Event logs for one record, newest first, by keyset cursor.
+
+    Served by event_logs_record_idx (tablename, recordid, timestamp, logid), so
+    every page is an index range scan however large the log grows.
+
+    Returns:
+        dict: As get_event_logs
+    """
+    if not tablename:
+        raise ValueError('A table name is required')
+    return get_event_logs(per_page=per_page, action_filter=action_filter, table_filter=tablename,
+                          user_filter=user_filter, date_from=date_from, date_to=date_to,
+                          cursor=cursor or '', count=count, record_filter=recordid, sb=sb)
+
+
+def get_event_log_detail(logid, sb=None):
+    """
+    One event log with its full before and after images.
+
+    Rows that only store a delta are rebuilt from the record's nearest earlier
+    snapshot and the deltas since (two queries).
+
+    Returns:
+        dict: success flag, the formatted log, before, after and partial (True
+              when no snapshot was found and only the changed fields are known)
+    """
+    sb = sb or _sb()
+    rows = sb.table('event_logs').select(EVENT_LOG_COLUMNS).eq('logid', logid).execute().data
+    if not rows:
+        return {'success': False, 'message': 'Event log not found'}
+    log = rows[0]
+
+    chain = []
+    if log['beforevalue'] is None and log['aftervalue'] is None:
+        # Events are replayed in the order they happened, (timestamp, logid).
+        # logid alone is insert order, which differs when several processes'
+        # audit writers batch changes to the same record.
+        earlier = f"timestamp.lt.{_quote(log['timestamp'])}," \
+                  f"and(timestamp.eq.{_quote(log['timestamp'])},logid.lt.{logid})"
+        snapshot = sb.table('event_logs').select('logid, timestamp').eq('tablename', log['tablename']) \
+            .eq('recordid', log['recordid']).or_(earlier).filter('aftervalue', 'not.is', 'null') \
+            .order('timestamp', desc=True).order('logid', desc=True).limit(1).execute().data
+        if snapshot:
+            start = (snapshot[0]['timestamp'], snapshot[0]['logid'])
+            rows = sb.table('event_logs').select('logid, timestamp, actiontype, beforevalue, aftervalue, delta') \
+                .eq('tablename', log['tablename']).eq('recordid', log['recordid']) \
+                .gte('timestamp', start[0]).or_(earlier).order('timestamp').order('logid').execute().data
+            chain = [row for row in rows if (row['timestamp'], row['logid']) >= start]
+
+    return dict({'success': True, 'log': _format_log(log, images=False)}, **reconstruct_images(log, chain))
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+# Exports walk the whole filtered log by keyset, EXPORT_BATCH_SIZE rows per
+# query, and stream each batch out as it arrives, so memory stays flat however
+# many rows match. Rows are read without the users join; usernames are looked
+# up once per user for the whole export.
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EVENT_LOG_EXPORT_BATCH_SIZE', 1000))
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_FIELDS = ('logid', 'timestamp', 'userid', 'username', 'actiontype', 'tablename', 'recordid',
+                 'beforevalue', 'aftervalue', 'delta')
+_EXPORT_COLUMNS = 'logid, userid, timestamp, actiontype, tablename, recordid, beforevalue, aftervalue, delta'
+
+
+def resolve_usernames(sb, rows, usernames):
+    """Add the usernames of the rows' users to the usernames cache (one query for any new ones)."""
+    unknown = {row['userid'] for row in rows if row['userid'] is not None} - usernames.keys()
+    if unknown:
+        users = sb.table('users').select('UserID, Username').in_('UserID', sorted(unknown)).execute().data or []
+        usernames.update((user['UserID'], user['Username']) for user in users)
+    return usernames
+
+
+def iter_event_logs(action_filter='', table_filter='', user_filter='', date_from='', date_to='',
+                    batch_size=EXPORT_BATCH_SIZE, sb=None):
+    """
+    Iterate over every matching event log, newest first, formatted like get_event_logs.
+
+    Takes the same filters as get_event_logs. The user filter is resolved
+    before this returns, so its errors are raised here rather than part way
+    through the iteration.
+
+    Raises:
+        ValueError: If more than EVENT_LOG_USER_MATCHES users match the user filter
+    """
+    sb = sb or _sb()
+    usernames = {}
+
+    query = _apply_filters(sb.table('event_logs').select(_EXPORT_COLUMNS),
+                           action_filter, table_filter, date_from, date_to)
+    if user_filter:
+        user_ids = _matching_user_ids(sb, user_filter, usernames)
+        if not user_ids:
+            return iter(())
+        query = query.in_('userid', user_ids)
+    return _iter_logs(sb, query, batch_size, usernames)
+
+
+def _iter_logs(sb, query, batch_size, usernames):
+    cursor = ''
+    while True:
+        rows, pagination = fetch_keyset_page(query, batch_size, 'timestamp', 'logid', desc=True,
+                                             cursor=cursor, count='none')
+        resolve_usernames(sb, rows, usernames)
+        for row in rows:
+            username = usernames.get(row['userid'])
+            yield _format_log(dict(row, users={'Username': username} if username else None))
+        if not pagination['has_next']:
+            return
+        cursor = pagination['next_cursor']
+
+
+def _export_value(value):
+    if value is None:
+        return ''
+    return value if isinstance(value, (str, int, float)) else json.dumps(value)
+
+
+def export_event_logs(fmt='csv', compress=False, **filters):
+    """
+    Stream the matching event logs as CSV or NDJSON.
+
+    Args:
+        fmt (str): 'csv' or 'ndjson'
+        compress (bool): gzip the stream
+        **filters: Filters and sb, as for iter_event_logs
+
+    Returns:
+        generator: Chunks of text (bytes when compressed), one or more per batch
+
+    Raises:
+        ValueError: For an unknown format or a user filter matching too many users;
+            raised here, before any of the stream is produced
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    logs = iter_event_logs(**filters)
+    chunks = _csv_chunks(logs) if fmt == 'csv' else _ndjson_chunks(logs)
+    return _gzip_chunks(chunks) if compress else chunks
+
+
+def _csv_chunks(logs):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for n, log in enumerate(logs, 1):
+        writer.writerow([_export_value(log[field]) for field in EXPORT_FIELDS])
+        if n % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(logs):
+    lines = []
+    for log in logs:
+        lines.append(json.dumps({field: log[field] for field in EXPORT_FIELDS}, default=str) + '\n')
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
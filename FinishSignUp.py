@@ -3,7 +3,8 @@ import secrets
 from datetime import datetime, timedelta, timezone
 from supabase import Client
 from passwordHash import hash_password
-from EmailUser import send_email
+from EmailOutbox import enqueue_email
+from EmailTemplates import render_email
 from SupabaseClient import _sb
 
 # Password expiry configuration
@@ -63,22 +64,20 @@ def create_signup_invitation(request_id: int, reviewer_user_id: int, expires_in_
     link = f"{base_url}/FinishSignUp?token={token}"
     applicant_email = req.data['Email']
     applicant_name = f"{req.data.get('FirstName','')} {req.data.get('LastName','')}".strip()
-    body = f"""
-        <p>Hello {applicant_name},</p>
-        <p>Your registration has been approved. Click the link below to complete your FinKen account setup:</p>
-        <p><a href="{link}">{link}</a></p>
-        <p>This link will expire in {expires_in_hours} hours and can be used once.</p>
-    """
-    email_res = send_email(
+    body = render_email('signup_invitation.html', applicant_name=applicant_name, link=link,
+                        expires_in_hours=expires_in_hours)
+    # Delivered by the outbox worker (EmailOutbox.py); approval doesn't wait on SendGrid
+    email_res = enqueue_email(
         sender_email='notifications@job-fit-ai.com',
         sender_name='FinKen Admin',
         receiver_email=applicant_email,
         subject_line='Complete your FinKen account setup',
-        body=body
+        body=body,
+        sb=sb
     )
     if not email_res.get('success'):
         return {'success': False, 'message': f"Invitation created but email failed: {email_res.get('error')}"}
-    return {'success': True, 'message': 'Invitation created and email sent'}
+    return {'success': True, 'message': 'Invitation created and email queued'}
 
 def get_signup_context(token: str, sb = None):
     sb = sb or _sb()
@@ -0,0 +1,296 @@
+"""
+ImageStore.py
+
+Where profile pictures live. The web tier can only scale past one instance if
+every node sees every upload, so images go through a small store interface:
+
+    LocalImageStore      - a directory on this machine (default; single node)
+    SupabaseImageStore   - a Supabase Storage bucket over its REST API
+    CachedImageStore     - read-through cache on local disk in front of a
+                           remote store, so each node downloads an image once
+
+Select with PROFILE_IMAGE_STORE=local|supabase. The Supabase bucket is named by
+PROFILE_IMAGE_BUCKET (default profile-images) and the per-node cache lives in
+PROFILE_IMAGE_CACHE_DIR, bounded by PROFILE_IMAGE_CACHE_MB.
+
+Uploads and downloads stream in chunks; nothing holds a whole object in memory
+unless the caller asks for bytes.
+"""
+
+import os
+import tempfile
+import threading
+from urllib.parse import quote
+
+import httpx
+from dotenv import load_dotenv
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageNotFound(Exception):
+    pass
+
+
+def _chunks(data):
+    """Yield a bytes object or a file-like object in CHUNK_SIZE pieces."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+        for start in range(0, len(data), CHUNK_SIZE):
+            yield data[start:start + CHUNK_SIZE]
+    elif hasattr(data, 'read'):
+        while True:
+            chunk = data.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from data
+
+
+def _check_name(name):
+    # Object names are flat filenames; refuse anything that could escape a directory
+    if not name or '/' in name or '\\' in name or name in ('.', '..') or name.startswith('.'):
+        raise ValueError(f'Invalid image name: {name!r}')
+    return name
+
+
+class LocalImageStore:
+    """Images in a local directory."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, _check_name(name))
+
+    def put(self, name, data, content_type='image/webp'):
+        """Store data (bytes, file-like or iterable of chunks) under name."""
+        path = self._path(name)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in _chunks(data):
+                    f.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def iter_chunks(self, name):
+        """Stream an image's bytes. Raises ImageNotFound."""
+        try:
+            f = open(self._path(name), 'rb')
+        except FileNotFoundError:
+            raise ImageNotFound(name)
+        with f:
+            yield from _chunks(f)
+
+    def get(self, name):
+        return b''.join(self.iter_chunks(name))
+
+    def exists(self, name):
+        return os.path.isfile(self._path(name))
+
+    def delete(self, names):
+        for name in names:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def list(self, prefix=''):
+        try:
+            return sorted(n for n in os.listdir(self.root) if n.startswith(prefix) and not n.startswith('.'))
+        except FileNotFoundError:
+            return []
+
+    def local_path(self, name):
+        """Path to a local copy of the image, or None if it doesn't exist."""
+        path = self._path(name)
+        return path if os.path.isfile(path) else None
+
+
+class SupabaseImageStore:
+    """Images in a Supabase Storage bucket, via the Storage REST API."""
+
+    def __init__(self, bucket, url=None, key=None, transport=None):
+        load_dotenv()
+        self.bucket = bucket
+        self.url = (url or os.environ.get('SUPABASE_URL', '')).rstrip('/')
+        # Writes need a key allowed to modify the bucket; fall back to the anon key
+        self.key = key or os.environ.get('SUPABASE_SERVICE_KEY') or os.environ.get('SUPABASE_ANON_KEY')
+        if not self.url or not self.key:
+            raise RuntimeError("Supabase environment is not configured")
+        self._transport = transport
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Picklable for the image process pool; each process opens its own pool
+        state = self.__dict__.copy()
+        state.update(_client=None, _lock=None, _transport=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=f'{self.url}/storage/v1',
+                        headers={'Authorization': f'Bearer {self.key}', 'apikey': self.key},
+                        timeout=30,
+                        transport=self._transport,
+                    )
+        return self._client
+
+    def _object(self, name):
+        return f'/object/{quote(self.bucket)}/{quote(_check_name(name))}'
+
+    def put(self, name, data, content_type='image/webp'):
+        response = self.client.post(
+            self._object(name),
+            content=_chunks(data),
+            headers={'Content-Type': content_type, 'x-upsert': 'true'},
+        )
+        response.raise_for_status()
+
+    def iter_chunks(self, name):
+        with self.client.stream('GET', self._object(name)) as response:
+            if response.status_code in (400, 404):
+                raise ImageNotFound(name)
+            response.raise_for_status()
+            yield from response.iter_bytes(CHUNK_SIZE)
+
+    def get(self, name):
+        return b''.join(self.iter_chunks(name))
+
+    def exists(self, name):
+        response = self.client.head(self._object(name))
+        return response.status_code == 200
+
+    def delete(self, names):
+        names = [_check_name(n) for n in names]
+        if not names:
+            return
+        response = self.client.request('DELETE', f'/object/{quote(self.bucket)}', json={'prefixes': names})
+        response.raise_for_status()
+
+    def list(self, prefix=''):
+        response = self.client.post(
+            f'/object/list/{quote(self.bucket)}',
+            json={'prefix': '', 'search': prefix, 'limit': 1000, 'offset': 0},
+        )
+        response.raise_for_status()
+        return sorted(item['name'] for item in response.json() if item.get('name', '').startswith(prefix))
+
+    def local_path(self, name):
+        return None
+
+
+class CachedImageStore:
+    """
+    Read-through local cache in front of a remote store.
+
+    Writes go to the remote store and are kept locally too; reads are served
+    from the local copy, fetching it once on a miss. The cache is trimmed to
+    max_bytes, dropping the least recently used files first. Uploads use
+    content-hashed names, so a cached copy never goes stale.
+    """
+
+    def __init__(self, backend, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.backend = backend
+        self.cache = LocalImageStore(cache_dir)
+        self.max_bytes = max_bytes
+
+    def put(self, name, data, content_type='image/webp'):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = b''.join(_chunks(data))
+        self.backend.put(name, data, content_type)
+        self.cache.put(name, data, content_type)
+        self._trim()
+
+    def local_path(self, name):
+        """Path to the cached copy, downloading it first on a miss; None if absent."""
+        path = self.cache.local_path(name)
+        if path is None:
+            try:
+                self.cache.put(name, self.backend.iter_chunks(name))
+            except ImageNotFound:
+                return None
+            self._trim()
+            path = self.cache.local_path(name)
+        else:
+            os.utime(path)  # mark as recently used
+        return path
+
+    def iter_chunks(self, name):
+        path = self.local_path(name)
+        if path is None:
+            raise ImageNotFound(name)
+        return self.cache.iter_chunks(name)
+
+    def get(self, name):
+        return b''.join(self.iter_chunks(name))
+
+    def exists(self, name):
+        return self.cache.exists(name) or self.backend.exists(name)
+
+    def delete(self, names):
+        names = list(names)
+        self.backend.delete(names)
+        self.cache.delete(names)
+
+    def list(self, prefix=''):
+        return self.backend.list(prefix)
+
+    def _trim(self):
+        entries = []
+        for name in self.cache.list():
+            try:
+                stat = os.stat(os.path.join(self.cache.root, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.cache.delete([name])
+            total -= size
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_image_store():
+    """Build the store selected by PROFILE_IMAGE_STORE."""
+    from ProfilePictureHandler import PROFILE_IMAGES_DIR
+
+    kind = os.environ.get('PROFILE_IMAGE_STORE', 'local').lower()
+    if kind == 'local':
+        return LocalImageStore(PROFILE_IMAGES_DIR)
+    if kind == 'supabase':
+        backend = SupabaseImageStore(os.environ.get('PROFILE_IMAGE_BUCKET', 'profile-images'))
+        cache_dir = os.environ.get('PROFILE_IMAGE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'finken-image-cache')
+        max_bytes = int(os.environ.get('PROFILE_IMAGE_CACHE_MB', 256)) * 1024 * 1024
+        return CachedImageStore(backend, cache_dir, max_bytes)
+    raise RuntimeError(f"Unknown PROFILE_IMAGE_STORE: {kind}")
+
+
+def get_image_store():
+    """Return the per-process image store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_image_store()
+    return _store
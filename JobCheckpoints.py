@@ -0,0 +1,44 @@
+"""
+JobCheckpoints.py
+
+Progress records for long batch jobs (job_checkpoints, see
+password_expiry_ledger.sql). A job saves its position after each page, so a
+run cut short by a timeout or crash picks up where it stopped instead of
+starting over. A run is identified by a run_key (e.g. the sweep's date); a
+checkpoint from a different run is ignored.
+"""
+
+from datetime import datetime, timezone
+from SupabaseClient import _sb
+
+
+def load_checkpoint(job_name, run_key, sb=None):
+    """
+    Return the saved position of an unfinished run, or None to start fresh.
+
+    Args:
+        job_name (str): The job
+        run_key (str): Identifies the current run
+    """
+    sb = sb or _sb()
+    response = sb.table('job_checkpoints').select('run_key, position, status') \
+        .eq('job_name', job_name).execute()
+    if not response.data:
+        return None
+    checkpoint = response.data[0]
+    if checkpoint['run_key'] != run_key or checkpoint['status'] == 'complete':
+        return None
+    return checkpoint['position']
+
+
+def save_checkpoint(job_name, run_key, position, complete=False, sb=None):
+    """Record how far a run has got (position is any string the job understands)."""
+    sb = sb or _sb()
+    sb.table('job_checkpoints').upsert({
+        'job_name': job_name,
+        'run_key': run_key,
+        'position': None if position is None else str(position),
+        'status': 'complete' if complete else 'running',
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }).execute()
+
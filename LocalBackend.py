@@ -0,0 +1,1037 @@
+"""
+LocalBackend.py
+
+SQLite-backed stand-in for the Supabase client. Tables are built from
+DBSchema.sql and the same table().select().eq()...execute() chains the app
+uses are executed locally, so the app can be run, benchmarked and load-tested
+offline with realistic data volumes.
+
+Enable it with FINKEN_DB_BACKEND=local (see SupabaseClient._sb). The database
+lives in memory unless FINKEN_LOCAL_DB points at a file.
+
+Supported: select with column lists, aliases and embedded resources such as
+roles(RoleName) or reviewer:ReviewedByUserID(Username); eq/neq/gt/gte/lt/lte/
+like/ilike/is_/in_ filters, or_ strings (including nested and()/or()), filters
+on embedded columns, order, limit, range, single/maybe_single,
+count='exact'|'planned'|'estimated', insert/update/upsert/delete returning
+rows, and rpc() calls registered with register_rpc().
+"""
+
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+from postgrest.exceptions import APIError
+from QueryMetrics import record_query
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DBSchema.sql')
+
+_CREATE_TABLE_RE = re.compile(
+    r'CREATE TABLE (?:IF NOT EXISTS )?(?:public\.)?(\w+)\s*\((.*?)\n\);', re.S | re.I
+)
+_CREATE_INDEX_RE = re.compile(
+    r'CREATE (UNIQUE )?INDEX (?:IF NOT EXISTS )?(\w+)\s+ON (?:public\.)?(\w+)'
+    r'(?:\s+USING \w+)?\s*\((.*?)\);', re.S | re.I
+)
+_REFERENCES_RE = re.compile(r'REFERENCES (\w+)\.(\w+)\s*\((\w+)\)', re.I)
+_DEFAULT_RE = re.compile(
+    r'\bDEFAULT\s+(.+?)(?=\s+(?:NOT NULL|NULL|UNIQUE|CHECK|PRIMARY|REFERENCES|GENERATED)\b|$)', re.I
+)
+
+# PostgREST operators this backend understands
+_OPERATORS = {'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'like', 'ilike', 'is', 'in'}
+_SQL_COMPARISONS = {'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+# HTTP verb PostgREST would use for each operation (for query metrics)
+_HTTP_METHODS = {'select': 'GET', 'insert': 'POST', 'upsert': 'POST', 'update': 'PATCH', 'delete': 'DELETE'}
+
+_RPC_FUNCTIONS = {}
+
+
+def register_rpc(name):
+    """Register a Python implementation of a database function for rpc()."""
+    def decorator(fn):
+        _RPC_FUNCTIONS[name] = fn
+        return fn
+    return decorator
+
+
+@register_rpc('set_audit_user_context')
+def _rpc_set_audit_user_context(client, user_id=None):
+    # The audit user rides on each request already; nothing to store locally
+    return None
+
+
+@register_rpc('unsuspend_expired_users')
+def _rpc_unsuspend_expired_users(client):
+    # Mirrors unsuspend_expired_users.sql; the client lock makes it atomic
+    expired = client.table('users').select('UserID, FirstName, LastName, SuspensionEndDate') \
+        .eq('IsSuspended', True).lte('SuspensionEndDate', _now_iso()).execute().data
+    if expired:
+        client.table('users').update({'IsSuspended': False, 'SuspensionEndDate': None, 'SuspensionReason': None}) \
+            .in_('UserID', [user['UserID'] for user in expired]).execute()
+    return expired
+
+
+@register_rpc('event_log_tables')
+def _rpc_event_log_tables(client):
+    # Mirrors event_log_tables.sql
+    return client.query('SELECT DISTINCT tablename FROM event_logs ORDER BY tablename')
+
+
+@register_rpc('log_cron_job_run')
+def _rpc_log_cron_job_run(client, **run):
+    # Mirrors scheduler.sql
+    client.table('cron_job_logs').insert(run).execute()
+    return None
+
+
+@register_rpc('delete_old_cron_job_logs')
+def _rpc_delete_old_cron_job_logs(client, older_than):
+    # Mirrors scheduler.sql
+    return len(client.table('cron_job_logs').delete().lt('execution_time', older_than).execute().data or [])
+
+
+def _api_error(message, code, details=None, hint=None):
+    return APIError({'message': message, 'code': code, 'details': details, 'hint': hint})
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+def _split_top_level(text, sep=','):
+    """Split on sep, ignoring separators inside parentheses or double quotes."""
+    parts = []
+    depth = 0
+    in_quotes = False
+    current = []
+    for ch in text:
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif not in_quotes and ch == '(':
+            depth += 1
+        elif not in_quotes and ch == ')':
+            depth -= 1
+        if ch == sep and depth == 0 and not in_quotes:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append(''.join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+def _column_kind(type_text):
+    t = type_text.lower()
+    if t.startswith(('integer', 'bigint', 'smallint', 'serial', 'int')):
+        return 'int'
+    if t.startswith('boolean'):
+        return 'bool'
+    if t.startswith(('numeric', 'decimal', 'real', 'double')):
+        return 'num'
+    if t.startswith('timestamp'):
+        return 'timestamp'
+    if t.startswith('date'):
+        return 'date'
+    if t.startswith('json'):
+        return 'json'
+    return 'text'
+
+
+def _parse_default(expr, kind):
+    expr = expr.strip()
+    if expr.lower().startswith('nextval('):
+        return None
+    if expr.lower() == 'now()':
+        return _now_iso
+    # Drop casts such as 'Pending'::text
+    expr = re.sub(r'::[\w ]+$', '', expr).strip()
+    if expr.startswith("'") and expr.endswith("'"):
+        return expr[1:-1]
+    if expr.lower() in ('true', 'false'):
+        return expr.lower() == 'true'
+    if expr.lower() == 'null':
+        return None
+    try:
+        return float(expr) if kind == 'num' else int(expr)
+    except ValueError:
+        return expr
+
+
+class LocalSchema:
+    """Tables, columns, keys and indexes parsed from DBSchema.sql."""
+
+    def __init__(self, sql):
+        self.tables = {}        # table -> {column: spec}
+        self.primary_keys = {}  # table -> [columns]
+        self.unique = {}        # table -> [[columns]]
+        self.foreign_keys = {}  # table -> [(column, ref_table, ref_column)]
+        self.indexes = []       # (name, table, [columns], unique)
+
+        for table, body in _CREATE_TABLE_RE.findall(sql):
+            self._parse_table(table, body)
+        for unique, name, table, cols in _CREATE_INDEX_RE.findall(sql):
+            columns = [c.split()[0].strip('"') for c in _split_top_level(cols)]
+            self.indexes.append((name, table, columns, bool(unique)))
+
+    def _parse_table(self, table, body):
+        columns = {}
+        self.primary_keys[table] = []
+        self.unique[table] = []
+        self.foreign_keys[table] = []
+        for item in _split_top_level(body):
+            head = item.split()[0].upper()
+            if head in ('CONSTRAINT', 'PRIMARY', 'UNIQUE', 'FOREIGN', 'CHECK'):
+                self._parse_constraint(table, item)
+                continue
+            name, rest = item.split(None, 1)
+            name = name.strip('"')
+            type_text = re.split(
+                r'\s+(?:NOT NULL|NULL|UNIQUE|DEFAULT|GENERATED|CHECK|PRIMARY|REFERENCES)\b',
+                rest, maxsplit=1, flags=re.I
+            )[0]
+            kind = _column_kind(type_text)
+            default_match = _DEFAULT_RE.search(rest)
+            identity = ('GENERATED' in rest.upper() or 'nextval(' in rest.lower()
+                        or type_text.lower().startswith('serial'))
+            columns[name] = {
+                'kind': kind,
+                'not_null': bool(re.search(r'\bNOT NULL\b', rest, re.I)),
+                'unique': bool(re.search(r'\bUNIQUE\b', rest, re.I)),
+                'identity': identity,
+                'default': _parse_default(default_match.group(1), kind) if default_match else None,
+            }
+            if re.search(r'\bPRIMARY KEY\b', rest, re.I):
+                self.primary_keys[table].append(name)
+            ref = _REFERENCES_RE.search(rest)
+            if ref and ref.group(1).lower() == 'public':
+                self.foreign_keys[table].append((name, ref.group(2), ref.group(3)))
+        self.tables[table] = columns
+
+    def _parse_constraint(self, table, item):
+        cols_match = re.search(r'(PRIMARY KEY|UNIQUE|FOREIGN KEY)\s*\(([^)]*)\)', item, re.I)
+        if not cols_match:
+            return
+        kind = cols_match.group(1).upper()
+        cols = [c.strip().strip('"') for c in cols_match.group(2).split(',')]
+        if kind == 'PRIMARY KEY':
+            self.primary_keys[table] = cols
+        elif kind == 'UNIQUE':
+            self.unique[table].append(cols)
+        else:
+            ref = _REFERENCES_RE.search(item)
+            if ref and ref.group(1).lower() == 'public':
+                self.foreign_keys[table].append((cols[0], ref.group(2), ref.group(3)))
+
+    def ddl(self):
+        """SQLite CREATE statements for every table and index."""
+        statements = []
+        for table, columns in self.tables.items():
+            pk = self.primary_keys.get(table, [])
+            lines = []
+            for name, spec in columns.items():
+                sql_type = {'int': 'INTEGER', 'bool': 'INTEGER', 'num': 'REAL'}.get(spec['kind'], 'TEXT')
+                line = f'"{name}" {sql_type}'
+                if pk == [name] and spec['kind'] == 'int':
+                    line += ' PRIMARY KEY AUTOINCREMENT'
+                else:
+                    if spec['not_null'] and not spec['identity']:
+                        line += ' NOT NULL'
+                    if spec['unique']:
+                        line += ' UNIQUE'
+                lines.append(line)
+            if pk and not (len(pk) == 1 and columns.get(pk[0], {}).get('kind') == 'int'):
+                lines.append('PRIMARY KEY (' + ', '.join(f'"{c}"' for c in pk) + ')')
+            for cols in self.unique.get(table, []):
+                lines.append('UNIQUE (' + ', '.join(f'"{c}"' for c in cols) + ')')
+            statements.append(f'CREATE TABLE IF NOT EXISTS "{table}" (\n  ' + ',\n  '.join(lines) + '\n)')
+        for name, table, cols, unique in self.indexes:
+            statements.append(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{name}" ON "{table}" ('
+                + ', '.join(f'"{c}"' for c in cols) + ')'
+            )
+        return statements
+
+
+@lru_cache(maxsize=4)
+def load_schema(path=SCHEMA_PATH):
+    with open(path, encoding='utf-8') as f:
+        return LocalSchema(f.read())
+
+
+# ---------------------------------------------------------------------------
+# Value conversion
+# ---------------------------------------------------------------------------
+
+def _normalize_timestamp(value):
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, date):
+        dt = datetime(value.year, value.month, value.day)
+    else:
+        text = str(value).strip()
+        if text.lower() == 'now()':
+            return _now_iso()
+        try:
+            dt = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            return text
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+
+def _to_db(kind, value):
+    """Convert an API value (Python or PostgREST string form) for storage."""
+    if value is None:
+        return None
+    if kind == 'json':
+        return json.dumps(value)
+    if isinstance(value, str) and value.lower() == 'null':
+        return None
+    if kind == 'bool':
+        if isinstance(value, str):
+            return 1 if value.lower() in ('true', 't', '1') else 0
+        return 1 if value else 0
+    if kind == 'int':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+    if kind == 'num':
+        try:
+            return float(Decimal(str(value)))
+        except Exception:
+            return value
+    if kind == 'timestamp':
+        return _normalize_timestamp(value)
+    if kind == 'date':
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()[:10]
+        return str(value)
+    return str(value)
+
+
+def _from_db(kind, value):
+    if value is None:
+        return None
+    if kind == 'bool':
+        return bool(value)
+    if kind == 'json':
+        return json.loads(value)
+    if kind == 'num':
+        return float(value)
+    return value
+
+
+# ---------------------------------------------------------------------------
+# Select and filter parsing
+# ---------------------------------------------------------------------------
+
+_EMBED_RE = re.compile(r'^(?:(\w+):)?(\w+)(?:!(\w+))?\s*\((.*)\)$', re.S)
+_COLUMN_RE = re.compile(r'^(?:(\w+):)?(\w+)(?:::\w+)?$')
+
+
+def _parse_select(columns):
+    """Parse a PostgREST select string into column and embed descriptors."""
+    fields = []
+    for item in _split_top_level(' '.join(columns.split())):
+        if item == '*':
+            fields.append({'type': 'star'})
+            continue
+        embed = _EMBED_RE.match(item)
+        if embed:
+            alias, name, hint, inner = embed.groups()
+            fields.append({
+                'type': 'embed', 'alias': alias or name, 'name': name, 'hint': hint,
+                'fields': _parse_select(inner) if inner.strip() else [{'type': 'star'}],
+            })
+            continue
+        col = _COLUMN_RE.match(item)
+        if not col:
+            raise _api_error(f'failed to parse select parameter ({item})', 'PGRST100')
+        alias, name = col.groups()
+        fields.append({'type': 'column', 'alias': alias or name, 'name': name})
+    return fields
+
+
+def _parse_value(op, raw):
+    if op == 'in':
+        inner = raw.strip()
+        if inner.startswith('(') and inner.endswith(')'):
+            inner = inner[1:-1]
+        return [v.strip().strip('"') for v in _split_top_level(inner)]
+    raw = raw.strip()
+    if len(raw) >= 2 and raw.startswith('"') and raw.endswith('"'):
+        return raw[1:-1]
+    return raw
+
+
+def _parse_logic(text):
+    """Parse the body of an or=(...)/and=(...) filter into filter nodes."""
+    nodes = []
+    for part in _split_top_level(text):
+        negate = False
+        if part.startswith('not.'):
+            negate, part = True, part[4:]
+        logic = re.match(r'^(and|or)\((.*)\)$', part, re.S)
+        if logic:
+            node = (logic.group(1), _parse_logic(logic.group(2)))
+        else:
+            pieces = part.split('.', 2)
+            if len(pieces) < 3:
+                raise _api_error(f'failed to parse logic tree ({part})', 'PGRST100')
+            column, op, raw = pieces
+            if op == 'not':
+                op, raw = raw.split('.', 1)
+                negate = not negate
+            if op not in _OPERATORS:
+                raise _api_error(f'unknown operator {op}', 'PGRST100')
+            node = ('cmp', column, op, _parse_value(op, raw))
+        nodes.append(('not', node) if negate else node)
+    return nodes
+
+
+class LocalResponse:
+    """Mirrors postgrest's APIResponse: .data and .count."""
+
+    def __init__(self, data=None, count=None):
+        self.data = data
+        self.count = count
+
+
+# ---------------------------------------------------------------------------
+# Query builder
+# ---------------------------------------------------------------------------
+
+class LocalQuery:
+    """Chainable query builder with the postgrest-py method names."""
+
+    def __init__(self, client, table):
+        if table not in client.schema.tables:
+            raise _api_error(
+                f'relation "public.{table}" does not exist', '42P01'
+            )
+        self._client = client
+        self._table = table
+        self._op = 'select'
+        self._select = '*'
+        self._count = None
+        self._payload = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        self._filters = []
+        self._embed_filters = {}
+        self._order = []
+        self._limit = None
+        self._offset = None
+        self._single = False
+        self._maybe_single = False
+
+    # -- operations -------------------------------------------------------
+    def select(self, *columns, count=None):
+        self._op = 'select'
+        self._select = ','.join(columns) if columns else '*'
+        self._count = count
+        return self
+
+    def insert(self, json, count=None, returning='representation', upsert=False):
+        self._op = 'upsert' if upsert else 'insert'
+        self._payload = json
+        self._count = count
+        return self
+
+    def upsert(self, json, count=None, returning='representation', ignore_duplicates=False, on_conflict=''):
+        self._op = 'upsert'
+        self._payload = json
+        self._count = count
+        self._ignore_duplicates = ignore_duplicates
+        self._on_conflict = on_conflict or None
+        return self
+
+    def update(self, json, count=None, returning='representation'):
+        self._op = 'update'
+        self._payload = json
+        self._count = count
+        return self
+
+    def delete(self, count=None, returning='representation'):
+        self._op = 'delete'
+        self._count = count
+        return self
+
+    # -- filters ----------------------------------------------------------
+    def filter(self, column, operator, criteria):
+        negate = operator.startswith('not.')
+        op = operator[4:] if negate else operator
+        if op not in _OPERATORS:
+            raise _api_error(f'unknown operator {op}', 'PGRST100')
+        value = _parse_value(op, criteria) if isinstance(criteria, str) and op == 'in' else criteria
+        node = ('cmp', column, op, value)
+        if negate:
+            node = ('not', node)
+        if '.' in column:
+            path, col = column.rsplit('.', 1)
+            node = ('not', ('cmp', col, op, value)) if negate else ('cmp', col, op, value)
+            self._embed_filters.setdefault(path, []).append(node)
+        else:
+            self._filters.append(node)
+        return self
+
+    def eq(self, column, value):
+        return self.filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self.filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self.filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self.filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self.filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self.filter(column, 'lte', value)
+
+    def like(self, column, pattern):
+        return self.filter(column, 'like', pattern)
+
+    def ilike(self, column, pattern):
+        return self.filter(column, 'ilike', pattern)
+
+    def is_(self, column, value):
+        return self.filter(column, 'is', value)
+
+    def in_(self, column, values):
+        return self.filter(column, 'in', list(values))
+
+    def or_(self, filters, reference_table=None):
+        node = ('or', _parse_logic(filters))
+        if reference_table:
+            self._embed_filters.setdefault(reference_table, []).append(node)
+        else:
+            self._filters.append(node)
+        return self
+
+    def match(self, query):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    # -- modifiers --------------------------------------------------------
+    def order(self, column, *, desc=False, nullsfirst=False, foreign_table=None):
+        if not foreign_table:
+            self._order.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        if not foreign_table:
+            self._limit = size
+        return self
+
+    def offset(self, size):
+        self._offset = size
+        return self
+
+    def range(self, start, end):
+        # Inclusive on both ends, like the Supabase client API
+        self._offset = start
+        self._limit = max(end - start + 1, 0)
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._maybe_single = True
+        return self
+
+    # -- execution --------------------------------------------------------
+    def execute(self):
+        started = time.perf_counter()
+        try:
+            return self._execute()
+        finally:
+            record_query(_HTTP_METHODS[self._op], self._table, (time.perf_counter() - started) * 1000)
+
+    def _execute(self):
+        with self._client.lock:
+            if self._op == 'select':
+                data, count = self._client._run_select(
+                    self._table, _parse_select(self._select), self._filters,
+                    self._embed_filters, self._order, self._limit, self._offset, self._count
+                )
+            elif self._op in ('insert', 'upsert'):
+                data = self._client._run_insert(
+                    self._table, self._payload, upsert=self._op == 'upsert',
+                    on_conflict=self._on_conflict, ignore_duplicates=self._ignore_duplicates
+                )
+                count = len(data) if self._count else None
+            elif self._op == 'update':
+                data = self._client._run_update(self._table, self._payload, self._filters)
+                count = len(data) if self._count else None
+            else:
+                data = self._client._run_delete(self._table, self._filters)
+                count = len(data) if self._count else None
+
+        if self._single or self._maybe_single:
+            if len(data) == 1:
+                return LocalResponse(data=data[0], count=count)
+            if self._maybe_single and not data:
+                return None
+            raise _api_error(
+                'JSON object requested, multiple (or no) rows returned', 'PGRST116',
+                details=f'The result contains {len(data)} rows'
+            )
+        return LocalResponse(data=data, count=count)
+
+
+class LocalRPC:
+    def __init__(self, client, fn, params):
+        self._client = client
+        self._fn = fn
+        self._params = params or {}
+
+    def execute(self):
+        impl = _RPC_FUNCTIONS.get(self._fn)
+        if impl is None:
+            raise _api_error(
+                f'Could not find the function public.{self._fn} in the schema cache', 'PGRST202'
+            )
+        started = time.perf_counter()
+        try:
+            with self._client.lock:
+                return LocalResponse(data=impl(self._client, **self._params))
+        finally:
+            record_query('POST', 'rpc:' + self._fn, (time.perf_counter() - started) * 1000)
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class LocalClient:
+    """Drop-in replacement for the parts of supabase.Client the app uses."""
+
+    def __init__(self, path=':memory:', schema_path=SCHEMA_PATH):
+        self.path = path
+        self.schema = load_schema(schema_path)
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL' if path != ':memory:' else 'PRAGMA journal_mode=MEMORY')
+        for statement in self.schema.ddl():
+            self.connection.execute(statement)
+
+    def table(self, table_name):
+        return LocalQuery(self, table_name)
+
+    def from_(self, table_name):
+        return self.table(table_name)
+
+    def rpc(self, fn, params=None):
+        return LocalRPC(self, fn, params)
+
+    def query(self, sql, params=()):
+        """Run raw SQL and return rows as dicts (for rpc implementations)."""
+        with self.lock:
+            cursor = self.connection.execute(sql, params)
+            names = [d[0] for d in cursor.description] if cursor.description else []
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    # -- helpers ------------------------------------------------------------
+    def _columns(self, table):
+        return self.schema.tables[table]
+
+    def _check_column(self, table, column):
+        if column not in self._columns(table):
+            raise _api_error(f'column {table}.{column} does not exist', '42703')
+
+    def _compile(self, table, node):
+        kind = node[0]
+        if kind == 'not':
+            sql, params = self._compile(table, node[1])
+            return f'NOT ({sql})', params
+        if kind in ('and', 'or'):
+            parts = [self._compile(table, child) for child in node[1]]
+            if not parts:
+                return '1', []
+            joiner = ' AND ' if kind == 'and' else ' OR '
+            return '(' + joiner.join(p[0] for p in parts) + ')', [v for p in parts for v in p[1]]
+
+        _, column, op, value = node
+        self._check_column(table, column)
+        col_kind = self._columns(table)[column]['kind']
+        quoted = f'"{column}"'
+        if op in _SQL_COMPARISONS:
+            if value is None or (isinstance(value, str) and value.lower() == 'null'):
+                return (f'{quoted} IS NULL' if op == 'eq' else f'{quoted} IS NOT NULL'), []
+            return f'{quoted} {_SQL_COMPARISONS[op]} ?', [_to_db(col_kind, value)]
+        if op == 'is':
+            text = str(value).lower()
+            if value is None or text == 'null':
+                return f'{quoted} IS NULL', []
+            return f'{quoted} = ?', [1 if text == 'true' else 0]
+        if op == 'in':
+            values = list(value)
+            if not values:
+                return '0', []
+            return f'{quoted} IN ({", ".join("?" for _ in values)})', [_to_db(col_kind, v) for v in values]
+        pattern = str(value).replace('*', '%')
+        if op == 'ilike':
+            return f'{quoted} LIKE ?', [pattern]
+        return f'{quoted} GLOB ?', [pattern.replace('%', '*').replace('_', '?')]
+
+    def _where(self, table, filters):
+        if not filters:
+            return '', []
+        sql, params = self._compile(table, ('and', filters))
+        return f' WHERE {sql}', params
+
+    def _row_to_dict(self, table, names, row):
+        columns = self._columns(table)
+        return {n: _from_db(columns[n]['kind'], v) if n in columns else v for n, v in zip(names, row)}
+
+    def _relationship(self, table, name, hint):
+        fks = self.schema.foreign_keys
+        # Column hint, e.g. reviewer:ReviewedByUserID(...)
+        for col, ref_table, ref_col in fks.get(table, []):
+            if col == name:
+                return 'one', col, ref_table, ref_col
+        for col, ref_table, ref_col in fks.get(table, []):
+            if ref_table == name and (hint is None or hint == col):
+                return 'one', col, ref_table, ref_col
+        for col, ref_table, ref_col in fks.get(name, []):
+            if ref_table == table and (hint is None or hint == col):
+                return 'many', ref_col, name, col
+        raise _api_error(
+            f"Could not find a relationship between '{table}' and '{name}' in the schema cache",
+            'PGRST200'
+        )
+
+    def _run_select(self, table, fields, filters, embed_filters, order, limit, offset, count, path=''):
+        columns = self._columns(table)
+        wanted = []
+        for field in fields:
+            if field['type'] == 'star':
+                wanted.extend(c for c in columns if c not in wanted)
+            elif field['type'] == 'column':
+                self._check_column(table, field['name'])
+                if field['name'] not in wanted:
+                    wanted.append(field['name'])
+
+        # Columns needed to join embedded resources, even if not selected
+        embeds = []
+        fetch = list(wanted)
+        for field in fields:
+            if field['type'] != 'embed':
+                continue
+            rel = self._relationship(table, field['name'], field['hint'])
+            embeds.append((field, rel))
+            if rel[1] not in fetch:
+                fetch.append(rel[1])
+
+        where, params = self._where(table, filters)
+        total = None
+        if count:
+            total = self.connection.execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
+
+        sql = 'SELECT ' + ', '.join(f'"{c}"' for c in fetch) + f' FROM "{table}"{where}'
+        if order:
+            terms = []
+            for column, desc, nullsfirst in order:
+                self._check_column(table, column)
+                # PostgreSQL sorts NULLs last ascending and first descending
+                nulls_first = nullsfirst or desc
+                terms.append(f'("{column}" IS NULL) {"DESC" if nulls_first else "ASC"}')
+                terms.append(f'"{column}" {"DESC" if desc else "ASC"}')
+            sql += ' ORDER BY ' + ', '.join(terms)
+        if limit is not None or offset:
+            sql += f' LIMIT {int(limit) if limit is not None else -1}'
+            if offset:
+                sql += f' OFFSET {int(offset)}'
+
+        rows = [self._row_to_dict(table, fetch, r) for r in self.connection.execute(sql, params).fetchall()]
+
+        for field, (kind, local_col, remote_table, remote_col) in embeds:
+            self._attach_embed(rows, field, kind, local_col, remote_table, remote_col, embed_filters, path)
+
+        output = []
+        for row in rows:
+            out = {}
+            for field in fields:
+                if field['type'] == 'star':
+                    for c in columns:
+                        out.setdefault(c, row[c])
+                elif field['type'] == 'column':
+                    out[field['alias']] = row[field['name']]
+                else:
+                    out[field['alias']] = row[field['alias'] + '\x00embed']
+            output.append(out)
+        return output, total
+
+    def _attach_embed(self, rows, field, kind, local_col, remote_table, remote_col, embed_filters, path):
+        embed_path = f"{path}.{field['alias']}" if path else field['alias']
+        name_path = f"{path}.{field['name']}" if path else field['name']
+        key = embed_path + '\x00embed'
+        keys = list({row[local_col] for row in rows if row.get(local_col) is not None})
+        if not keys:
+            for row in rows:
+                row[key] = None if kind == 'one' else []
+            return
+
+        sub_fields = list(field['fields'])
+        if not any(f['type'] == 'star' or (f['type'] == 'column' and f['name'] == remote_col) for f in sub_fields):
+            sub_fields.append({'type': 'column', 'alias': remote_col + '\x00key', 'name': remote_col})
+            join_key = remote_col + '\x00key'
+        else:
+            join_key = next(
+                (f['alias'] for f in sub_fields if f['type'] == 'column' and f['name'] == remote_col),
+                remote_col
+            )
+
+        filters = [('cmp', remote_col, 'in', keys)]
+        filters += embed_filters.get(embed_path, []) + (
+            embed_filters.get(name_path, []) if name_path != embed_path else []
+        )
+        remote_rows, _ = self._run_select(
+            remote_table, sub_fields, filters, embed_filters, [], None, None, None, embed_path
+        )
+
+        grouped = {}
+        for r in remote_rows:
+            k = r[join_key]
+            if join_key.endswith('\x00key'):
+                del r[join_key]
+            grouped.setdefault(k, []).append(r)
+        for row in rows:
+            matches = grouped.get(row.get(local_col), [])
+            row[field['alias'] + '\x00embed'] = (matches[0] if matches else None) if kind == 'one' else matches
+
+    def _prepare_row(self, table, row, fill_defaults):
+        columns = self._columns(table)
+        prepared = {}
+        for column, value in row.items():
+            if column not in columns:
+                raise _api_error(
+                    f"Could not find the '{column}' column of '{table}' in the schema cache", 'PGRST204'
+                )
+            prepared[column] = _to_db(columns[column]['kind'], value)
+        if fill_defaults:
+            for column, spec in columns.items():
+                if column in prepared or spec['identity']:
+                    continue
+                default = spec['default']
+                if default is not None:
+                    prepared[column] = _to_db(spec['kind'], default() if callable(default) else default)
+        return prepared
+
+    def _fetch_rowids(self, table, rowids):
+        if not rowids:
+            return []
+        names = list(self._columns(table))
+        placeholders = ', '.join('?' for _ in rowids)
+        cursor = self.connection.execute(
+            'SELECT rowid, ' + ', '.join(f'"{c}"' for c in names)
+            + f' FROM "{table}" WHERE rowid IN ({placeholders})', rowids
+        )
+        by_rowid = {r[0]: self._row_to_dict(table, names, r[1:]) for r in cursor.fetchall()}
+        return [by_rowid[r] for r in rowids if r in by_rowid]
+
+    def _execute_write(self, sql, params):
+        try:
+            return self.connection.execute(sql, params)
+        except sqlite3.IntegrityError as e:
+            message = str(e)
+            code = '23505' if 'UNIQUE' in message else '23502' if 'NOT NULL' in message else '23000'
+            raise _api_error(message, code)
+
+    def _run_insert(self, table, payload, upsert=False, on_conflict=None, ignore_duplicates=False):
+        rows = payload if isinstance(payload, list) else [payload]
+        # A bulk insert is one statement in Postgres: all rows or none
+        self.connection.execute('SAVEPOINT bulk_insert')
+        try:
+            rowids = self._insert_rows(table, rows, upsert, on_conflict, ignore_duplicates)
+        except BaseException:
+            self.connection.execute('ROLLBACK TO bulk_insert')
+            raise
+        finally:
+            self.connection.execute('RELEASE bulk_insert')
+        return self._fetch_rowids(table, rowids)
+
+    def _insert_rows(self, table, rows, upsert, on_conflict, ignore_duplicates):
+        rowids = []
+        for row in rows:
+            prepared = self._prepare_row(table, row, fill_defaults=True)
+            cols = list(prepared)
+            sql = f'INSERT INTO "{table}" (' + ', '.join(f'"{c}"' for c in cols) + ') VALUES (' \
+                + ', '.join('?' for _ in cols) + ')'
+            if not cols:
+                sql = f'INSERT INTO "{table}" DEFAULT VALUES'
+            if upsert:
+                target = on_conflict.split(',') if on_conflict else self.schema.primary_keys.get(table, [])
+                target = [t.strip() for t in target]
+                updates = [c for c in cols if c not in target]
+                sql += ' ON CONFLICT (' + ', '.join(f'"{t}"' for t in target) + ')'
+                if ignore_duplicates or not updates:
+                    sql += ' DO NOTHING'
+                else:
+                    sql += ' DO UPDATE SET ' + ', '.join(f'"{c}" = excluded."{c}"' for c in updates)
+            sql += ' RETURNING rowid'
+            result = self._execute_write(sql, [prepared[c] for c in cols]).fetchone()
+            if result:
+                rowids.append(result[0])
+        return rowids
+
+    def _run_update(self, table, payload, filters):
+        prepared = self._prepare_row(table, payload, fill_defaults=False)
+        if not prepared:
+            return []
+        where, params = self._where(table, filters)
+        sql = f'UPDATE "{table}" SET ' + ', '.join(f'"{c}" = ?' for c in prepared) + where + ' RETURNING rowid'
+        rowids = [r[0] for r in self._execute_write(sql, list(prepared.values()) + params).fetchall()]
+        return self._fetch_rowids(table, rowids)
+
+    def _run_delete(self, table, filters):
+        where, params = self._where(table, filters)
+        names = list(self._columns(table))
+        cursor = self._execute_write(
+            f'DELETE FROM "{table}"{where} RETURNING ' + ', '.join(f'"{c}"' for c in names), params
+        )
+        return [self._row_to_dict(table, names, r) for r in cursor.fetchall()]
+
+
+# ---------------------------------------------------------------------------
+# Demo data
+# ---------------------------------------------------------------------------
+
+def seed_demo_data(client, users=200, accounts=100, registrations=50, event_logs=5000, seed=0):
+    """
+    Fill a local database with realistic-looking data for benchmarks.
+
+    Creates the three roles, a handful of security questions, an `admin`
+    user (password Admin123!) and the requested number of other rows.
+
+    Returns:
+        dict: Number of rows created per table
+    """
+    from passwordHash import hash_password
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    first_names = ['Ava', 'Liam', 'Noah', 'Emma', 'Mia', 'Ethan', 'Kade', 'Rami', 'Roby', 'Zoe', 'Omar', 'Ivy']
+    last_names = ['Dillon', 'Fleming', 'Elmostafa', 'Bearden', 'Nguyen', 'Patel', 'Garcia', 'Smith', 'Lee', 'Khan']
+
+    for role in ('administrator', 'manager', 'accountant'):
+        client.table('roles').upsert({'RoleName': role}, on_conflict='RoleName').execute()
+    for text in ('What city were you born in?', 'What was your first pet\'s name?', 'What is your favorite book?'):
+        client.table('security_questions').upsert({'QuestionText': text}, on_conflict='QuestionText').execute()
+
+    password_hash = hash_password('Admin123!')
+    user_rows = [{
+        'Username': 'admin', 'PasswordHash': password_hash, 'FirstName': 'Admin', 'LastName': 'User',
+        'Email': 'admin@finken.local', 'RoleID': 1, 'DateCreated': (now - timedelta(days=400)).isoformat(),
+        'PasswordExpiryDate': (now + timedelta(days=30)).isoformat(),
+    }]
+    for i in range(1, users):
+        first, last = rng.choice(first_names), rng.choice(last_names)
+        created = now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440))
+        suspended = rng.random() < 0.05
+        user_rows.append({
+            'Username': f'{first[0].lower()}{last.lower()}{created.strftime("%m%y")}{i}',
+            'PasswordHash': password_hash, 'FirstName': first, 'LastName': last,
+            'Email': f'{first.lower()}.{last.lower()}{i}@example.com',
+            'RoleID': rng.choice([1, 2, 3, 3, 3]), 'IsActive': rng.random() > 0.1,
+            'IsSuspended': suspended,
+            'SuspensionEndDate': (now + timedelta(days=rng.randint(-5, 10))).isoformat() if suspended else None,
+            'PasswordExpiryDate': (now + timedelta(days=rng.randint(-10, 60))).isoformat(),
+            'DateCreated': created.isoformat(),
+        })
+    created_users = client.table('users').insert(user_rows).execute().data
+    user_ids = [u['UserID'] for u in created_users]
+
+    categories = [('Asset', '01', 'Debit', 'BS'), ('Liability', '02', 'Credit', 'BS'),
+                  ('Equity', '03', 'Credit', 'RE'), ('Revenue', '04', 'Credit', 'IS'),
+                  ('Expense', '05', 'Debit', 'IS')]
+    account_rows = []
+    for i in range(accounts):
+        category, prefix, side, statement = categories[i % len(categories)]
+        account_rows.append({
+            'accountnumber': f'{prefix}{i:04d}', 'accountname': f'{category} account {i}',
+            'accountdescription': f'Demo {category.lower()} account', 'normalside': side,
+            'category': category, 'subcategory': rng.choice(['Current', 'Long-term', 'Operating']),
+            'initialbalance': round(rng.uniform(0, 50000), 2), 'displayorder': i,
+            'statementtype': statement, 'isactive': rng.random() > 0.05,
+            'createdbyuserid': user_ids[0], 'comment': None,
+        })
+    created_accounts = client.table('chart_of_accounts').insert(account_rows).execute().data
+
+    registration_rows = []
+    for i in range(registrations):
+        status = rng.choice(['Pending', 'Approved', 'Rejected'])
+        registration_rows.append({
+            'FirstName': rng.choice(first_names), 'LastName': rng.choice(last_names),
+            'Email': f'applicant{i}@example.com', 'Address': f'{rng.randint(1, 999)} Main St',
+            'RequestDate': (now - timedelta(days=rng.randint(0, 120))).isoformat(), 'Status': status,
+            'ReviewedByUserID': user_ids[0] if status != 'Pending' else None,
+        })
+    client.table('registration_requests').insert(registration_rows).execute()
+
+    log_rows = []
+    start = now - timedelta(days=365)
+    for i in range(event_logs):
+        account = rng.choice(created_accounts)
+        action = rng.choice(['INSERT', 'UPDATE', 'UPDATE', 'UPDATE', 'DEACTIVATE'])
+        after = dict(account, comment=f'edit {i}')
+        log_rows.append({
+            'userid': rng.choice(user_ids[:20]),
+            'timestamp': (start + timedelta(seconds=i * (365 * 86400 // max(event_logs, 1)))).isoformat(),
+            'actiontype': action, 'tablename': rng.choice(['chart_of_accounts', 'chart_of_accounts', 'users']),
+            'recordid': account['accountid'],
+            'beforevalue': json.dumps(account) if action != 'INSERT' else None,
+            'aftervalue': json.dumps(after),
+        })
+    for chunk in range(0, len(log_rows), 1000):
+        client.table('event_logs').insert(log_rows[chunk:chunk + 1000]).execute()
+
+    return {
+        'users': len(user_rows), 'chart_of_accounts': len(account_rows),
+        'registration_requests': len(registration_rows), 'event_logs': len(log_rows),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Create a seeded local FinKen database')
+    parser.add_argument('--db', default='finken_local.db', help='SQLite file to create or extend')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--registrations', type=int, default=50)
+    parser.add_argument('--event-logs', type=int, default=5000)
+    args = parser.parse_args()
+
+    db = LocalClient(args.db)
+    counts = seed_demo_data(db, users=args.users, accounts=args.accounts,
+                            registrations=args.registrations, event_logs=args.event_logs)
+    db.close()
+    print(f"Seeded {args.db}: {counts}")
+    print(f"Run the app against it with FINKEN_DB_BACKEND=local FINKEN_LOCAL_DB={args.db}")
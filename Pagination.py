@@ -0,0 +1,183 @@
+"""
+Pagination.py
+
+Shared helpers for the paginated listings (users, chart of accounts,
+registration requests). The filters are built once and the row count rides on
+the page query itself (select(..., count=...)), so a page costs one round trip.
+
+Count modes:
+    exact      - precise total (a full count of the matching rows)
+    planned    - the Postgres planner's estimate; cheap on large tables
+    estimated  - exact for small results, planner estimate beyond that
+    none       - no total; has_next comes from fetching one extra row
+
+Listings page either by offset (fetch_page) or by keyset cursor
+(fetch_keyset_page).
+"""
+
+import base64
+import json
+import math
+
+COUNT_MODES = ('exact', 'planned', 'estimated', 'none')
+
+
+def normalize_count_mode(count):
+    """Return a supported count mode, defaulting to 'exact'."""
+    count = (count or 'exact').lower()
+    return count if count in COUNT_MODES else 'exact'
+
+
+def build_listing_query(sb, table, columns, search_term='', search_columns=(), equals=None, count='exact'):
+    """
+    Start a filtered select that also returns the row count.
+
+    Args:
+        sb: Supabase client
+        table (str): Table to list
+        columns (str): PostgREST select string
+        search_term (str): Matched case-insensitively against search_columns
+        search_columns (iterable): Columns searched with ilike
+        equals (dict): column -> value equality filters; None/'' values are skipped
+
+    Returns:
+        Query builder ready for fetch_page()
+    """
+    count = normalize_count_mode(count)
+    query = sb.table(table).select(columns, count=None if count == 'none' else count)
+
+    if search_term and search_columns:
+        query = query.or_(','.join(f'{column}.ilike.%{search_term}%' for column in search_columns))
+
+    for column, value in (equals or {}).items():
+        if value is None or value == '':
+            continue
+        query = query.eq(column, value)
+
+    return query
+
+
+def fetch_page(query, page, per_page, order_by, desc=False, count='exact', total_key='total_count'):
+    """
+    Execute one page of a listing query.
+
+    One extra row is requested so has_next is right even when the total is an
+    estimate (or not counted at all).
+
+    Returns:
+        tuple: (rows, pagination dict) with the same keys the listings have
+               always returned; the total is stored under total_key
+    """
+    count = normalize_count_mode(count)
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+
+    response = query.order(order_by, desc=desc).range(offset, offset + per_page).execute()
+    rows = response.data or []
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if count == 'none':
+        total = None
+        total_pages = page + 1 if has_next else page
+    else:
+        total = getattr(response, 'count', None)
+        if total is None:
+            total = offset + len(rows) + (1 if has_next else 0)
+        total_pages = math.ceil(total / per_page) if total > 0 else 1
+        # Estimates can undershoot; never claim fewer pages than we can see
+        total_pages = max(total_pages, page + 1 if has_next else page)
+
+    pagination = {
+        'current_page': page,
+        'per_page': per_page,
+        total_key: total,
+        'total_pages': total_pages,
+        'count_mode': count,
+        'has_prev': page > 1,
+        'has_next': has_next,
+        'prev_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if has_next else None
+    }
+    return rows, pagination
+
+
+# ---------------------------------------------------------------------------
+# Keyset (cursor) pagination
+# ---------------------------------------------------------------------------
+# Offset paging makes the database walk and discard every skipped row, so deep
+# pages get slower as a table grows. A cursor instead records the sort value
+# and id of the last row shown; the next page starts right after it, which an
+# index on (sort column, id) serves directly.
+
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor for the row with this sort value and id."""
+    raw = json.dumps([sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return (sort_value, row_id) from a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+    return sort_value, row_id
+
+
+def _quote(value):
+    # Logic-tree values are double-quoted so timestamps and names with
+    # commas, dots or parentheses survive PostgREST's parser
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+
+def fetch_keyset_page(query, per_page, order_by, id_column, desc=False, cursor='', count='exact',
+                      total_key='total_count'):
+    """
+    Execute one page of a listing query in cursor mode.
+
+    Rows are ordered by (order_by, id_column); an empty cursor starts at the
+    first row. Past the first page the count would only cover the remaining
+    rows, so the total is reported on the first page only; callers keep it and
+    can pass count='none' for the pages after.
+
+    Returns:
+        tuple: (rows, pagination dict with next_cursor / has_next)
+    """
+    count = normalize_count_mode(count)
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        op = 'lt' if desc else 'gt'
+        query = query.or_(
+            f'{order_by}.{op}.{_quote(sort_value)},'
+            f'and({order_by}.eq.{_quote(sort_value)},{id_column}.{op}.{row_id})'
+        )
+
+    response = query.order(order_by, desc=desc).order(id_column, desc=desc).limit(per_page + 1).execute()
+    rows = response.data or []
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_next and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.get(order_by), last.get(id_column))
+
+    pagination = {
+        'mode': 'cursor',
+        'per_page': per_page,
+        'cursor': cursor or None,
+        'next_cursor': next_cursor,
+        'has_prev': bool(cursor),
+        'has_next': has_next,
+        total_key: None if count == 'none' or cursor else getattr(response, 'count', None),
+        'count_mode': count
+    }
+    return rows, pagination
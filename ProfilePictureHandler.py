@@ -1,53 +1,255 @@
 import os
 import io
-from PIL import Image
+import contextvars
+import hashlib
+import re
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from SupabaseClient import _sb
+from ImageStore import get_image_store
+
+# PIL is imported inside the methods that process images, so workers that only
+# render pages never pay for loading it.
+
+# Uploads are kept in the image store (see ImageStore.py); the default avatar
+# is a build asset and always lives in this directory on every node.
+PROFILE_IMAGES_DIR = os.path.join(os.path.dirname(__file__), 'profile_images')
+DEFAULT_PROFILE_PICTURE = 'default_profile.webp'
+
+# Square sizes (px) written at upload time. The largest becomes
+# ProfilePictureURL. Pages pick one with srcset, so the 45px header avatar no
+# longer downloads the 400px image.
+PROFILE_VARIANT_SIZES = (32, 64, 128, 400)
+
+# Uploaded images are stored as user_<id>_profile_<size>_<hash>.webp; the hash
+# covers the file's bytes, so a given URL never changes content.
+CONTENT_HASH_LENGTH = 16
+_CONTENT_HASHED_RE = re.compile(r'_[0-9a-f]{%d}\.webp$' % CONTENT_HASH_LENGTH)
+
+# Upload processing runs in a small process pool so CPU-heavy decoding and
+# encoding never blocks a request worker. PROFILE_IMAGE_WORKERS=0 processes
+# inline instead.
+PROFILE_IMAGE_WORKERS = int(os.environ.get('PROFILE_IMAGE_WORKERS', 2))
+PROFILE_IMAGE_QUEUE = int(os.environ.get('PROFILE_IMAGE_QUEUE', 8))
+
+# Uploads beyond this many pixels are refused before decoding (decompression bombs)
+MAX_PROFILE_IMAGE_PIXELS = int(os.environ.get('MAX_PROFILE_IMAGE_PIXELS', 40_000_000))
+
+# Per-worker LRU of get_profile_picture_url results, keyed by user ID. The page
+# header shows the signed-in user's picture on nearly every render, so caching
+# it saves a database round trip and a filesystem check per page view. Saves and
+# deletes invalidate the entry; the TTL bounds how long another worker's change
+# can take to show up.
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 1024))
+PROFILE_CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL', 300))
+
+# A re-upload leaves the earlier files in place this long before deleting
+# them: other workers may still have the old names cached for up to
+# PROFILE_CACHE_TTL, and would serve the default avatar if the files vanished.
+# Files left behind by a process that exits sooner are removed by the user's
+# next upload.
+PROFILE_STALE_GRACE_SECONDS = float(os.environ.get('PROFILE_STALE_GRACE_SECONDS', PROFILE_CACHE_TTL))
+
+_profile_cache = OrderedDict()
+_profile_cache_lock = threading.Lock()
+
+
+def _cache_get(user_id):
+    with _profile_cache_lock:
+        entry = _profile_cache.get(user_id)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del _profile_cache[user_id]
+            return None
+        _profile_cache.move_to_end(user_id)
+        return dict(result)
+
+
+def _cache_put(user_id, result):
+    with _profile_cache_lock:
+        _profile_cache[user_id] = (time.monotonic() + PROFILE_CACHE_TTL, dict(result))
+        _profile_cache.move_to_end(user_id)
+        while len(_profile_cache) > PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+
+
+def invalidate_profile_picture_cache(user_id=None):
+    """Forget the cached picture for one user (or everyone when user_id is None)."""
+    with _profile_cache_lock:
+        if user_id is None:
+            _profile_cache.clear()
+        else:
+            _profile_cache.pop(user_id, None)
+
+
+def prime_profile_picture_cache(user_id, profile_url, variants=None):
+    """
+    Seed the cache from a users row that was already fetched (e.g. at sign-in),
+    so the first page render needs no extra query.
+
+    Returns:
+        dict: The cached result, shaped like get_profile_picture_url's
+    """
+    if profile_url and profile_url.strip() and get_image_store().exists(profile_url):
+        result = {'success': True, 'profile_picture': profile_url, 'variants': variants or {}, 'is_default': False}
+    else:
+        result = {'success': True, 'profile_picture': DEFAULT_PROFILE_PICTURE, 'is_default': True}
+    _cache_put(user_id, result)
+    return result
+
+
+def ensure_default_profile_picture():
+    """
+    Create the profile images directory and the default avatar if missing.
+
+    Called once at app startup (and safe to run at build time), so no request
+    ever has to render the default image.
+    """
+    os.makedirs(PROFILE_IMAGES_DIR, exist_ok=True)
+    default_path = os.path.join(PROFILE_IMAGES_DIR, DEFAULT_PROFILE_PICTURE)
+
+    if not os.path.exists(default_path):
+        from PIL import Image, ImageDraw
+
+        # Create a simple default avatar (gray circle with white background)
+        size = (200, 200)
+        image = Image.new('RGB', size, color='white')
+        draw = ImageDraw.Draw(image)
+
+        # Draw a gray circle
+        margin = 20
+        draw.ellipse([margin, margin, size[0] - margin, size[1] - margin],
+                     fill='#CCCCCC', outline='#999999', width=2)
+
+        # Save as WebP
+        image.save(default_path, 'WEBP', quality=85)
+    return default_path
+
+
+_default_picture_bytes = None
+_default_picture_etag = None
+
+
+def default_profile_picture_bytes():
+    """The default avatar's bytes, read from disk once per process."""
+    global _default_picture_bytes
+    if _default_picture_bytes is None:
+        with open(ensure_default_profile_picture(), 'rb') as f:
+            _default_picture_bytes = f.read()
+    return _default_picture_bytes
+
+
+def default_profile_picture_etag():
+    """ETag for the default avatar, hashed once per process."""
+    global _default_picture_etag
+    if _default_picture_etag is None:
+        _default_picture_etag = hashlib.sha256(default_profile_picture_bytes()).hexdigest()[:CONTENT_HASH_LENGTH]
+    return _default_picture_etag
+
+
+def is_content_hashed(filename):
+    """True for upload filenames that embed a hash of their bytes."""
+    return bool(_CONTENT_HASHED_RE.search(filename))
+
+
+def _check_image_header(image_data):
+    """Validate an upload's format and pixel count without decoding it."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_data)) as image:
+        width, height = image.size
+    if width * height > MAX_PROFILE_IMAGE_PIXELS:
+        raise ValueError(f'Image is too large ({width}x{height}); the limit is {MAX_PROFILE_IMAGE_PIXELS:,} pixels')
+
+
+def _open_image(source, max_size):
+    """
+    Open an upload for processing, refusing decompression bombs.
+
+    JPEGs are decoded with draft(), which lets libjpeg scale down by up to 8x
+    while decoding, so a 12MP phone photo never materialises at full size.
+    """
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = MAX_PROFILE_IMAGE_PIXELS
+    image = Image.open(source)
+    width, height = image.size
+    if width * height > MAX_PROFILE_IMAGE_PIXELS:
+        raise ValueError(f'Image is too large ({width}x{height}); the limit is {MAX_PROFILE_IMAGE_PIXELS:,} pixels')
+    if image.format == 'JPEG':
+        image.draft('RGB', max_size)
+    image.load()
+    return image
+
+
+def process_profile_image(image_data, user_id, store, max_size=(400, 400), quality=85):
+    """
+    Pool entry point: write the size variants for an uploaded image.
+
+    Runs in a worker process, so it only touches the image store; the caller
+    records the result in the database.
+
+    Returns:
+        dict: {str(size): filename}
+    """
+    handler = ProfilePictureHandler(store=store)
+    return handler._process_image(user_id, image_data, max_size, quality)
+
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+# At most this many uploads queued or running at once
+_image_slots = threading.BoundedSemaphore(max(PROFILE_IMAGE_QUEUE, 1))
+
+
+def _get_image_pool():
+    global _image_pool
+    if _image_pool is None:
+        with _image_pool_lock:
+            if _image_pool is None:
+                # spawn: workers must not inherit the web process's sockets and threads
+                _image_pool = ProcessPoolExecutor(
+                    max_workers=PROFILE_IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn')
+                )
+    return _image_pool
+
+
+def wait_for_image_jobs():
+    """Block until every queued profile picture has been processed (tests, shutdown)."""
+    for _ in range(max(PROFILE_IMAGE_QUEUE, 1)):
+        _image_slots.acquire()
+    for _ in range(max(PROFILE_IMAGE_QUEUE, 1)):
+        _image_slots.release()
 
-load_dotenv()
 
 class ProfilePictureHandler:
-    def __init__(self):
-        """Initialize the profile picture handler with Supabase connection."""
-        self.supabase_url = os.environ.get('SUPABASE_URL')
-        self.supabase_key = os.environ.get('SUPABASE_ANON_KEY')
-        self.profile_images_dir = os.path.join(os.path.dirname(__file__), 'profile_images')
-        self.default_profile_picture = 'default_profile.webp'
-        
-        if not self.supabase_url or not self.supabase_key:
-            raise ValueError("Supabase URL and API key must be set in environment variables")
-        
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
-        
-        # Ensure profile images directory exists
-        os.makedirs(self.profile_images_dir, exist_ok=True)
-        
-        # Create default profile picture if it doesn't exist
-        self._create_default_profile_picture()
-    
-    def _create_default_profile_picture(self):
-        """Create a default profile picture if it doesn't exist."""
-        default_path = os.path.join(self.profile_images_dir, self.default_profile_picture)
-        
-        if not os.path.exists(default_path):
-            # Create a simple default avatar (gray circle with white background)
-            size = (200, 200)
-            image = Image.new('RGB', size, color='white')
-            
-            # You can customize this to create a more sophisticated default image
-            # For now, we'll create a simple gray circle
-            from PIL import ImageDraw
-            draw = ImageDraw.Draw(image)
-            
-            # Draw a gray circle
-            margin = 20
-            draw.ellipse([margin, margin, size[0] - margin, size[1] - margin], 
-                        fill='#CCCCCC', outline='#999999', width=2)
-            
-            # Save as WebP
-            image.save(default_path, 'WEBP', quality=85)
-    
+    def __init__(self, sb=None, store=None):
+        """
+        Initialize the profile picture handler.
+
+        Args:
+            sb: Supabase client; defaults to the shared per-process client
+            store: Image store; defaults to the shared per-process store
+        """
+        self._supabase = sb
+        self._store = store
+        self.default_profile_picture = DEFAULT_PROFILE_PICTURE
+
+    @property
+    def supabase(self):
+        # Resolved on use so the handler never opens its own connection pool
+        return self._supabase or _sb()
+
+    @property
+    def store(self):
+        return self._store or get_image_store()
+
     def get_profile_picture_url(self, user_id):
         """
         Get the profile picture URL for a user from the database.
@@ -61,18 +263,20 @@ class ProfilePictureHandler:
         """
         try:
             # Query the database for the user's profile picture URL
-            response = self.supabase.table('users').select('ProfilePictureURL').eq('UserID', user_id).execute()
+            response = self.supabase.table('users').select(
+                'ProfilePictureURL, ProfilePictureVariants'
+            ).eq('UserID', user_id).execute()
             
             if response.data and len(response.data) > 0:
                 profile_url = response.data[0].get('ProfilePictureURL')
                 
                 if profile_url and profile_url.strip():
                     # Check if the file actually exists
-                    profile_path = os.path.join(self.profile_images_dir, profile_url)
-                    if os.path.exists(profile_path):
+                    if self.store.exists(profile_url):
                         return {
                             'success': True,
                             'profile_picture': profile_url,
+                            'variants': response.data[0].get('ProfilePictureVariants') or {},
                             'is_default': False
                         }
                 
@@ -102,6 +306,9 @@ class ProfilePictureHandler:
         """
         Save a profile picture for a user, converting it to WebP format.
         
+        Processing happens on the calling thread; request handlers should use
+        save_profile_picture_async instead.
+        
         Args:
             user_id (int): The user's ID
             image_file: File object (from Flask request.files) or PIL Image
@@ -112,74 +319,227 @@ class ProfilePictureHandler:
             dict: Response with success flag and message
         """
         try:
-            # Generate filename based on user ID
-            filename = f"user_{user_id}_profile.webp"
-            file_path = os.path.join(self.profile_images_dir, filename)
-            
-            # Handle different input types
-            if hasattr(image_file, 'read'):
-                # File object from Flask
-                image_data = image_file.read()
-                image = Image.open(io.BytesIO(image_data))
-            elif isinstance(image_file, str):
-                # File path
-                image = Image.open(image_file)
-            elif isinstance(image_file, Image.Image):
-                # PIL Image object
-                image = image_file
-            else:
+            variants = self._process_image(user_id, image_file, max_size, quality)
+            if variants is None:
                 return {
                     'success': False,
                     'message': 'Invalid image file format'
                 }
+            return self._record_profile_picture(user_id, variants)
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error saving profile picture: {str(e)}'
+            }
+    
+    def save_profile_picture_async(self, user_id, image_file, max_size=(400, 400), quality=85):
+        """
+        Queue a profile picture for processing off the request thread.
+        
+        The upload is read and its dimensions checked here; decoding, resizing
+        and encoding run in the image process pool. The users row is updated
+        when the variants are written, so the default avatar is shown until then.
+        
+        Args:
+            user_id (int): The user's ID
+            image_file: File object (from Flask request.files) or file path
+            max_size (tuple): Maximum dimensions for the image (width, height)
+            quality (int): WebP quality (1-100)
             
-            # Convert to RGB if necessary (handles RGBA, P mode, etc.)
-            if image.mode in ('RGBA', 'LA', 'P'):
-                # Create white background for transparent images
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Resize image while maintaining aspect ratio
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Make image square by cropping or padding
-            image = self._make_square(image, max_size[0])
+        Returns:
+            dict: Response with success flag, message and pending flag
+        """
+        try:
+            if hasattr(image_file, 'read'):
+                image_data = image_file.read()
+            elif isinstance(image_file, str):
+                with open(image_file, 'rb') as f:
+                    image_data = f.read()
+            else:
+                return self.save_profile_picture(user_id, image_file, max_size, quality)
             
-            # Save as WebP
-            image.save(file_path, 'WEBP', quality=quality, optimize=True)
+            # Reject bad or oversized uploads now, while the user is still here
+            _check_image_header(image_data)
             
-            # Update database with new profile picture URL
-            update_response = self.supabase.table('users').update({
-                'ProfilePictureURL': filename
-            }).eq('UserID', user_id).execute()
+            if PROFILE_IMAGE_WORKERS <= 0:
+                return self.save_profile_picture(user_id, io.BytesIO(image_data), max_size, quality)
             
-            if update_response.data:
-                return {
-                    'success': True,
-                    'message': 'Profile picture saved successfully',
-                    'filename': filename,
-                    'file_path': file_path
-                }
-            else:
-                # Delete the file if database update failed
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            if not _image_slots.acquire(blocking=False):
                 return {
                     'success': False,
-                    'message': 'Failed to update database with new profile picture'
+                    'message': 'Image processing is busy, please upload your picture again shortly'
                 }
-                
+            try:
+                future = _get_image_pool().submit(
+                    process_profile_image, image_data, user_id, self.store, max_size, quality
+                )
+            except Exception:
+                _image_slots.release()
+                raise
+            
+            # Finish on a pool thread with this request's audit user
+            context = contextvars.copy_context()
+            future.add_done_callback(lambda f: context.run(self._finish_async_save, user_id, f))
+            return {
+                'success': True,
+                'pending': True,
+                'message': 'Profile picture is being processed'
+            }
+        
         except Exception as e:
             return {
                 'success': False,
                 'message': f'Error saving profile picture: {str(e)}'
             }
     
+    def _finish_async_save(self, user_id, future):
+        try:
+            variants = future.result()
+            result = self._record_profile_picture(user_id, variants)
+            if not result.get('success'):
+                print(f"Profile picture for user {user_id} not saved: {result.get('message')}")
+        except Exception as e:
+            print(f"Error processing profile picture for user {user_id}: {e}")
+        finally:
+            _image_slots.release()
+    
+    def _process_image(self, user_id, image_file, max_size=(400, 400), quality=85):
+        """
+        Decode, square and write every size variant of an uploaded image.
+        
+        Returns:
+            dict: {str(size): filename}, or None for an unsupported input type
+        """
+        from PIL import Image
+
+        # Handle different input types
+        if isinstance(image_file, (bytes, bytearray)):
+            image = _open_image(io.BytesIO(image_file), max_size)
+        elif hasattr(image_file, 'read'):
+            # File object from Flask
+            image_data = image_file.read()
+            image = _open_image(io.BytesIO(image_data), max_size)
+        elif isinstance(image_file, str):
+            # File path
+            image = _open_image(image_file, max_size)
+        elif isinstance(image_file, Image.Image):
+            # PIL Image object
+            image = image_file
+        else:
+            return None
+        
+        # Convert to RGB if necessary (handles RGBA, P mode, etc.)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Create white background for transparent images
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            if image.mode == 'P':
+                image = image.convert('RGBA')
+            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # Resize image while maintaining aspect ratio
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        
+        # Make image square by cropping or padding
+        image = self._make_square(image, max_size[0])
+        
+        # Save as WebP, once per display size
+        return self._save_variants(user_id, image, quality)
+    
+    def _record_profile_picture(self, user_id, variants):
+        """Point the users row at freshly written variants."""
+        filename = variants[str(max(int(size) for size in variants))]
+        
+        # Update database with new profile picture URL and its variants
+        update_response = self.supabase.table('users').update({
+            'ProfilePictureURL': filename,
+            'ProfilePictureVariants': variants
+        }).eq('UserID', user_id).execute()
+        
+        if update_response.data:
+            invalidate_profile_picture_cache(user_id)
+            # Earlier uploads live under other hashed names; they're unreferenced
+            # now, but other workers' caches may still point at them
+            self._schedule_stale_sweep(user_id, self._stale_files(user_id, set(variants.values())))
+            return {
+                'success': True,
+                'message': 'Profile picture saved successfully',
+                'filename': filename,
+                'file_path': self.store.local_path(filename),
+                'variants': variants
+            }
+        else:
+            # Delete the files if database update failed
+            self._remove_files(variants.values())
+            return {
+                'success': False,
+                'message': 'Failed to update database with new profile picture'
+            }
+    
+    def _save_variants(self, user_id, image, quality):
+        """
+        Write the square image at each PROFILE_VARIANT_SIZES size.
+
+        Each file is named after a hash of its bytes, so a re-upload gets new
+        URLs and browsers can cache every image forever.
+
+        Returns:
+            dict: {str(size): filename}; sizes larger than the image are skipped
+        """
+        from PIL import Image
+
+        variants = {}
+        largest = image.size[0]
+        for size in sorted(PROFILE_VARIANT_SIZES, reverse=True):
+            if size > largest:
+                continue
+            variant = image if size == largest else image.resize((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, 'WEBP', quality=quality, optimize=True)
+            data = buffer.getvalue()
+            digest = hashlib.sha256(data).hexdigest()[:CONTENT_HASH_LENGTH]
+            variant_name = f"user_{user_id}_profile_{size}_{digest}.webp"
+            self.store.put(variant_name, data, 'image/webp')
+            variants[str(size)] = variant_name
+        return variants
+    
+    def _stale_files(self, user_id, keep):
+        """This user's earlier uploads: every stored file of theirs not in `keep`."""
+        prefix = f"user_{user_id}_profile"
+        return [
+            name for name in self.store.list(prefix)
+            if name not in keep and (name == f"{prefix}.webp" or name.startswith(f"{prefix}_"))
+        ]
+    
+    def _schedule_stale_sweep(self, user_id, names):
+        """Delete superseded files once no worker can still have them cached."""
+        if not names:
+            return
+        timer = threading.Timer(PROFILE_STALE_GRACE_SECONDS, self._sweep_stale_files, args=(user_id, names))
+        timer.daemon = True
+        timer.start()
+    
+    def _sweep_stale_files(self, user_id, names):
+        try:
+            # Uploading the same picture again brings its old names back into use
+            row = self.supabase.table('users').select(
+                'ProfilePictureURL, ProfilePictureVariants'
+            ).eq('UserID', user_id).execute().data
+            current = set()
+            if row:
+                current = {row[0].get('ProfilePictureURL')} | set((row[0].get('ProfilePictureVariants') or {}).values())
+            self._remove_files(name for name in names if name not in current)
+        except Exception as e:
+            print(f"Error removing old profile pictures for user {user_id}: {e}")
+    
+    def _remove_files(self, filenames):
+        names = [name for name in filenames if name and name != self.default_profile_picture]
+        if names:
+            self.store.delete(names)
+    
     def _make_square(self, image, target_size):
         """
         Make an image square by cropping from the center or padding.
@@ -191,6 +551,8 @@ class ProfilePictureHandler:
         Returns:
             PIL.Image: Square image
         """
+        from PIL import Image
+
         width, height = image.size
         
         if width == height:
@@ -222,23 +584,25 @@ class ProfilePictureHandler:
         """
         try:
             # Get current profile picture filename
-            response = self.supabase.table('users').select('ProfilePictureURL').eq('UserID', user_id).execute()
+            response = self.supabase.table('users').select(
+                'ProfilePictureURL, ProfilePictureVariants'
+            ).eq('UserID', user_id).execute()
             
             if response.data and len(response.data) > 0:
                 profile_url = response.data[0].get('ProfilePictureURL')
+                variants = response.data[0].get('ProfilePictureVariants') or {}
                 
-                if profile_url and profile_url != self.default_profile_picture:
-                    # Delete the file
-                    file_path = os.path.join(self.profile_images_dir, profile_url)
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+                # Delete the file and every size variant
+                self._remove_files([profile_url] + list(variants.values()))
                 
                 # Update database to remove profile picture URL
                 update_response = self.supabase.table('users').update({
-                    'ProfilePictureURL': None
+                    'ProfilePictureURL': None,
+                    'ProfilePictureVariants': None
                 }).eq('UserID', user_id).execute()
                 
                 if update_response.data:
+                    invalidate_profile_picture_cache(user_id)
                     return {
                         'success': True,
                         'message': 'Profile picture deleted successfully'
@@ -271,30 +635,73 @@ class ProfilePictureHandler:
             str: Full file path to the profile picture
         """
         result = self.get_profile_picture_url(user_id)
-        filename = result.get('profile_picture', self.default_profile_picture)
-        return os.path.join(self.profile_images_dir, filename)
+        if not result.get('is_default'):
+            path = self.store.local_path(result['profile_picture'])
+            if path:
+                return path
+        return os.path.join(PROFILE_IMAGES_DIR, self.default_profile_picture)
+
+
+def profile_picture_srcset(result):
+    """
+    (filename, width) pairs for an <img srcset>, smallest first.
+
+    Args:
+        result (dict): A get_user_profile_picture result
+
+    Returns:
+        list: Empty when the picture has no recorded variants
+    """
+    variants = result.get('variants') or {}
+    return sorted(((name, int(size)) for size, name in variants.items()), key=lambda pair: pair[1])
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def get_profile_picture_handler():
+    """Return the per-process ProfilePictureHandler, creating it on first use."""
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                _handler = ProfilePictureHandler()
+    return _handler
 
 
 # Convenience functions for easy import
 def get_user_profile_picture(user_id):
-    """Get a user's profile picture URL."""
-    handler = ProfilePictureHandler()
-    return handler.get_profile_picture_url(user_id)
+    """Get a user's profile picture URL (served from the per-worker cache when fresh)."""
+    cached = _cache_get(user_id)
+    if cached is not None:
+        return cached
+    result = get_profile_picture_handler().get_profile_picture_url(user_id)
+    if result.get('success'):
+        _cache_put(user_id, result)
+    return result
 
 
 def save_user_profile_picture(user_id, image_file):
     """Save a user's profile picture."""
-    handler = ProfilePictureHandler()
-    return handler.save_profile_picture(user_id, image_file)
+    return get_profile_picture_handler().save_profile_picture(user_id, image_file)
+
+
+def queue_user_profile_picture(user_id, image_file):
+    """Save a user's profile picture in the background (for request handlers)."""
+    return get_profile_picture_handler().save_profile_picture_async(user_id, image_file)
 
 
 def delete_user_profile_picture(user_id):
     """Delete a user's profile picture."""
-    handler = ProfilePictureHandler()
-    return handler.delete_profile_picture(user_id)
+    return get_profile_picture_handler().delete_profile_picture(user_id)
 
 
 def get_user_profile_picture_path(user_id):
     """Get the full file path to a user's profile picture."""
-    handler = ProfilePictureHandler()
-    return handler.get_profile_picture_path(user_id)
+    return get_profile_picture_handler().get_profile_picture_path(user_id)
+
+
+if __name__ == '__main__':
+    # Build step: python ProfilePictureHandler.py
+    print(f"Default profile picture at {ensure_default_profile_picture()}")
@@ -0,0 +1,176 @@
+"""
+QueryMetrics.py
+
+Counts the database round trips each Flask request makes. Every query sent
+through the shared Supabase client (or the local backend) is recorded with its
+method, table and duration. After the request the totals go out in the
+X-DB-Queries / X-DB-Time-Ms response headers and in one log line, and tables
+hit repeatedly with the same method are flagged as a likely N+1.
+
+Tests can cap an endpoint's round trips with max_queries():
+
+    with max_queries(3):
+        client.get('/api/users')
+"""
+
+import contextvars
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+QUERY_COUNT_HEADER = 'X-DB-Queries'
+QUERY_TIME_HEADER = 'X-DB-Time-Ms'
+
+# Same (method, table) this many times in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('QUERY_N_PLUS_ONE_THRESHOLD', 5))
+
+_START_KEY = 'finken_query_start'
+
+_current_log = contextvars.ContextVar('query_log', default=None)
+
+
+class QueryLog:
+    """Queries recorded while this log is active (and any nested logs)."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.queries = []
+
+    def record(self, entry):
+        log = self
+        while log is not None:
+            log.queries.append(entry)
+            log = log.parent
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(q['duration_ms'] for q in self.queries)
+
+    def by_table(self):
+        return Counter(q['table'] for q in self.queries)
+
+    def repeated(self, threshold=None):
+        """(method, table) pairs issued at least `threshold` times."""
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        counts = Counter((q['method'], q['table']) for q in self.queries)
+        return {key: n for key, n in counts.items() if n >= threshold}
+
+    def summary(self):
+        tables = ', '.join(f'{t}={n}' for t, n in self.by_table().most_common())
+        return f'{self.count} queries in {self.total_ms:.1f}ms ({tables})' if self.count else '0 queries'
+
+
+def start_log():
+    """Begin collecting queries for the current context; returns (log, token)."""
+    log = QueryLog(parent=_current_log.get())
+    return log, _current_log.set(log)
+
+
+def stop_log(token):
+    _current_log.reset(token)
+
+
+def current_log():
+    return _current_log.get()
+
+
+def record_query(method, table, duration_ms, status=None):
+    """Add one round trip to the active log (no-op outside a request or budget)."""
+    log = _current_log.get()
+    if log is None:
+        return
+    log.record({
+        'method': method,
+        'table': table,
+        'duration_ms': duration_ms,
+        'status': status,
+    })
+
+
+def _table_from_url(url):
+    # /rest/v1/<table> or /rest/v1/rpc/<function>
+    path = urlsplit(str(url)).path
+    parts = [p for p in path.split('/') if p]
+    if 'rpc' in parts and parts.index('rpc') + 1 < len(parts):
+        return 'rpc:' + parts[parts.index('rpc') + 1]
+    return parts[-1] if parts else ''
+
+
+def _on_request(request):
+    """httpx request hook: remember when the query was sent."""
+    request.extensions[_START_KEY] = time.perf_counter()
+
+
+def _on_response(response):
+    """httpx response hook: record the round trip."""
+    request = response.request
+    started = request.extensions.get(_START_KEY)
+    duration_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+    record_query(request.method, _table_from_url(request.url), duration_ms, response.status_code)
+
+
+def install_httpx_hooks(session):
+    """Attach the timing hooks to an httpx client (the PostgREST session)."""
+    session.event_hooks['request'] = session.event_hooks['request'] + [_on_request]
+    session.event_hooks['response'] = session.event_hooks['response'] + [_on_response]
+
+
+def init_app(app):
+    """Register the per-request counter on a Flask app."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_query_log():
+        g.query_log, g.query_log_token = start_log()
+
+    @app.after_request
+    def _report_queries(response):
+        log = g.pop('query_log', None)
+        if log is None:
+            return response
+        response.headers[QUERY_COUNT_HEADER] = str(log.count)
+        response.headers[QUERY_TIME_HEADER] = f'{log.total_ms:.1f}'
+        if log.count:
+            print(f'DB {request.method} {request.path}: {log.summary()}')
+        for (method, table), n in log.repeated().items():
+            print(f'Possible N+1 on {request.method} {request.path}: {n}x {method} {table}')
+        return response
+
+    @app.teardown_request
+    def _stop_query_log(_exc=None):
+        token = g.pop('query_log_token', None)
+        if token is not None:
+            stop_log(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def max_queries(limit, table=None):
+    """
+    Fail when the wrapped block issues more than `limit` queries.
+
+    Args:
+        limit (int): Allowed round trips
+        table (str): Only count queries against this table
+
+    Yields:
+        QueryLog: The queries recorded inside the block
+    """
+    log, token = start_log()
+    try:
+        yield log
+    finally:
+        stop_log(token)
+    issued = [q for q in log.queries if table is None or q['table'] == table]
+    if len(issued) > limit:
+        detail = ', '.join(f"{q['method']} {q['table']}" for q in issued)
+        raise QueryBudgetExceeded(f'{len(issued)} queries issued, budget is {limit}: {detail}')
@@ -0,0 +1,301 @@
+"""
+Scheduler.py
+
+Periodic jobs (ending suspensions, password expiry notices, cleanup, event log
+archival) run here,
+in a dedicated worker process, instead of inside web requests:
+
+    python Scheduler.py          (the Procfile "scheduler:" entry)
+
+Jobs have five-field cron expressions, evaluated in UTC. Several instances may
+run at once: before running a job an instance claims its scheduled_jobs row
+(see scheduler.sql), so each scheduled run happens exactly once. Every run is
+timed, recorded on the job row and written to cron_job_logs.
+"""
+
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from SupabaseClient import _sb
+
+SCHEDULER_POLL_SECONDS = float(os.environ.get('SCHEDULER_POLL_SECONDS', 30))
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _now_utc():
+    return datetime.now(timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Cron expressions
+# ---------------------------------------------------------------------------
+
+_CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day of month', 1, 31),
+    ('month', 1, 12),
+    ('day of week', 0, 7),
+)
+
+
+def _parse_cron_field(text, name, low, high):
+    values = set()
+    for part in text.split(','):
+        range_text, _, step_text = part.partition('/')
+        step = int(step_text) if step_text else 1
+        if range_text == '*':
+            start, end = low, high
+        elif '-' in range_text:
+            start, end = (int(v) for v in range_text.split('-', 1))
+        else:
+            start = int(range_text)
+            end = high if step_text else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f'Invalid cron {name}: {text}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """A standard five-field cron expression: minute hour day-of-month month day-of-week."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression needs 5 fields: {expression}')
+        self.expression = expression
+        parsed = [_parse_cron_field(text, *spec) for text, spec in zip(fields, _CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 0 and 7 are both Sunday
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.isoweekday() % 7) in self.weekdays
+        # As in cron: when both are restricted, either one may match
+        if not self.any_day and not self.any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, dt):
+        """The first matching minute strictly after dt."""
+        dt = (dt + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        for _ in range(366 * 5):
+            if dt.month in self.months and self._day_matches(dt):
+                for hour in sorted(h for h in self.hours if h >= dt.hour):
+                    for minute in sorted(self.minutes):
+                        if hour == dt.hour and minute < dt.minute:
+                            continue
+                        return dt.replace(hour=hour, minute=minute)
+            dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f'Cron expression never matches: {self.expression}')
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+
+class Job:
+    def __init__(self, name, schedule, func, lease_seconds=600):
+        """
+        A periodic job.
+
+        Args:
+            name (str): Unique job name (the scheduled_jobs / cron_job_logs key)
+            schedule (str): Cron expression, UTC
+            func: Called with the Supabase client; returns a result dict with 'success',
+                and 'complete': False when it stopped early and should run again soon
+            lease_seconds (int): How long a claim lasts; should exceed the job's run time
+        """
+        self.name = name
+        self.schedule = CronSchedule(schedule)
+        self.func = func
+        self.lease_seconds = lease_seconds
+
+
+def _unsuspend_expired_users(sb):
+    from UserManagement import check_and_unsuspend_users
+    return check_and_unsuspend_users(sb=sb)
+
+
+# Must stay well inside the job's lease, so a long sweep can't be claimed twice
+PASSWORD_EXPIRY_JOB_SECONDS = float(os.environ.get('PASSWORD_EXPIRY_JOB_SECONDS', 1800))
+
+
+def _password_expiry_notifications(sb):
+    from EmailUser import send_password_expiry_notifications
+    return send_password_expiry_notifications(sb=sb, time_budget_seconds=PASSWORD_EXPIRY_JOB_SECONDS)
+
+
+def _archive_event_logs(sb):
+    from EventLogArchive import archive_event_logs
+    return archive_event_logs(sb=sb)
+
+
+# Rows older than these are deleted by the nightly cleanup
+SENT_EMAIL_RETENTION_DAYS = int(os.environ.get('SENT_EMAIL_RETENTION_DAYS', 30))
+CRON_LOG_RETENTION_DAYS = int(os.environ.get('CRON_LOG_RETENTION_DAYS', 90))
+
+
+def cleanup_old_records(sb):
+    """Delete delivered outbox messages and old cron_job_logs rows."""
+    now = _now_utc()
+    sent_cutoff = (now - timedelta(days=SENT_EMAIL_RETENTION_DAYS)).isoformat()
+    log_cutoff = (now - timedelta(days=CRON_LOG_RETENTION_DAYS)).isoformat()
+    emails = sb.table('email_outbox').delete().eq('status', 'sent').lt('sent_at', sent_cutoff).execute()
+    # cron_job_logs is only writable through scheduler.sql's functions
+    logs_deleted = sb.rpc('delete_old_cron_job_logs', {'older_than': log_cutoff}).execute().data
+    return {
+        'success': True,
+        'emails_deleted': len(emails.data or []),
+        'logs_deleted': logs_deleted or 0
+    }
+
+
+JOBS = [
+    Job('unsuspend-expired-users', '*/15 * * * *', _unsuspend_expired_users),
+    Job('password-expiry-notifications', '0 9 * * *', _password_expiry_notifications, lease_seconds=3600),
+    Job('cleanup-old-records', '30 3 * * *', cleanup_old_records),
+    Job('archive-event-logs', '0 4 * * *', _archive_event_logs, lease_seconds=3600),
+]
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+
+class Scheduler:
+    def __init__(self, jobs=None, sb=None, instance_id=INSTANCE_ID):
+        """
+        Initialize the scheduler.
+
+        Args:
+            jobs (list): Jobs to run; defaults to JOBS
+            sb: Supabase client; defaults to the shared per-process client
+            instance_id (str): Identifies this instance in the job leases
+        """
+        self.jobs = list(JOBS if jobs is None else jobs)
+        self._supabase = sb
+        self.instance_id = instance_id
+
+    @property
+    def supabase(self):
+        return self._supabase or _sb()
+
+    def register_jobs(self, now=None):
+        """
+        Create scheduled_jobs rows for new jobs and reschedule jobs whose schedule changed.
+
+        Rows whose schedule is unchanged keep their next run.
+        """
+        now = now or _now_utc()
+        names = [job.name for job in self.jobs]
+        stored = {row['job_name']: row['schedule'] for row in self.supabase.table('scheduled_jobs')
+                  .select('job_name, schedule').in_('job_name', names).execute().data or []}
+        new_rows = []
+        for job in self.jobs:
+            next_run_at = job.schedule.next_after(now).isoformat()
+            if job.name not in stored:
+                new_rows.append({
+                    'job_name': job.name,
+                    'schedule': job.schedule.expression,
+                    'next_run_at': next_run_at,
+                    'locked_until': now.isoformat()
+                })
+            elif stored[job.name] != job.schedule.expression:
+                self.supabase.table('scheduled_jobs').update({
+                    'schedule': job.schedule.expression,
+                    'next_run_at': next_run_at
+                }).eq('job_name', job.name).execute()
+                print(f"Job {job.name} rescheduled: {job.schedule.expression}")
+        if new_rows:
+            # Another instance may be registering the same jobs
+            self.supabase.table('scheduled_jobs').upsert(new_rows, ignore_duplicates=True).execute()
+
+    def _claim(self, job, now):
+        # Only succeeds when the run is due and no other instance holds the lease
+        claimed = self.supabase.table('scheduled_jobs').update({
+            'locked_by': self.instance_id,
+            'locked_until': (now + timedelta(seconds=job.lease_seconds)).isoformat()
+        }).eq('job_name', job.name).lte('next_run_at', now.isoformat()) \
+            .lt('locked_until', now.isoformat()).execute()
+        return bool(claimed.data)
+
+    def run_job(self, job, now=None):
+        """
+        Run a job now, record the outcome and schedule its next run.
+
+        Returns:
+            dict: The job's result plus duration_ms
+        """
+        now = now or _now_utc()
+        started = time.perf_counter()
+        try:
+            result = job.func(self.supabase)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        status = 'success' if result.get('success') else 'failed'
+
+        finished = _now_utc()
+        if result.get('complete') is False:
+            # Stopped at its time budget; pick up from its checkpoint at the next poll
+            next_run_at = max(now, finished)
+        else:
+            next_run_at = job.schedule.next_after(max(now, finished))
+        self.supabase.table('scheduled_jobs').update({
+            'next_run_at': next_run_at.isoformat(),
+            'locked_until': finished.isoformat(),
+            'last_run_at': now.isoformat(),
+            'last_status': status,
+            'last_duration_ms': duration_ms
+        }).eq('job_name', job.name).execute()
+        # cron_job_logs is only writable through scheduler.sql's functions
+        self.supabase.rpc('log_cron_job_run', {
+            'job_name': job.name,
+            'execution_time': now.isoformat(),
+            'status': status,
+            'response_body': json.dumps(result, default=str),
+            'notes': f'duration_ms={duration_ms} instance={self.instance_id}'
+        }).execute()
+
+        print(f"Job {job.name}: {status} in {duration_ms} ms")
+        return dict(result, duration_ms=duration_ms)
+
+    def run_pending(self, now=None):
+        """
+        Run every job that is due and not claimed by another instance.
+
+        Returns:
+            dict: job name -> result, for the jobs this instance ran
+        """
+        now = now or _now_utc()
+        results = {}
+        for job in self.jobs:
+            try:
+                if self._claim(job, now):
+                    results[job.name] = self.run_job(job, now)
+            except Exception as e:
+                print(f"Scheduler error in {job.name}: {e}")
+        return results
+
+    def run_forever(self, poll_seconds=None):
+        poll_seconds = SCHEDULER_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.register_jobs()
+        print(f"Scheduler {self.instance_id} started with jobs: {', '.join(job.name for job in self.jobs)}")
+        while True:
+            self.run_pending()
+            time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    try:
+        Scheduler().run_forever()
+    except KeyboardInterrupt:
+        pass
@@ -147,7 +147,9 @@ def sign_in_user(username, password, sb = None):
             'last_name': user_record.get('LastName'),
             'email': user_record.get('Email'),
             'role': role_name,
-            'is_active': user_record.get('IsActive', True)
+            'is_active': user_record.get('IsActive', True),
+            'profile_picture_url': user_record.get('ProfilePictureURL'),
+            'profile_picture_variants': user_record.get('ProfilePictureVariants')
         }
         
         return {
@@ -1,11 +1,26 @@
 import contextvars
 import os
+import threading
 from supabase import create_client
 from dotenv import load_dotenv
+from QueryMetrics import install_httpx_hooks
 
 # Create a context variable to store current user ID for audit logging
 current_user_id = contextvars.ContextVar('current_user_id', default=None)
 
+# Header carrying the current user on every PostgREST request. PostgREST exposes
+# request headers to SQL as current_setting('request.headers'), so the audit
+# triggers can read it inside the same transaction as the write it describes
+# (see audit_user_context.sql).
+AUDIT_USER_HEADER = 'X-Audit-User-Id'
+
+# One Supabase client per worker process. The client's PostgREST session is an
+# httpx connection pool, so sharing it keeps TLS connections alive across
+# requests and threads instead of handshaking on every _sb() call.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
 def set_current_user(user_id):
     """Set the current user for audit logging"""
     current_user_id.set(user_id)
@@ -14,7 +29,15 @@ def get_current_user():
     """Get the current user for audit logging"""
     return current_user_id.get()
 
-def _sb():
+def _attach_audit_user(request):
+    """httpx request hook: stamp the current audit user onto the request."""
+    user_id = get_current_user()
+    if user_id:
+        request.headers[AUDIT_USER_HEADER] = str(user_id)
+    else:
+        request.headers.pop(AUDIT_USER_HEADER, None)
+
+def _load_credentials():
     # Load environment variables from a .env file if present
     # Many dev setups keep a file named `.env`; this project currently has an `env` file
     # (without the leading dot). Try both so local runs work without renaming files.
@@ -31,18 +54,57 @@ def _sb():
 
     if not url or not key:
         raise RuntimeError("Supabase environment is not configured")
-    
-    client = create_client(url, key)
-    
-    # Set session variable for audit logging if user context is available
-    user_id = get_current_user()
-    if user_id:
-        try:
-            # Use RPC to set session variable for audit logging
-            client.rpc('set_audit_user_context', {'user_id': str(user_id)}).execute()
-        except Exception as e:
-            # If setting the session variable fails, continue without it
-            # The triggers will fall back to default user detection
-            print(f"Warning: Could not set user context for audit logging: {e}")
-    
-    return client
\ No newline at end of file
+
+    return url, key
+
+def _get_client():
+    """Return the process-wide Supabase client, creating it on first use."""
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        # Re-check under the lock; also rebuild after a fork so worker
+        # processes never share sockets with their parent.
+        if _client is None or _client_pid != pid:
+            load_dotenv()
+            if os.environ.get('FINKEN_DB_BACKEND', '').lower() == 'local':
+                # Offline SQLite backend built from DBSchema.sql (see LocalBackend.py)
+                from LocalBackend import LocalClient
+                _client = LocalClient(os.environ.get('FINKEN_LOCAL_DB', ':memory:'))
+                _client_pid = pid
+                return _client
+
+            url, key = _load_credentials()
+            client = create_client(url, key)
+            # The PostgREST session is created lazily on first access; do it
+            # here while holding the lock so threads don't race to build it.
+            # The audit user travels as a header on each request, so no
+            # separate set_audit_user_context round trip is needed.
+            session = client.postgrest.session
+            session.event_hooks['request'] = session.event_hooks['request'] + [_attach_audit_user]
+            # Per-request query counts and timings (see QueryMetrics.py)
+            install_httpx_hooks(session)
+            _client = client
+            _client_pid = pid
+    return _client
+
+def reset_client():
+    """Drop the pooled client (closing its connections). Mainly for tests."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            try:
+                if hasattr(_client, 'postgrest'):
+                    _client.postgrest.aclose()
+                else:
+                    _client.close()
+            except Exception:
+                pass
+        _client = None
+        _client_pid = None
+
+def _sb():
+    return _get_client()
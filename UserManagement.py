@@ -1,10 +1,11 @@
 # UserManagement.py
 
-import math
 from datetime import datetime, timedelta, timezone
+from postgrest.exceptions import APIError
 from SupabaseClient import _sb
+from Pagination import build_listing_query, fetch_page, fetch_keyset_page
 
-def get_users_paginated(page=1, per_page=10, search_term='', status_filter='', sb = None):
+def get_users_paginated(page=1, per_page=10, search_term='', status_filter='', sb = None, count='exact', cursor=None):
     """
     Get users with pagination and filtering
     
@@ -13,80 +14,49 @@ def get_users_paginated(page=1, per_page=10, search_term='', status_filter='', s
         per_page (int): Number of users per page
         search_term (str): Search term for name or email
         status_filter (str): Filter by user status ('active', 'inactive', 'suspended', or empty for all)
+        count (str): Total count mode ('exact', 'planned', 'estimated' or 'none')
+        cursor (str): Keyset cursor from a previous page's next_cursor ('' for the
+            first page); None pages by offset instead
     
     Returns:
         dict: Contains users data, pagination info, and success status
+    
+    Raises:
+        ValueError: If the cursor is malformed
     """
     try:
         # Initialize Supabase client
         sb = sb or _sb()
         
-        # Start building the query
-        query = sb.table('users').select(
+        # Status filters map onto plain equality filters
+        equals = {
+            'active': {'IsActive': True, 'IsSuspended': False},
+            'inactive': {'IsActive': False},
+            'suspended': {'IsSuspended': True},
+        }.get(status_filter, {})
+        
+        # One query returns both the page and the total count
+        query = build_listing_query(
+            sb, 'users',
             'UserID, Username, FirstName, LastName, Email, DOB, Address, '
             'IsActive, IsSuspended, SuspensionEndDate, SuspensionReason, '
             'DateCreated, ProfilePictureURL, '
-            'roles(RoleName)'
+            'roles(RoleName)',
+            search_term=search_term,
+            search_columns=('FirstName', 'LastName', 'Email', 'Username'),
+            equals=equals,
+            count=count
         )
-        
-        # Apply search filter if provided
-        if search_term:
-            # Convert search term to lowercase for case-insensitive search
-            search_lower = search_term.lower()
-            # Use or_ to search across multiple fields
-            query = query.or_(
-                f'FirstName.ilike.%{search_term}%,'
-                f'LastName.ilike.%{search_term}%,'
-                f'Email.ilike.%{search_term}%,'
-                f'Username.ilike.%{search_term}%'
-            )
-        
-        # Apply status filter if provided
-        if status_filter == 'active':
-            query = query.eq('IsActive', True).eq('IsSuspended', False)
-        elif status_filter == 'inactive':
-            query = query.eq('IsActive', False)
-        elif status_filter == 'suspended':
-            query = query.eq('IsSuspended', True)
-        
-        # Get total count for pagination (before applying limit/offset)
-        count_query = sb.table('users').select('UserID', count='exact')
-        
-        # Apply same filters to count query
-        if search_term:
-            count_query = count_query.or_(
-                f'FirstName.ilike.%{search_term}%,'
-                f'LastName.ilike.%{search_term}%,'
-                f'Email.ilike.%{search_term}%,'
-                f'Username.ilike.%{search_term}%'
-            )
-        
-        if status_filter == 'active':
-            count_query = count_query.eq('IsActive', True).eq('IsSuspended', False)
-        elif status_filter == 'inactive':
-            count_query = count_query.eq('IsActive', False)
-        elif status_filter == 'suspended':
-            count_query = count_query.eq('IsSuspended', True)
-        
-        # Execute count query
-        count_response = count_query.execute()
-        total_users = count_response.count if hasattr(count_response, 'count') else len(count_response.data)
-        
-        # Calculate pagination
-        total_pages = math.ceil(total_users / per_page) if total_users > 0 else 1
-        offset = (page - 1) * per_page
-        
-        # Apply pagination and ordering
-        query = query.order('DateCreated', desc=True).range(offset, offset + per_page - 1)
-        
-        # Execute the main query
-        response = query.execute()
-        
-        if not response.data:
-            users = []
+        if cursor is None:
+            rows, pagination = fetch_page(query, page, per_page, 'DateCreated', desc=True,
+                                          count=count, total_key='total_users')
         else:
-            users = []
-            for user in response.data:
+            rows, pagination = fetch_keyset_page(query, per_page, 'DateCreated', 'UserID', desc=True,
+                                                 cursor=cursor, count=count, total_key='total_users')
+        
+        users = []
+        if rows:
+            for user in rows:
                 # Determine user status
                 if user.get('IsSuspended'):
                     status = 'suspended'
@@ -113,24 +83,15 @@ def get_users_paginated(page=1, per_page=10, search_term='', status_filter='', s
                 }
                 users.append(user_data)
         
-        # Pagination info
-        pagination = {
-            'current_page': page,
-            'per_page': per_page,
-            'total_users': total_users,
-            'total_pages': total_pages,
-            'has_prev': page > 1,
-            'has_next': page < total_pages,
-            'prev_page': page - 1 if page > 1 else None,
-            'next_page': page + 1 if page < total_pages else None
-        }
-        
         return {
             'success': True,
             'users': users,
             'pagination': pagination
         }
         
+    except ValueError:
+        # A bad cursor is the caller's mistake; the route answers 400
+        raise
     except Exception as e:
         return {
             'success': False,
@@ -404,10 +365,31 @@ def get_all_roles(sb = None):
             'message': f'Error fetching roles: {str(e)}'
         }
 
+def _unsuspend_expired_fallback(sb, current_time):
+    # Without the database function: one select for the end dates, then one
+    # update for all of them. The update repeats the filters, so a user
+    # re-suspended in between is left alone.
+    expired = sb.table('users').select(
+        'UserID, FirstName, LastName, SuspensionEndDate'
+    ).eq('IsSuspended', True).lte('SuspensionEndDate', current_time).execute().data or []
+    if not expired:
+        return []
+    updated = sb.table('users').update({
+        'IsSuspended': False,
+        'SuspensionEndDate': None,
+        'SuspensionReason': None
+    }).in_('UserID', [user['UserID'] for user in expired]).eq('IsSuspended', True) \
+        .lte('SuspensionEndDate', current_time).execute().data or []
+    updated_ids = {user['UserID'] for user in updated}
+    return [user for user in expired if user['UserID'] in updated_ids]
+
 def check_and_unsuspend_users(sb = None):
     """
     Check for users whose suspension period has ended and automatically unsuspend them
     
+    All expired suspensions are cleared by one set-based update (the
+    unsuspend_expired_users database function, see unsuspend_expired_users.sql).
+    
     Returns:
         dict: Contains count of users unsuspended and success status
     """
@@ -418,25 +400,20 @@ def check_and_unsuspend_users(sb = None):
         # Get current timestamp
         current_time = datetime.now(timezone.utc).isoformat()
         
-        # Find users who are suspended but their suspension end date has passed
-        response = sb.table('users').select(
-            'UserID, FirstName, LastName, SuspensionEndDate'
-        ).eq('IsSuspended', True).lte('SuspensionEndDate', current_time).execute()
-        
-        unsuspended_count = 0
-        unsuspended_users = []
-        
-        if response.data:
-            for user in response.data:
-                # Unsuspend the user
-                update_result = update_user_status(user['UserID'], 'unsuspend', sb, None)
-                if update_result['success']:
-                    unsuspended_count += 1
-                    unsuspended_users.append({
-                        'UserID': user['UserID'],
-                        'Name': f"{user['FirstName']} {user['LastName']}",
-                        'SuspensionEndDate': user['SuspensionEndDate']
-                    })
+        try:
+            rows = sb.rpc('unsuspend_expired_users').execute().data or []
+        except APIError as e:
+            # Function not installed yet; two round trips instead of one
+            if e.code != 'PGRST202':
+                raise
+            rows = _unsuspend_expired_fallback(sb, current_time)
+        
+        unsuspended_users = [{
+            'UserID': user['UserID'],
+            'Name': f"{user['FirstName']} {user['LastName']}",
+            'SuspensionEndDate': user['SuspensionEndDate']
+        } for user in rows]
+        unsuspended_count = len(unsuspended_users)
         
         return {
             'success': True,
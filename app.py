@@ -2,13 +2,18 @@ from flask import Flask
 
 app = Flask(__name__, static_folder='frontend', static_url_path='/frontend')
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, send_file, stream_with_context
 import os
 from dotenv import load_dotenv
 from CreateNewUser import create_new_user, validate_user_input
 from SignInUser import sign_in_user, validate_sign_in_input
 from FinishSignUp import get_signup_context, finalize_signup
-from ProfilePictureHandler import save_user_profile_picture, get_user_profile_picture
+from ProfilePictureHandler import (
+    queue_user_profile_picture, get_user_profile_picture, prime_profile_picture_cache, ensure_default_profile_picture,
+    profile_picture_srcset, default_profile_picture_bytes, default_profile_picture_etag, is_content_hashed,
+    DEFAULT_PROFILE_PICTURE
+)
+from ImageStore import get_image_store
 from AdminManagement import (
     get_pending_registration_requests, 
     get_all_registration_requests,
@@ -19,8 +24,12 @@ from AdminManagement import (
 from ForgotPassword import *
 from UserManagement import get_users_paginated, update_user_status, get_user_by_id, get_expiring_passwords, get_all_roles, check_and_unsuspend_users
 from UpdateUser import update_user
-from EmailUser import send_email, send_password_expiry_notifications
+from EmailUser import send_password_expiry_notifications
+from EmailOutbox import enqueue_emails
 from SupabaseClient import _sb
+from EventLogs import get_event_logs, get_event_log_detail, get_record_history, get_event_log_tables, export_event_logs, EVENT_LOG_TABLES_TTL
+from EventLogArchive import list_archived_months, get_archived_event_logs
+import QueryMetrics
 from ChartOfAccounts import (
     add_account, get_account_by_id, update_account, deactivate_account, list_accounts, get_ledger_entries
 )
@@ -39,15 +48,21 @@ load_dotenv()
 app = Flask(__name__, static_folder='frontend')
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')  # For flash messages
 
+# Count database round trips per request (X-DB-Queries header + log line)
+QueryMetrics.init_app(app)
+
+# Render the default avatar now rather than on some user's first request
+ensure_default_profile_picture()
+
 from functools import wraps
 
 def set_user_context(f):
     """Decorator to set user context for audit logging"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # Set user context if available
-        if 'user_id' in session:
-            set_current_user(session['user_id'])
+        # Set user context if available. Always assign it so a worker thread
+        # reused from an earlier request never carries that request's user.
+        set_current_user(session.get('user_id'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -59,23 +74,48 @@ def get_user_context():
     # Get user profile picture
     profile_result = get_user_profile_picture(session.get('user_id'))
     profile_picture = 'default_profile.webp'  # Default fallback
+    profile_srcset = ''
     if profile_result.get('success') and profile_result.get('profile_picture'):
         profile_picture = profile_result.get('profile_picture')
+        # Let the browser pick the smallest variant that fills the avatar
+        profile_srcset = ', '.join(
+            f"{url_for('profile_image', filename=name)} {width}w"
+            for name, width in profile_picture_srcset(profile_result)
+        )
     
     return {
         'user_name': session.get('username'),  # Use username instead of full name
         'user_role': session.get('user_role'),
-        'user_profile_picture': profile_picture
+        'user_profile_picture': profile_picture,
+        'user_profile_srcset': profile_srcset
     }
 
 @app.route('/profile_images/<filename>')
 def profile_image(filename):
-    """Serve profile images from the profile_images directory"""
-    try:
-        return send_from_directory('profile_images', filename)
-    except FileNotFoundError:
-        # If the requested file doesn't exist, serve the default profile picture
-        return send_from_directory('profile_images', 'default_profile.webp')
+    """Serve profile images from the image store (a local copy on this node)"""
+    if filename != DEFAULT_PROFILE_PICTURE:
+        try:
+            path = get_image_store().local_path(filename)
+        except ValueError:
+            path = None
+        if path:
+            response = send_file(path, mimetype='image/webp', conditional=True)
+            if is_content_hashed(filename):
+                # The name changes whenever the bytes do, so the URL can be cached forever
+                response.cache_control.public = True
+                response.cache_control.max_age = 31536000
+                response.cache_control.immutable = True
+            else:
+                # Legacy fixed names are overwritten in place; always revalidate
+                response.cache_control.no_cache = True
+            return response
+    
+    # Default (or missing) picture straight from memory, with ETag / 304 support
+    response = Response(default_profile_picture_bytes(), mimetype='image/webp')
+    response.set_etag(default_profile_picture_etag())
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600 if filename == DEFAULT_PROFILE_PICTURE else 60
+    return response.make_conditional(request)
 
 @app.route('/', methods=['GET', 'POST'])
 @set_user_context
@@ -105,6 +145,9 @@ def index():
             role = (result['user_data'].get('role') or '').strip().lower() or 'accountant'
             session['user_role'] = role
             session['user_name'] = f"{result['user_data']['first_name']} {result['user_data']['last_name']}"
+            # The users row is already loaded; seed the header picture cache from it
+            prime_profile_picture_cache(result['user_data']['user_id'], result['user_data'].get('profile_picture_url'),
+                                        result['user_data'].get('profile_picture_variants'))
             
             flash(f'Welcome back, {result["user_data"]["first_name"]}!', 'success')
             
@@ -331,7 +374,14 @@ def api_list_accounts():
         'subcategory': request.args.get('subcategory'),
         'is_active': None if request.args.get('is_active') is None else (request.args.get('is_active').lower() == 'true')
     }
-    result = list_accounts(page=page, per_page=per_page, search_term=search, filters=filters)
+    count = request.args.get('count', 'exact', type=str)
+    # A cursor parameter (empty for the first page) switches to keyset paging
+    cursor = request.args.get('cursor')
+    try:
+        result = list_accounts(page=page, per_page=per_page, search_term=search, filters=filters,
+                               count=count, cursor=cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     return jsonify(result)
 
 
@@ -512,7 +562,8 @@ def finish_sign_up():
                             # Get user_id from the signup result
                             user_id = res.get('user_id')
                             if user_id:
-                                pic_result = save_user_profile_picture(user_id, profile_file)
+                                # Processed in the background; the default avatar shows until it's ready
+                                pic_result = queue_user_profile_picture(user_id, profile_file)
                                 if not pic_result.get('success'):
                                     flash(f'Account created but profile picture upload failed: {pic_result.get("message", "Unknown error")}', 'warning')
                         except Exception as e:
@@ -588,14 +639,22 @@ def api_users():
     page = request.args.get('page', 1, type=int)
     search_term = request.args.get('search', '', type=str)
     status_filter = request.args.get('status', '', type=str)
+    count = request.args.get('count', 'exact', type=str)
+    # A cursor parameter (empty for the first page) switches to keyset paging
+    cursor = request.args.get('cursor')
     
     # Get paginated users
-    result = get_users_paginated(
-        page=page, 
-        per_page=20, 
-        search_term=search_term, 
-        status_filter=status_filter
-    )
+    try:
+        result = get_users_paginated(
+            page=page, 
+            per_page=20, 
+            search_term=search_term, 
+            status_filter=status_filter,
+            count=count,
+            cursor=cursor
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
     return jsonify(result)
 
@@ -636,25 +695,25 @@ def send_email_api():
         # Get sender info from session
         sender_name = session.get('user_name', 'Administrator')
         
-        # Extract form data
-        recipient_email = data.get('recipient_email')
+        # Extract form data; recipient_emails (a list) sends the same email to several users
+        recipients = data.get('recipient_emails') or [data.get('recipient_email')]
         subject = data.get('subject')
         message = data.get('message')
         
-        if not all([recipient_email, subject, message]):
+        if not all(recipients) or not all([subject, message]):
             return jsonify({
                 'success': False, 
                 'message': 'Missing required fields: recipient_email, subject, or message'
             }), 400
         
-        # Send the email
-        result = send_email(
-            sender_email='notifications@job-fit-ai.com',  # This will be set as reply-to
-            sender_name=sender_name,
-            receiver_email=recipient_email,
-            subject_line=subject,
-            body=message
-        )
+        # Queue the emails; the outbox worker sends them through the dispatcher
+        result = enqueue_emails([{
+            'sender_email': 'notifications@job-fit-ai.com',  # This will be set as reply-to
+            'sender_name': sender_name,
+            'receiver_email': recipient,
+            'subject_line': subject,
+            'body': message
+        } for recipient in recipients])
         
         return jsonify(result)
         
@@ -783,18 +842,23 @@ def send_password_expiry_notifications_api():
     result = send_password_expiry_notifications()
     return jsonify(result)
 
+# Stay well inside typical request timeouts; the sweep resumes on the next call
+PASSWORD_EXPIRY_REQUEST_SECONDS = float(os.environ.get('PASSWORD_EXPIRY_REQUEST_SECONDS', 20))
+
 @app.route('/cron/password-expiry-check')
 def cron_password_expiry_check():
     """
     Cron job endpoint for password expiry notifications
-    This endpoint is designed to be called by automated systems/cron jobs
+    This endpoint is designed to be called by automated systems/cron jobs.
+    Each call works for at most PASSWORD_EXPIRY_REQUEST_SECONDS; a response with
+    'complete': false (202) means the caller should call again to continue.
     """
     try:
-        result = send_password_expiry_notifications()
+        result = send_password_expiry_notifications(time_budget_seconds=PASSWORD_EXPIRY_REQUEST_SECONDS)
         
         # Return appropriate HTTP status codes for monitoring
         if result.get('success'):
-            return jsonify(result), 200
+            return jsonify(result), 200 if result.get('complete', True) else 202
         else:
             return jsonify(result), 500
             
@@ -824,89 +888,164 @@ def api_event_logs():
         return jsonify({'success': False, 'message': 'Access denied'}), 403
     
     try:
-        sb = _sb()
-        
-        # Get pagination parameters
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        # Get filter parameters
-        action_filter = request.args.get('action', '', type=str)
-        table_filter = request.args.get('table', '', type=str)
-        user_filter = request.args.get('user', '', type=str)
-        date_from = request.args.get('date_from', '', type=str)
-        date_to = request.args.get('date_to', '', type=str)
-        
-        # Build query
-        query = sb.table('event_logs').select(
-            'logid, userid, timestamp, actiontype, tablename, recordid, beforevalue, aftervalue, users(Username)',
-            count='exact'
+        # A cursor parameter (empty for the first page) switches to keyset paging
+        result = get_event_logs(
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 20, type=int),
+            action_filter=request.args.get('action', '', type=str),
+            table_filter=request.args.get('table', '', type=str),
+            user_filter=request.args.get('user', '', type=str),
+            date_from=request.args.get('date_from', '', type=str),
+            date_to=request.args.get('date_to', '', type=str),
+            cursor=request.args.get('cursor'),
+            count=request.args.get('count', 'exact', type=str),
+            record_filter=request.args.get('record', None, type=int)
         )
+        return jsonify(result)
         
-        # Apply filters
-        if action_filter:
-            query = query.eq('actiontype', action_filter)
-        if table_filter:
-            query = query.eq('tablename', table_filter)
-        if user_filter:
-            query = query.ilike('users.Username', f'%{user_filter}%')
-        if date_from:
-            query = query.gte('timestamp', date_from)
-        if date_to:
-            # Add one day to include the entire end date
-            from datetime import datetime, timedelta
-            end_date = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-            query = query.lt('timestamp', end_date.strftime('%Y-%m-%d'))
-        
-        # Order by timestamp descending (newest first)
-        query = query.order('timestamp', desc=True)
-        
-        # Calculate offset
-        offset = (page - 1) * per_page
-        
-        # Execute query with pagination
-        response = query.range(offset, offset + per_page - 1).execute()
-        
-        # Format the results
-        logs = []
-        for log in response.data:
-            logs.append({
-                'logid': log['logid'],
-                'userid': log['userid'],
-                'username': log['users']['Username'] if log.get('users') else 'Unknown',
-                'timestamp': log['timestamp'],
-                'actiontype': log['actiontype'],
-                'tablename': log['tablename'],
-                'recordid': log['recordid'],
-                'beforevalue': log['beforevalue'],
-                'aftervalue': log['aftervalue']
-            })
-        
-        # Get total count
-        total_count = response.count if hasattr(response, 'count') else len(logs)
-        total_pages = (total_count + per_page - 1) // per_page
-        
-        # Get available tables for filter dropdown
-        tables_query = sb.table('event_logs').select('tablename').execute()
-        available_tables = list(set([t['tablename'] for t in tables_query.data]))
-        available_tables.sort()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching event logs: {str(e)}'
+        }), 500
+
+@app.route('/api/event-logs/history/<tablename>/<int:recordid>')
+@set_user_context
+def api_record_history(tablename, recordid):
+    """API endpoint to get the event logs of one record (e.g. an account), newest first"""
+    if 'user_id' not in session or session.get('user_role') != 'administrator':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    try:
+        result = get_record_history(
+            tablename,
+            recordid,
+            per_page=request.args.get('per_page', 20, type=int),
+            cursor=request.args.get('cursor', '', type=str),
+            action_filter=request.args.get('action', '', type=str),
+            user_filter=request.args.get('user', '', type=str),
+            date_from=request.args.get('date_from', '', type=str),
+            date_to=request.args.get('date_to', '', type=str),
+            count=request.args.get('count', 'exact', type=str)
+        )
+        return jsonify(result)
         
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'logs': logs,
-            'pagination': {
-                'current_page': page,
-                'per_page': per_page,
-                'total_count': total_count,
-                'total_pages': total_pages
-            },
-            'available_tables': available_tables
-        })
+            'success': False,
+            'message': f'Error fetching record history: {str(e)}'
+        }), 500
+
+@app.route('/api/event-logs/tables')
+@set_user_context
+def api_event_log_tables():
+    """API endpoint listing the tables that appear in the event log (filter options)"""
+    if 'user_id' not in session or session.get('user_role') != 'administrator':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    try:
+        response = jsonify({'success': True, 'tables': get_event_log_tables()})
+        # Admin-only, so the browser may keep it but shared caches may not
+        response.headers['Cache-Control'] = f'private, max-age={int(EVENT_LOG_TABLES_TTL)}'
+        return response
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching event log tables: {str(e)}'
+        }), 500
+
+@app.route('/api/event-logs/<int:logid>')
+@set_user_context
+def api_event_log_detail(logid):
+    """API endpoint to get one event log with its full before and after records"""
+    if 'user_id' not in session or session.get('user_role') != 'administrator':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    try:
+        result = get_event_log_detail(logid)
+        return jsonify(result), 200 if result['success'] else 404
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching event log: {str(e)}'
+        }), 500
+
+@app.route('/api/event-logs/export')
+@set_user_context
+def api_event_logs_export():
+    """Stream every event log matching the Event Logs filters as CSV or NDJSON (optionally gzipped)"""
+    if 'user_id' not in session or session.get('user_role') != 'administrator':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    fmt = request.args.get('format', 'csv', type=str).lower()
+    compress = request.args.get('gzip', '0', type=str).lower() in ('1', 'true', 'yes')
+    try:
+        chunks = export_event_logs(
+            fmt=fmt,
+            compress=compress,
+            action_filter=request.args.get('action', '', type=str),
+            table_filter=request.args.get('table', '', type=str),
+            user_filter=request.args.get('user', '', type=str),
+            date_from=request.args.get('date_from', '', type=str),
+            date_to=request.args.get('date_to', '', type=str)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    filename = f"event_logs.{fmt}{'.gz' if compress else ''}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/api/event-logs/archive')
+@set_user_context
+def api_event_log_archive_months():
+    """API endpoint listing the archived months of event logs"""
+    if 'user_id' not in session or session.get('user_role') != 'administrator':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    try:
+        return jsonify({'success': True, 'months': list_archived_months()})
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error listing event log archives: {str(e)}'
+        }), 500
+
+@app.route('/api/event-logs/archive/<month>')
+@set_user_context
+def api_archived_event_logs(month):
+    """API endpoint to get a page of an archived month of event logs, with the usual filters"""
+    if 'user_id' not in session or session.get('user_role') != 'administrator':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    try:
+        result = get_archived_event_logs(
+            month,
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 20, type=int),
+            action_filter=request.args.get('action', '', type=str),
+            table_filter=request.args.get('table', '', type=str),
+            user_filter=request.args.get('user', '', type=str),
+            date_from=request.args.get('date_from', '', type=str),
+            date_to=request.args.get('date_to', '', type=str),
+            record_filter=request.args.get('record', None, type=int)
+        )
+        return jsonify(result), 200 if result['success'] else 404
         
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
-            'message': f'Error fetching event logs: {str(e)}'
+            'message': f'Error fetching archived event logs: {str(e)}'
         }), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,160 @@
+-- Audit user context carried on each PostgREST request
+-- The Flask app sends the signed-in user's ID in the X-Audit-User-Id header on
+-- every database request (see SupabaseClient.py). PostgREST exposes request
+-- headers to SQL through the request.headers setting, which is scoped to the
+-- transaction running the request, so the value is always the one for the
+-- write being audited. This replaces the separate set_audit_user_context RPC,
+-- which cost an extra round trip and could land on a different connection.
+
+-- Returns the audit user for the current request, or NULL when the request
+-- did not carry one (e.g. cron calls or unauthenticated pages).
+CREATE OR REPLACE FUNCTION public.current_audit_user_id()
+RETURNS integer
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    header_value text;
+BEGIN
+    header_value := current_setting('request.headers', true)::json ->> 'x-audit-user-id';
+    IF header_value ~ '^[0-9]+$' THEN
+        RETURN header_value::integer;
+    END IF;
+    RETURN NULL;
+EXCEPTION
+    WHEN OTHERS THEN
+        RETURN NULL;
+END;
+$$;
+
+-- Row-change audit trigger. Every audited table's trigger writes one
+-- event_logs row per changed row, attributed to the user from the request
+-- header. Requests without the header (cron calls, sign-up and password reset
+-- pages) fall back to the app.current_user_id setting that the old
+-- set_audit_user_context RPC set, then to the row's own "UserID" (a user
+-- changing their own records). When neither gives a user, the change is not
+-- logged, since event_logs.userid is required.
+-- Rows use the event_logs delta format (see AuditDelta.py and
+-- event_log_deltas.sql): inserts and updates store the delta with the after
+-- image as a snapshot, and deletes store the before image.
+--
+-- Secret columns (password and answer hashes, invitation tokens) never reach
+-- event_logs, which the Event Logs page shows and exports: they are left out
+-- of the images, and a change to one is logged without its values. Updates
+-- that only touch sign-in bookkeeping (failed attempts, last login) are not
+-- logged at all.
+-- chart_of_accounts is not listed here: ChartOfAccounts.py logs its own events.
+CREATE OR REPLACE FUNCTION public.audit_row_change()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    secret_columns constant text[] := ARRAY['PasswordHash', 'AnswerHash', 'Token'];
+    noise_columns constant text[] := ARRAY['FailedLoginAttempts', 'LastLogin'];
+    raw_before jsonb := CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE to_jsonb(OLD) END;
+    raw_after jsonb := CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE to_jsonb(NEW) END;
+    before_image jsonb := raw_before - secret_columns;
+    after_image jsonb := raw_after - secret_columns;
+    row_image jsonb := COALESCE(after_image, before_image);
+    acting_user integer;
+    row_delta jsonb;
+    only_noise boolean;
+BEGIN
+    -- Diffed on the full rows so a secret's change still shows, without its values
+    WITH changes AS (
+        SELECT 'add' AS op, new_field.key, new_field.value, NULL::jsonb AS old
+        FROM jsonb_each(COALESCE(raw_after, '{}'::jsonb)) AS new_field
+        WHERE NOT COALESCE(raw_before, '{}'::jsonb) ? new_field.key
+        UNION ALL
+        SELECT 'replace', new_field.key, new_field.value, old_field.value
+        FROM jsonb_each(COALESCE(raw_after, '{}'::jsonb)) AS new_field
+        JOIN jsonb_each(COALESCE(raw_before, '{}'::jsonb)) AS old_field ON old_field.key = new_field.key
+        WHERE old_field.value IS DISTINCT FROM new_field.value
+        UNION ALL
+        SELECT 'remove', old_field.key, NULL, old_field.value
+        FROM jsonb_each(COALESCE(raw_before, '{}'::jsonb)) AS old_field
+        WHERE NOT COALESCE(raw_after, '{}'::jsonb) ? old_field.key
+    ), ops AS (
+        SELECT op, key, value, old, '/' || replace(replace(key, '~', '~0'), '/', '~1') AS path FROM changes
+    )
+    SELECT COALESCE(jsonb_agg(
+               CASE WHEN key = ANY (secret_columns) THEN jsonb_build_object('op', op, 'path', path)
+                    WHEN op = 'add' THEN jsonb_build_object('op', op, 'path', path, 'value', value)
+                    WHEN op = 'replace' THEN jsonb_build_object('op', op, 'path', path, 'value', value, 'old', old)
+                    ELSE jsonb_build_object('op', op, 'path', path, 'old', old)
+               END), '[]'::jsonb),
+           COALESCE(bool_and(key = ANY (noise_columns)), false)
+    INTO row_delta, only_noise
+    FROM ops;
+
+    IF TG_OP = 'UPDATE' AND (row_delta = '[]'::jsonb OR only_noise) THEN
+        RETURN NULL;
+    END IF;
+
+    acting_user := COALESCE(
+        public.current_audit_user_id(),
+        NULLIF(current_setting('app.current_user_id', true), '')::integer,
+        (row_image ->> 'UserID')::integer
+    );
+    IF acting_user IS NULL THEN
+        RAISE WARNING 'audit_row_change: no user for % on %, not logged', TG_OP, TG_TABLE_NAME;
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO public.event_logs (userid, actiontype, tablename, recordid, beforevalue, aftervalue, delta)
+    VALUES (
+        acting_user,
+        TG_OP,
+        TG_TABLE_NAME,
+        (row_image ->> TG_ARGV[0])::integer,
+        CASE WHEN TG_OP = 'DELETE' THEN before_image END,
+        after_image,
+        row_delta
+    );
+    RETURN NULL;
+END;
+$$;
+
+-- Attach the trigger to each audited table; the argument is the table's key
+-- column. Audit triggers created on these tables by hand before this file
+-- (any other trigger whose function writes to event_logs) are dropped, or
+-- their changes would be logged twice.
+DO $$
+DECLARE
+    audited record;
+    old_trigger record;
+BEGIN
+    FOR audited IN
+        SELECT * FROM (VALUES
+            ('users', 'UserID'),
+            ('roles', 'RoleID'),
+            ('security_questions', 'QuestionID'),
+            ('user_security_answers', 'UserAnswerID'),
+            ('registration_requests', 'RequestID'),
+            ('signup_invitations', 'InvitationID')
+        ) AS t (table_name, key_column)
+    LOOP
+        FOR old_trigger IN
+            SELECT trigger_def.tgname
+            FROM pg_trigger AS trigger_def
+            JOIN pg_proc AS trigger_function ON trigger_function.oid = trigger_def.tgfoid
+            WHERE trigger_def.tgrelid = format('public.%I', audited.table_name)::regclass
+              AND NOT trigger_def.tgisinternal
+              AND trigger_def.tgname <> 'audit_row_change'
+              AND trigger_function.prosrc ILIKE '%event_logs%'
+        LOOP
+            EXECUTE format('DROP TRIGGER %I ON public.%I', old_trigger.tgname, audited.table_name);
+        END LOOP;
+        EXECUTE format('DROP TRIGGER IF EXISTS audit_row_change ON public.%I', audited.table_name);
+        EXECUTE format(
+            'CREATE TRIGGER audit_row_change AFTER INSERT OR UPDATE OR DELETE ON public.%I '
+            'FOR EACH ROW EXECUTE FUNCTION public.audit_row_change(%L)',
+            audited.table_name, audited.key_column);
+    END LOOP;
+END;
+$$;
+
+-- Query to check the header is arriving (run through the API, not the SQL editor):
+-- SELECT public.current_audit_user_id();
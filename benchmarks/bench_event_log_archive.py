@@ -0,0 +1,94 @@
+"""
+Event log query time as history grows, with and without archival.
+
+Seeds the local backend with the same number of event logs per month for a
+growing number of months, then times the Event Logs page's queries (the first
+page, and the last seven days filtered by action) against the whole history.
+It then runs archive_event_logs with a fixed retention window and times the
+same queries again: with old months archived, the live table and the query
+times stay flat however long the history is.
+
+    python benchmarks/bench_event_log_archive.py [--per-month 5000] [--months 6 12 24 48]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EventLogArchive import archive_event_logs, _add_months, _month_start
+from EventLogs import get_event_logs
+from ImageStore import LocalImageStore
+from LocalBackend import LocalClient, seed_demo_data
+
+RETENTION_MONTHS = 3
+
+
+def seed_history(sb, months, per_month):
+    """per_month logs for each of the last `months` months, evenly spaced."""
+    users = [u['UserID'] for u in sb.table('users').select('UserID').execute().data]
+    now = datetime.now(timezone.utc)
+    first = _add_months(_month_start(now), -(months - 1))
+    rows = []
+    for month in range(months):
+        start = _add_months(first, month)
+        end = min(_add_months(start, 1), now)
+        step = (end - start) / per_month
+        for n in range(per_month):
+            rows.append({
+                'userid': users[n % len(users)], 'timestamp': (start + step * n).isoformat(),
+                'actiontype': ('INSERT', 'UPDATE', 'DEACTIVATE')[n % 3], 'tablename': 'chart_of_accounts',
+                'recordid': n % 500, 'aftervalue': '{"comment": "edit"}'
+            })
+    for chunk in range(0, len(rows), 5000):
+        sb.table('event_logs').insert(rows[chunk:chunk + 5000]).execute()
+
+
+def time_queries(sb, repeats):
+    """Median ms of the Event Logs page's first page and a filtered last-week view."""
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).strftime('%Y-%m-%d')
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        get_event_logs(cursor='', count='exact', sb=sb)
+        get_event_logs(cursor='', count='exact', action_filter='UPDATE', date_from=week_ago, sb=sb)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--per-month', type=int, default=5000, help='event logs per month of history')
+    parser.add_argument('--months', type=int, nargs='+', default=[6, 12, 24, 48], help='history lengths to try')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.per_month:,} logs/month, retention {RETENTION_MONTHS} months + current")
+    print(f"{'months':>7}{'total rows':>12}{'live rows':>11}{'all history':>14}{'live only':>11}{'archive':>10}")
+    for months in args.months:
+        sb = LocalClient(':memory:')
+        seed_demo_data(sb, users=20, accounts=1, registrations=1, event_logs=0)
+        seed_history(sb, months, args.per_month)
+        total = sb.table('event_logs').select('logid', count='exact').limit(1).execute().count
+        before = time_queries(sb, args.repeats)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = LocalImageStore(tmp)
+            started = time.perf_counter()
+            result = archive_event_logs(retention_months=RETENTION_MONTHS, sb=sb, store=store)
+            archive_seconds = time.perf_counter() - started
+            assert result['success'], result
+            live = sb.table('event_logs').select('logid', count='exact').limit(1).execute().count
+            after = time_queries(sb, args.repeats)
+        sb.close()
+
+        print(f"{months:>7}{total:>12,}{live:>11,}{before:>11.1f} ms{after:>8.1f} ms{archive_seconds:>9.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Profile picture bytes per page view.
+
+Uploads a synthetic photo through ProfilePictureHandler against the local
+backend and compares what the header avatar downloads: the single 400px image
+(before variants) versus the variant a browser picks from the srcset for the
+45px avatar at common device pixel ratios.
+
+    python benchmarks/bench_profile_images.py [--pages 1000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+from ImageStore import LocalImageStore
+from LocalBackend import LocalClient
+from ProfilePictureHandler import ProfilePictureHandler, profile_picture_srcset
+
+AVATAR_CSS_PX = 45
+
+
+def synthetic_photo(width=1600, height=1200):
+    """Noisy gradients that compress roughly like a real photo."""
+    horizontal = Image.linear_gradient('L').rotate(90).resize((width, height))
+    vertical = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    channels = [Image.blend(base, noise, 0.3) for base in (horizontal, vertical, noise)]
+    return Image.merge('RGB', channels).filter(ImageFilter.GaussianBlur(1))
+
+
+def picked_variant(srcset, dpr):
+    """The smallest candidate covering the avatar at this pixel ratio (browser rule)."""
+    needed = AVATAR_CSS_PX * dpr
+    for name, width in srcset:
+        if width >= needed:
+            return name
+    return srcset[-1][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=1000, help='page views to extrapolate to')
+    args = parser.parse_args()
+
+    sb = LocalClient(':memory:')
+    sb.table('users').insert({'Username': 'bench', 'PasswordHash': 'x', 'FirstName': 'B',
+                              'LastName': 'U', 'Email': 'bench@example.com'}).execute()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        handler = ProfilePictureHandler(sb=sb, store=LocalImageStore(tmp))
+
+        photo = synthetic_photo()
+        started = time.perf_counter()
+        result = handler.save_profile_picture(1, photo)
+        upload_ms = (time.perf_counter() - started) * 1000
+        assert result['success'], result
+
+        sizes = {name: os.path.getsize(os.path.join(tmp, name)) for name in result['variants'].values()}
+        srcset = profile_picture_srcset(result)
+        full = sizes[result['filename']]
+
+        print(f"Upload + {len(srcset)} variants: {upload_ms:.0f} ms")
+        for name, width in srcset:
+            print(f"  {width:>4}px  {sizes[name]:>7,} bytes  {name}")
+        print()
+        print(f"Header avatar ({AVATAR_CSS_PX} CSS px), bytes per page view:")
+        print(f"  {'DPR':<5}{'before':>10}{'after':>10}{'saved':>10}{'per ' + str(args.pages) + ' pages':>18}")
+        for dpr in (1, 2, 3):
+            after = sizes[picked_variant(srcset, dpr)]
+            saved = full - after
+            print(f"  {dpr:<5}{full:>10,}{after:>10,}{saved:>10,}{saved * args.pages / 1024:>15,.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+-- Email outbox
+-- Request handlers no longer call SendGrid directly. They insert a row here
+-- (see EmailOutbox.enqueue_email) and the worker process (Procfile "worker:")
+-- delivers it, retrying with exponential backoff. A message that still fails
+-- after EMAIL_MAX_ATTEMPTS tries is marked 'dead' and left for inspection.
+
+CREATE TABLE IF NOT EXISTS public.email_outbox (
+    id integer GENERATED ALWAYS AS IDENTITY NOT NULL,
+    sender_email text NOT NULL,
+    sender_name text NOT NULL,
+    receiver_email text NOT NULL,
+    subject_line text NOT NULL,
+    body text NOT NULL,
+    status text NOT NULL DEFAULT 'pending' CHECK (status = ANY (ARRAY['pending'::text, 'sending'::text, 'sent'::text, 'dead'::text])),
+    attempts integer NOT NULL DEFAULT 0,
+    next_attempt_at timestamp with time zone NOT NULL DEFAULT now(),
+    locked_at timestamp with time zone,
+    last_error text,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    sent_at timestamp with time zone,
+    CONSTRAINT email_outbox_pkey PRIMARY KEY (id)
+);
+
+-- The worker polls for due pending messages
+CREATE INDEX IF NOT EXISTS email_outbox_due_idx
+    ON public.email_outbox (status, next_attempt_at);
+
+-- Row level security stays off, as on the other app tables: the app connects
+-- with the anon key and must be able to insert, claim and update rows.
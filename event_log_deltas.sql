@@ -0,0 +1,8 @@
+-- Compact audit images
+-- _log_event (ChartOfAccounts.py) stores each change as a JSON-patch style
+-- delta of the fields that changed, with their old and new values, instead of
+-- the full before and after rows. Only snapshot rows keep a full after image
+-- (aftervalue); see AuditDelta.py. Rows written before this keep their full
+-- images and are diffed when read.
+
+ALTER TABLE public.event_logs ADD COLUMN IF NOT EXISTS delta jsonb;
@@ -0,0 +1,17 @@
+-- Per-record audit history
+-- get_record_history (EventLogs.py, /api/event-logs/history/<table>/<id>)
+-- lists one record's events newest first, filtering on tablename + recordid
+-- and paging by ("timestamp", logid). This index serves that as a range scan.
+-- Its leading column also serves event_log_tables() (event_log_tables.sql),
+-- so the single-column tablename index is no longer needed.
+
+CREATE INDEX IF NOT EXISTS event_logs_record_idx
+    ON public.event_logs (tablename, recordid, "timestamp" DESC, logid DESC);
+DROP INDEX IF EXISTS public.event_logs_tablename_idx;
+
+-- The Event Logs user filter ("part of a username") is resolved to UserIDs
+-- before the log is queried; a trigram index keeps that ilike '%...%'
+-- lookup off a sequential scan of users
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS users_username_trgm_idx
+    ON public.users USING gin ("Username" gin_trgm_ops);
@@ -0,0 +1,24 @@
+-- Distinct tables in the event log
+-- get_event_log_tables (EventLogs.py) calls this through
+-- sb.rpc('event_log_tables') to fill the table filter on the Event Logs page.
+-- A recursive "loose index scan" jumps from one tablename to the next in the
+-- index below, so the cost grows with the number of distinct tables (a
+-- handful), not with the number of log rows.
+
+CREATE INDEX IF NOT EXISTS event_logs_tablename_idx
+    ON public.event_logs (tablename);
+
+CREATE OR REPLACE FUNCTION public.event_log_tables()
+RETURNS TABLE (tablename text)
+LANGUAGE sql STABLE
+AS $$
+    WITH RECURSIVE t AS (
+        (SELECT e.tablename FROM public.event_logs e ORDER BY e.tablename LIMIT 1)
+        UNION ALL
+        SELECT (SELECT e.tablename FROM public.event_logs e
+                WHERE e.tablename > t.tablename ORDER BY e.tablename LIMIT 1)
+        FROM t
+        WHERE t.tablename IS NOT NULL
+    )
+    SELECT t.tablename FROM t WHERE t.tablename IS NOT NULL;
+$$;
@@ -0,0 +1,118 @@
+-- Monthly partitions for event_logs
+-- event_logs is append-only and was never pruned, so every date-filtered
+-- query got slower as history grew. This migration turns it into a table
+-- partitioned by month on "timestamp": date filters only touch the months they
+-- cover, and archive_event_logs (EventLogArchive.py, run by the scheduler)
+-- archives months past the retention window and then drops their partitions
+-- with drop_event_log_partition. Rows outside every monthly partition land in
+-- event_logs_default. ensure_event_log_partitions creates partitions ahead of
+-- time and is called by the same job.
+--
+-- The primary key must include the partition key, so it becomes
+-- (logid, "timestamp"); logid still comes from one sequence and stays unique.
+-- Run once, in a quiet period: the existing rows are copied.
+
+BEGIN;
+
+ALTER TABLE public.event_logs RENAME TO event_logs_unpartitioned;
+ALTER TABLE public.event_logs_unpartitioned RENAME CONSTRAINT event_logs_pkey TO event_logs_unpartitioned_pkey;
+DROP INDEX IF EXISTS public.event_logs_tablename_idx;
+DROP INDEX IF EXISTS public.event_logs_record_idx;
+-- logid's identity sequence is still called event_logs_logid_seq after the
+-- rename; drop it so the new table's sequence can take the name. The next
+-- logid continues from the copied rows.
+ALTER TABLE public.event_logs_unpartitioned ALTER COLUMN logid DROP IDENTITY IF EXISTS;
+
+CREATE SEQUENCE public.event_logs_logid_seq AS integer;
+SELECT setval('public.event_logs_logid_seq',
+              COALESCE((SELECT max(logid) FROM public.event_logs_unpartitioned), 0) + 1, false);
+
+CREATE TABLE public.event_logs (
+  logid integer NOT NULL DEFAULT nextval('public.event_logs_logid_seq'),
+  userid integer NOT NULL,
+  timestamp timestamp with time zone NOT NULL DEFAULT now(),
+  actiontype text NOT NULL,
+  tablename text NOT NULL,
+  recordid integer NOT NULL,
+  beforevalue jsonb,
+  aftervalue jsonb,
+  delta jsonb,
+  CONSTRAINT event_logs_pkey PRIMARY KEY (logid, "timestamp"),
+  CONSTRAINT fk_eventlogs_user_partitioned FOREIGN KEY (userid) REFERENCES public.users("UserID")
+) PARTITION BY RANGE ("timestamp");
+ALTER SEQUENCE public.event_logs_logid_seq OWNED BY public.event_logs.logid;
+
+CREATE TABLE public.event_logs_default PARTITION OF public.event_logs DEFAULT;
+
+-- Created on the parent, so every partition gets them
+CREATE INDEX event_logs_timestamp_idx ON public.event_logs ("timestamp" DESC, logid DESC);
+CREATE INDEX event_logs_record_idx ON public.event_logs (tablename, recordid, "timestamp" DESC, logid DESC);
+
+CREATE OR REPLACE FUNCTION public.event_log_partition_name(month_start date)
+RETURNS text
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT 'event_logs_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM');
+$$;
+
+-- Create the monthly partitions from from_month (default: this month) to
+-- months_ahead months from now. Rows already in the default partition for a
+-- new month are moved into it. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION public.ensure_event_log_partitions(months_ahead integer DEFAULT 3, from_month date DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month date := date_trunc('month', COALESCE(from_month, now()))::date;
+    last_month date := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+    partition text;
+    created integer := 0;
+BEGIN
+    WHILE month <= last_month LOOP
+        partition := public.event_log_partition_name(month);
+        IF to_regclass('public.' || partition) IS NULL THEN
+            EXECUTE format('CREATE TABLE public.%I (LIKE public.event_logs INCLUDING DEFAULTS)', partition);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM public.event_logs_default WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *) '
+                'INSERT INTO public.%I SELECT * FROM moved',
+                month, month + interval '1 month', partition);
+            EXECUTE format('ALTER TABLE public.event_logs ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                partition, month, month + interval '1 month');
+            created := created + 1;
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Remove an archived month. The partition is dropped unless rows newer than
+-- the archive (logid > max_logid) arrived since; then only the archived rows
+-- are deleted. Archived rows in the default partition are deleted too.
+CREATE OR REPLACE FUNCTION public.drop_event_log_partition(month_start date, max_logid integer)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    partition text := public.event_log_partition_name(month_start);
+    late_rows boolean;
+BEGIN
+    IF to_regclass('public.' || partition) IS NOT NULL THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I WHERE logid > %s)', partition, max_logid) INTO late_rows;
+        IF late_rows THEN
+            EXECUTE format('DELETE FROM public.%I WHERE logid <= %s', partition, max_logid);
+        ELSE
+            EXECUTE format('ALTER TABLE public.event_logs DETACH PARTITION public.%I', partition);
+            EXECUTE format('DROP TABLE public.%I', partition);
+        END IF;
+    END IF;
+    DELETE FROM public.event_logs_default
+    WHERE "timestamp" >= month_start AND "timestamp" < month_start + interval '1 month' AND logid <= max_logid;
+END;
+$$;
+
+SELECT public.ensure_event_log_partitions(3, (SELECT min("timestamp") FROM public.event_logs_unpartitioned)::date);
+INSERT INTO public.event_logs SELECT * FROM public.event_logs_unpartitioned;
+DROP TABLE public.event_logs_unpartitioned;
+
+COMMIT;
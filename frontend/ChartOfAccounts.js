@@ -4,11 +4,21 @@
 
   let currentPage = 1;
   const perPage = 20;
+  // Keyset cursors: pageCursors[n - 1] loads page n ('' is the first page)
+  let pageCursors = [''];
+  // Totals only come back with the first page; later pages skip counting
+  let totalAccounts = null;
+  let totalCountMode = 'exact';
 
   async function fetchAccounts(page = 1){
+    if(page === 1) pageCursors = [''];
+    const cursor = pageCursors[page - 1];
+    if(cursor === undefined) return;
     currentPage = page;
     const q = document.getElementById('search').value || '';
-    const res = await fetch(`/api/accounts?search=${encodeURIComponent(q)}&page=${page}&per_page=${perPage}`);
+    // Planner estimate while typing a search; exact totals otherwise
+    const countMode = page > 1 ? 'none' : (q ? 'planned' : 'exact');
+    const res = await fetch(`/api/accounts?search=${encodeURIComponent(q)}&cursor=${encodeURIComponent(cursor)}&per_page=${perPage}&count=${countMode}`);
     const body = await res.json();
     const tbody = document.querySelector('#accountsTable tbody');
     tbody.innerHTML = '';
@@ -20,8 +30,17 @@
       const prev = document.getElementById('prevPage');
       const next = document.getElementById('nextPage');
       const pagination = body.pagination || {};
-      info.innerText = `Page ${pagination.current_page || currentPage} of ${pagination.total_pages || 1} — ${pagination.total_accounts || 0} accounts`;
-      prev.disabled = !(pagination.has_prev);
+      if(pagination.next_cursor) pageCursors[page] = pagination.next_cursor;
+      if(page === 1){
+        totalAccounts = pagination.total_accounts;
+        totalCountMode = pagination.count_mode;
+      }
+      const approx = totalCountMode && totalCountMode !== 'exact' ? '~' : '';
+      const totalPages = Math.max(Math.ceil((totalAccounts || 0) / perPage), currentPage);
+      info.innerText = totalAccounts === null || totalAccounts === undefined
+        ? `Page ${currentPage}`
+        : `Page ${currentPage} of ${approx}${totalPages} — ${approx}${totalAccounts || 0} accounts`;
+      prev.disabled = currentPage <= 1;
       next.disabled = !(pagination.has_next);
     }
   }
@@ -1,6 +1,13 @@
 let currentPage = 1;
 let currentSearch = '';
 let currentStatus = '';
+// Keyset cursors: pageCursors[n - 1] loads page n ('' is the first page)
+let pageCursors = [''];
+// Totals only come back with the first page; later pages skip counting
+let totalUsers = null;
+let totalCountMode = 'exact';
+// Users ticked for a bulk email (email -> name); kept across pages and filters
+let selectedRecipients = new Map();
 
 // Load users function
 async function loadUsers(page = 1, search = '', status = '') {
@@ -8,10 +15,18 @@ async function loadUsers(page = 1, search = '', status = '') {
         document.getElementById('loading').style.display = 'block';
         document.getElementById('no-users').style.display = 'none';
         
+        // Filters changed or first load: start the cursor chain over
+        if (page === 1) {
+            pageCursors = [''];
+        }
+        const cursor = pageCursors[page - 1] !== undefined ? pageCursors[page - 1] : '';
+        
         const params = new URLSearchParams({
-            page: page,
+            cursor: cursor,
             search: search,
-            status: status
+            status: status,
+            // Planner estimate while typing a search; exact totals otherwise
+            count: page > 1 ? 'none' : (search ? 'planned' : 'exact')
         });
         
         const response = await fetch(`/api/users?${params}`);
@@ -21,6 +36,14 @@ async function loadUsers(page = 1, search = '', status = '') {
         
         if (data.success) {
             renderUsers(data.users);
+            if (data.pagination.next_cursor) {
+                pageCursors[page] = data.pagination.next_cursor;
+            }
+            currentPage = page;
+            if (page === 1) {
+                totalUsers = data.pagination.total_users;
+                totalCountMode = data.pagination.count_mode;
+            }
             renderPagination(data.pagination);
         } else {
             console.error('Error loading users:', data.message);
@@ -49,7 +72,10 @@ function renderUsers(users) {
         const statusBadgeClass = `status-${user.Status.toLowerCase()}`;
         const actionButtons = createActionButtons(user);
         
+        const checked = selectedRecipients.has(user.Email) ? 'checked' : '';
         row.innerHTML = `
+            <td><input type="checkbox" class="user-select" data-email="${user.Email}" 
+                data-name="${user.FirstName} ${user.LastName}" ${checked}></td>
             <td>${user.UserID}</td>
             <td>${user.Username || 'N/A'}</td>
             <td>${user.FirstName} ${user.LastName}</td>
@@ -67,6 +93,24 @@ function renderUsers(users) {
     
     // Attach event listeners to action buttons
     attachActionListeners();
+    updateSelectionControls();
+}
+
+// Bulk email selection
+function updateSelectionControls() {
+    const button = document.getElementById('email-selected-btn');
+    button.disabled = selectedRecipients.size === 0;
+    button.textContent = `Email Selected (${selectedRecipients.size})`;
+    
+    const boxes = [...document.querySelectorAll('.user-select')];
+    const selectAll = document.getElementById('select-all-users');
+    selectAll.checked = boxes.length > 0 && boxes.every(box => box.checked);
+}
+
+function clearSelection() {
+    selectedRecipients.clear();
+    document.querySelectorAll('.user-select').forEach(box => { box.checked = false; });
+    updateSelectionControls();
 }
 
 // Create action buttons for each user
@@ -136,6 +180,18 @@ function attachActionListeners() {
         });
     });
     
+    // Selection checkboxes
+    document.querySelectorAll('.user-select').forEach(box => {
+        box.addEventListener('change', function() {
+            if (this.checked) {
+                selectedRecipients.set(this.dataset.email, this.dataset.name);
+            } else {
+                selectedRecipients.delete(this.dataset.email);
+            }
+            updateSelectionControls();
+        });
+    });
+    
     // Email buttons
     document.querySelectorAll('.email-btn').forEach(button => {
         button.addEventListener('click', function() {
@@ -218,20 +274,23 @@ function renderPagination(pagination) {
     const nextBtn = document.getElementById('next-page');
     const pageInfo = document.getElementById('page-info');
     
-    if (pagination.total_pages <= 1) {
+    if (currentPage <= 1 && !pagination.has_next) {
         paginationDiv.style.display = 'none';
         return;
     }
     
     paginationDiv.style.display = 'flex';
     
-    prevBtn.disabled = !pagination.has_prev;
+    prevBtn.disabled = currentPage <= 1;
     nextBtn.disabled = !pagination.has_next;
     
-    pageInfo.textContent = `Page ${pagination.current_page} of ${pagination.total_pages} (${pagination.total_users} total users)`;
-    
-    // Update current page
-    currentPage = pagination.current_page;
+    if (totalUsers === null || totalUsers === undefined) {
+        pageInfo.textContent = `Page ${currentPage}`;
+    } else {
+        const totalPages = Math.max(Math.ceil(totalUsers / pagination.per_page), currentPage);
+        const approx = totalCountMode && totalCountMode !== 'exact' ? '~' : '';
+        pageInfo.textContent = `Page ${currentPage} of ${approx}${totalPages} (${approx}${totalUsers} total users)`;
+    }
 }
 
 // Edit modal functions
@@ -316,9 +375,9 @@ function closeEditModal() {
     document.getElementById('edit-modal').style.display = 'none';
 }
 
-// Email modal functions
+// Email modal functions; email may be one address or a list for a bulk send
 function showEmailModal(email, name) {
-    document.getElementById('email-recipient').value = email;
+    document.getElementById('email-recipient').value = Array.isArray(email) ? email.join(', ') : email;
     document.getElementById('email-subject').value = '';
     document.getElementById('email-message').value = '';
     document.getElementById('email-modal').style.display = 'block';
@@ -409,6 +468,24 @@ document.addEventListener('DOMContentLoaded', function() {
         loadUsers(currentPage, currentSearch, currentStatus);
     });
     
+    // Select every user on the current page
+    document.getElementById('select-all-users').addEventListener('change', function() {
+        document.querySelectorAll('.user-select').forEach(box => {
+            box.checked = this.checked;
+            if (this.checked) {
+                selectedRecipients.set(box.dataset.email, box.dataset.name);
+            } else {
+                selectedRecipients.delete(box.dataset.email);
+            }
+        });
+        updateSelectionControls();
+    });
+    
+    // One email to every selected user
+    document.getElementById('email-selected-btn').addEventListener('click', function() {
+        showEmailModal([...selectedRecipients.keys()]);
+    });
+    
     // Check suspensions button
     document.getElementById('check-suspensions-btn').addEventListener('click', async function() {
         this.disabled = true;
@@ -452,6 +529,9 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     document.getElementById('next-page').addEventListener('click', function() {
+        if (pageCursors[currentPage] === undefined) {
+            return;
+        }
         loadUsers(currentPage + 1, currentSearch, currentStatus);
     });
     
@@ -546,11 +626,16 @@ document.addEventListener('DOMContentLoaded', function() {
         e.preventDefault();
         
         const formData = new FormData(this);
+        const recipients = formData.get('recipient_email').split(',').map(email => email.trim()).filter(Boolean);
         const data = {
-            recipient_email: formData.get('recipient_email'),
             subject: formData.get('subject'),
             message: formData.get('message')
         };
+        if (recipients.length > 1) {
+            data.recipient_emails = recipients;
+        } else {
+            data.recipient_email = recipients[0];
+        }
         
         try {
             const response = await fetch('/api/send-email', {
@@ -564,7 +649,10 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
             
             if (result.success) {
-                alert('Email sent successfully!');
+                alert(recipients.length > 1 ? `Email queued for ${recipients.length} users!` : 'Email queued for delivery!');
+                if (recipients.length > 1) {
+                    clearSelection();
+                }
                 closeEmailModal();
             } else {
                 alert('Error sending email: ' + result.message);
@@ -0,0 +1,31 @@
+-- Resumable, idempotent password expiry sweep
+-- send_password_expiry_notifications (EmailUser.py) pages through users by
+-- UserID and saves its position in job_checkpoints after each page, so a run
+-- cut short by a request timeout resumes where it stopped. Every email sent is
+-- recorded in password_expiry_notices, keyed by the expiry date it warned
+-- about; reruns skip users already warned about that date, while a new
+-- password (and so a new expiry date) gets its own notice.
+
+CREATE TABLE IF NOT EXISTS public.job_checkpoints (
+    job_name text NOT NULL,
+    run_key text NOT NULL,
+    position text,
+    status text NOT NULL DEFAULT 'running' CHECK (status = ANY (ARRAY['running'::text, 'complete'::text])),
+    updated_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT job_checkpoints_pkey PRIMARY KEY (job_name)
+);
+
+CREATE TABLE IF NOT EXISTS public.password_expiry_notices (
+    "UserID" integer NOT NULL,
+    "PasswordExpiryDate" timestamp with time zone NOT NULL,
+    "SentAt" timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT password_expiry_notices_pkey PRIMARY KEY ("UserID", "PasswordExpiryDate"),
+    CONSTRAINT fk_password_expiry_notices_user FOREIGN KEY ("UserID") REFERENCES public.users("UserID")
+);
+
+-- Row level security stays off, as on the other app tables: the sweep writes
+-- checkpoints and notices with the app's anon key.
+
+-- The sweep filters on expiry date and walks UserID order
+CREATE INDEX IF NOT EXISTS users_password_expiry_idx
+    ON public.users ("PasswordExpiryDate", "UserID") WHERE "IsActive" AND NOT "IsSuspended";
@@ -0,0 +1,8 @@
+-- Profile picture size variants
+-- save_profile_picture writes the uploaded picture at several square sizes
+-- (see PROFILE_VARIANT_SIZES in ProfilePictureHandler.py) and records them here
+-- as {"32": "user_7_profile_32.webp", ..., "400": "user_7_profile.webp"}.
+-- Pages use them to build an <img srcset> so small avatars load small files.
+
+ALTER TABLE public.users
+    ADD COLUMN IF NOT EXISTS "ProfilePictureVariants" jsonb;
@@ -0,0 +1,63 @@
+-- In-process job scheduler
+-- Scheduler.py (the Procfile "scheduler:" entry) runs periodic jobs in its own
+-- worker process. Each job has a row here: a scheduler instance may only run a
+-- job after claiming the row with a conditional update (next_run_at has
+-- passed and no other instance holds the lease), so with several instances
+-- each scheduled run happens exactly once. Every run is also written to
+-- cron_job_logs.
+
+CREATE TABLE IF NOT EXISTS public.scheduled_jobs (
+    job_name text NOT NULL,
+    schedule text NOT NULL,
+    next_run_at timestamp with time zone NOT NULL,
+    locked_by text,
+    locked_until timestamp with time zone NOT NULL DEFAULT now(),
+    last_run_at timestamp with time zone,
+    last_status text,
+    last_duration_ms integer,
+    CONSTRAINT scheduled_jobs_pkey PRIMARY KEY (job_name)
+);
+
+-- Row level security stays off, as on the other app tables: the scheduler
+-- connects with the app's anon key and claims rows with plain updates.
+
+-- cron_job_logs (supabase_cron_job.sql) keeps row level security, and only
+-- service_role may write it directly. The scheduler connects with the anon
+-- key, so it goes through these two functions instead: one records a run, the
+-- other deletes rows older than the retention cutoff. Only they are granted to
+-- the app's roles, so holders of the public anon key can't read, forge or
+-- delete the job history.
+CREATE OR REPLACE FUNCTION public.log_cron_job_run(
+    job_name text, execution_time timestamp with time zone, status text, response_body text, notes text)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO public.cron_job_logs (job_name, execution_time, status, response_body, notes)
+    VALUES (job_name, execution_time, status, response_body, notes);
+$$;
+
+CREATE OR REPLACE FUNCTION public.delete_old_cron_job_logs(older_than timestamp with time zone)
+RETURNS integer
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH deleted AS (
+        DELETE FROM public.cron_job_logs WHERE execution_time < older_than RETURNING 1
+    )
+    SELECT count(*)::integer FROM deleted;
+$$;
+
+REVOKE ALL ON FUNCTION public.log_cron_job_run(text, timestamp with time zone, text, text, text) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.delete_old_cron_job_logs(timestamp with time zone) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.log_cron_job_run(text, timestamp with time zone, text, text, text) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.delete_old_cron_job_logs(timestamp with time zone) TO anon, authenticated;
+
+-- An earlier version of this file opened the table itself to the anon key
+DROP POLICY IF EXISTS "Allow the app to manage cron logs" ON public.cron_job_logs;
+
+-- The password expiry sweep now runs in the scheduler instead of a web
+-- request; drop the pg_cron HTTP trigger from supabase_cron_job.sql:
+-- SELECT cron.unschedule('password-expiry-notifications');
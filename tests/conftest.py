@@ -60,3 +60,11 @@ def fake_sb_factory():
     def _make(responses):
         return FakeTableRouter(responses)
     return _make
+
+@pytest.fixture
+def local_sb():
+    """An empty in-memory database with the DBSchema.sql tables."""
+    from LocalBackend import LocalClient
+    client = LocalClient(':memory:')
+    yield client
+    client.close()
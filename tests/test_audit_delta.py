@@ -0,0 +1,116 @@
+import json
+import pytest
+import AuditDelta
+import ChartOfAccounts
+import EventLogs
+from AuditWriter import AuditWriter
+from SupabaseClient import set_current_user
+
+
+ACCOUNT = {'accountid': 5, 'accountname': 'Cash', 'accountnumber': '0101', 'balance': '100.00',
+           'comment': 'opening', 'isactive': True}
+
+
+def test_delta_round_trips_both_ways():
+    after = dict(ACCOUNT, comment='edited', balance='90.00', tags=['a'])
+    del after['isactive']
+    delta = AuditDelta.compute_delta(ACCOUNT, after)
+    assert {op['op'] for op in delta} == {'replace', 'add', 'remove'}
+    assert AuditDelta.apply_delta(ACCOUNT, delta) == after
+    assert AuditDelta.apply_delta(after, delta, reverse=True) == ACCOUNT
+    assert AuditDelta.compute_delta({'a/b~': 1}, {'a/b~': 2})[0]['path'] == '/a~1b~0'
+
+
+@pytest.fixture
+def writer(local_sb, tmp_path, monkeypatch):
+    writer = AuditWriter(sb=local_sb, spool_dir=str(tmp_path))
+    monkeypatch.setattr(ChartOfAccounts, 'get_audit_writer', lambda: writer)
+    monkeypatch.setattr(AuditDelta, 'AUDIT_SNAPSHOT_EVERY', 3)
+    AuditDelta.reset_snapshot_counters()
+    yield writer
+    writer.close()
+    set_current_user(None)
+
+
+def _log_history(sb, writer, edits=5):
+    user_id = sb.table('users').insert({'Username': 'auditor', 'PasswordHash': 'x', 'FirstName': 'A', 'LastName': 'B',
+                                        'Email': 'a@example.com'}).execute().data[0]['UserID']
+    set_current_user(user_id)
+    states = [dict(ACCOUNT)]
+    ChartOfAccounts._log_event(sb, 'chart_of_accounts', 5, 'INSERT', None, states[0])
+    for n in range(edits):
+        states.append(dict(states[-1], comment=f'edit {n}'))
+        ChartOfAccounts._log_event(sb, 'chart_of_accounts', 5, 'UPDATE', states[-2], states[-1])
+    writer.flush(timeout=5)
+    return states
+
+
+def test_changes_store_only_the_delta(local_sb, writer):
+    _log_history(local_sb, writer)
+    rows = local_sb.table('event_logs').select('actiontype, beforevalue, aftervalue, delta') \
+        .order('logid').execute().data
+    assert all(row['beforevalue'] is None for row in rows)
+    # INSERT, then a snapshot every third event
+    assert [row['aftervalue'] is not None for row in rows] == [True, False, False, True, False, False]
+    assert rows[1]['delta'] == [{'op': 'replace', 'path': '/comment', 'value': 'edit 0', 'old': 'opening'}]
+
+    listing = EventLogs.get_event_logs(sb=local_sb, cursor='')['logs']
+    assert 'aftervalue' not in listing[0] and listing[-1]['delta'][0]['op'] == 'add'
+    # Against storing both full images on every change
+    stored = sum(len(json.dumps(row['delta'])) + len(row['aftervalue'] or '') for row in rows[1:])
+    assert stored < len(json.dumps(ACCOUNT)) * 2 * len(rows[1:]) / 2
+
+
+def test_full_images_are_rebuilt_on_demand(local_sb, writer):
+    states = _log_history(local_sb, writer)
+    logids = [row['logid'] for row in local_sb.table('event_logs').select('logid').order('logid').execute().data]
+    for n, logid in enumerate(logids):
+        detail = EventLogs.get_event_log_detail(logid, sb=local_sb)
+        assert detail['success'] and not detail['partial']
+        assert detail['after'] == states[n]
+        assert detail['before'] == (states[n - 1] if n else None)
+
+
+def test_legacy_rows_still_show_their_changes(local_sb):
+    user_id = local_sb.table('users').insert({'Username': 'u', 'PasswordHash': 'x', 'FirstName': 'A', 'LastName': 'B',
+                                              'Email': 'u@example.com'}).execute().data[0]['UserID']
+    after = dict(ACCOUNT, comment='legacy')
+    logid = local_sb.table('event_logs').insert({
+        'userid': user_id, 'actiontype': 'UPDATE', 'tablename': 'chart_of_accounts', 'recordid': 5,
+        'beforevalue': json.dumps(ACCOUNT), 'aftervalue': json.dumps(after)
+    }).execute().data[0]['logid']
+    detail = EventLogs.get_event_log_detail(logid, sb=local_sb)
+    assert detail['before'] == ACCOUNT and detail['after'] == after
+    assert detail['log']['delta'] == [{'op': 'replace', 'path': '/comment', 'value': 'legacy', 'old': 'opening'}]
+
+
+def test_interleaved_writers_rebuild_in_event_order(local_sb, tmp_path, monkeypatch):
+    # Two processes' audit writers change the same record; A's batch lands first
+    writers = {name: AuditWriter(sb=local_sb, spool_dir=str(tmp_path / name), flush_seconds=60) for name in 'AB'}
+    user_id = local_sb.table('users').insert({'Username': 'u', 'PasswordHash': 'x', 'FirstName': 'A', 'LastName': 'B',
+                                              'Email': 'u@example.com'}).execute().data[0]['UserID']
+    set_current_user(user_id)
+    AuditDelta.reset_snapshot_counters()
+
+    def log(name, before, after, action='UPDATE'):
+        monkeypatch.setattr(ChartOfAccounts, 'get_audit_writer', lambda: writers[name])
+        ChartOfAccounts._log_event(local_sb, 'chart_of_accounts', 5, action, before, after)
+
+    by_b = dict(ACCOUNT, comment='by B')
+    by_a = dict(by_b, balance='90.00')
+    try:
+        log('A', None, ACCOUNT, 'INSERT')
+        log('B', ACCOUNT, by_b)
+        log('A', by_b, by_a)
+        assert writers['A'].flush(timeout=5) and writers['B'].flush(timeout=5)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        set_current_user(None)
+
+    rows = local_sb.table('event_logs').select('logid, delta').order('logid').execute().data
+    # Insert order is A, A, B: logid order is not the order of the changes
+    assert rows[1]['delta'][0]['path'] == '/balance'
+    detail = EventLogs.get_event_log_detail(rows[1]['logid'], sb=local_sb)
+    assert detail['after'] == by_a and detail['before'] == by_b
+    assert EventLogs.get_event_log_detail(rows[2]['logid'], sb=local_sb)['after'] == by_b
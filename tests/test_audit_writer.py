@@ -0,0 +1,131 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import pytest
+from AuditWriter import AuditWriter
+from QueryMetrics import max_queries
+from SupabaseClient import set_current_user
+
+
+def _user(sb):
+    return sb.table('users').insert({
+        'Username': 'auditor', 'PasswordHash': 'x', 'FirstName': 'A', 'LastName': 'B', 'Email': 'a@example.com'
+    }).execute().data[0]['UserID']
+
+
+def _row(user_id, record_id):
+    return {'userid': user_id, 'actiontype': 'UPDATE', 'tablename': 'chart_of_accounts', 'recordid': record_id}
+
+
+class BrokenClient:
+    def table(self, name):
+        raise ConnectionError('database unavailable')
+
+
+class GatedClient:
+    """Lets one batch through per release, so the queue never empties."""
+    def __init__(self, sb):
+        self.sb = sb
+        self.gate = threading.Semaphore(0)
+
+    def table(self, name):
+        self.gate.acquire()
+        return self.sb.table(name)
+
+
+@pytest.fixture
+def writer(local_sb, tmp_path):
+    writer = AuditWriter(sb=local_sb, spool_dir=str(tmp_path), batch_size=50, flush_seconds=60)
+    yield writer
+    writer.close()
+
+
+def test_rows_are_inserted_in_batches(local_sb, writer):
+    user_id = _user(local_sb)
+    with max_queries(0):
+        for n in range(120):
+            writer.write(_row(user_id, n))
+    assert writer.flush(timeout=5)
+    rows = local_sb.table('event_logs').select('recordid').order('recordid').execute().data
+    assert [r['recordid'] for r in rows] == list(range(120))
+    assert os.path.getsize(writer.spool_path) == 0
+
+
+def test_account_changes_keep_the_user_from_the_request(local_sb, monkeypatch, writer):
+    import ChartOfAccounts
+    monkeypatch.setattr(ChartOfAccounts, 'get_audit_writer', lambda: writer)
+    user_id = _user(local_sb)
+
+    def request():
+        set_current_user(user_id)
+        ChartOfAccounts._log_event(local_sb, 'chart_of_accounts', 7, 'INSERT', None, {'AccountName': 'Cash'})
+    contextvars.copy_context().run(request)
+
+    writer.flush(timeout=5)
+    row = local_sb.table('event_logs').select('userid, recordid, actiontype').execute().data[0]
+    assert row == {'userid': user_id, 'recordid': 7, 'actiontype': 'INSERT'}
+
+
+def test_unwritten_rows_survive_in_the_spool(local_sb, tmp_path):
+    user_id = _user(local_sb)
+    broken = AuditWriter(sb=BrokenClient(), spool_dir=str(tmp_path), flush_seconds=0)
+    for n in range(3):
+        broken.write(_row(user_id, n))
+    assert not broken.flush(timeout=0.5)
+    broken.close()
+    assert broken.pending() == 3
+
+    # The next start (same pid, as after a restart) replays the spool
+    recovered = AuditWriter(sb=local_sb, spool_dir=str(tmp_path))
+    try:
+        assert recovered.flush(timeout=5)
+    finally:
+        recovered.close()
+    rows = local_sb.table('event_logs').select('recordid').execute().data
+    assert sorted(r['recordid'] for r in rows) == [0, 1, 2]
+
+
+def test_spools_of_live_processes_are_left_alone(local_sb, tmp_path):
+    other = tmp_path / f'audit-{os.getppid()}.jsonl'
+    other.write_text('{"recordid": 1}\n')
+    writer = AuditWriter(sb=local_sb, spool_dir=str(tmp_path))
+    writer.close()
+    assert other.exists() and writer.pending() == 0
+
+
+def test_invalid_rows_are_set_aside(local_sb, writer, tmp_path):
+    user_id = _user(local_sb)
+    writer.write(_row(user_id, 1))
+    writer.write(_row(None, 2))
+    writer.write(_row(user_id, 3))
+    assert writer.flush(timeout=5)
+    rows = local_sb.table('event_logs').select('recordid').order('recordid').execute().data
+    assert [r['recordid'] for r in rows] == [1, 3]
+    rejected = [json.loads(line) for line in (tmp_path / 'rejected.jsonl').read_text().splitlines()]
+    assert [r['row']['recordid'] for r in rejected] == [2]
+
+
+def test_spool_is_compacted_while_the_queue_is_busy(local_sb, tmp_path):
+    user_id = _user(local_sb)
+    client = GatedClient(local_sb)
+    writer = AuditWriter(sb=client, spool_dir=str(tmp_path), batch_size=10, flush_seconds=0)
+    for n in range(100):
+        writer.write(_row(user_id, n))
+    for _ in range(5):
+        client.gate.release()
+    deadline = time.monotonic() + 5
+    while writer.pending() > 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Half the spool was written, so it now holds only the other half
+    spooled = [json.loads(line) for line in open(writer.spool_path, encoding='utf-8')]
+    assert [row['recordid'] for row in spooled] == list(range(50, 100))
+
+    for _ in range(5):
+        client.gate.release()
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert os.path.getsize(writer.spool_path) == 0
+    assert local_sb.table('event_logs').select('logid', count='exact').limit(1).execute().count == 100
@@ -0,0 +1,76 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+import httpx
+import pytest
+import EmailUser
+
+
+class FakeSendGrid:
+    """Stands in for SendGrid's mail/send endpoint; records each request body."""
+
+    def __init__(self):
+        self.requests = []
+        self.fail_requests = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        payload = json.loads(request.read())
+        with self.lock:
+            self.requests.append(payload)
+            fail = payload['personalizations'][0]['to'][0]['email'] in self.fail_requests
+        if fail:
+            return httpx.Response(503, text='Service Unavailable')
+        return httpx.Response(202)
+
+
+@pytest.fixture(autouse=True)
+def fake_sendgrid(monkeypatch):
+    sendgrid = FakeSendGrid()
+    monkeypatch.setenv('SENDGRID_API_KEY', 'test-key')
+    monkeypatch.setattr(EmailUser, '_http', httpx.Client(transport=httpx.MockTransport(sendgrid)))
+    return sendgrid
+
+
+def _by_first_recipient(requests):
+    # Batches are sent concurrently, so compare them in recipient order
+    return sorted(requests, key=lambda r: int(r['personalizations'][-1]['to'][0]['email'][1:].split('@')[0]))
+
+
+def test_recipients_share_requests_up_to_the_limit(fake_sendgrid):
+    recipients = [{'email': f'u{n}@example.com', 'substitutions': {'-first_name-': f'U{n}'}} for n in range(2500)]
+    result = EmailUser.send_bulk_email('a@example.com', 'FinKen', recipients, 'Hello', '<p>Hi -first_name-</p>')
+    assert result['requests'] == 3
+    assert [len(r['personalizations']) for r in _by_first_recipient(fake_sendgrid.requests)] == [1000, 1000, 500]
+    personalization = next(p for r in fake_sendgrid.requests for p in r['personalizations']
+                           if p['to'][0]['email'] == 'u7@example.com')
+    assert personalization['substitutions'] == {'-first_name-': 'U7'}
+    assert all(r['success'] for r in result['results'])
+
+
+def test_failed_request_only_fails_its_own_recipients(fake_sendgrid):
+    # The second request holds u2 and u3 (personalizations are stored newest first)
+    fake_sendgrid.fail_requests = {'u3@example.com'}
+    recipients = [{'email': f'u{n}@example.com'} for n in range(5)]
+    result = EmailUser.send_bulk_email('a@example.com', 'FinKen', recipients, 'Hello', 'Hi', batch_size=2)
+    assert [r['success'] for r in result['results']] == [True, True, False, False, True]
+    assert 'status 503' in result['results'][2]['error']
+    assert result['requests'] == 3 and result['metrics']['failed'] == 1
+
+
+def test_expiry_notifications_use_one_request(local_sb, fake_sendgrid):
+    soon = datetime.now(timezone.utc) + timedelta(days=2, hours=1)
+    for n in range(3):
+        local_sb.table('users').insert({
+            'Username': f'user{n}', 'PasswordHash': 'x', 'FirstName': f'First{n}', 'LastName': 'L',
+            'Email': f'user{n}@example.com', 'PasswordExpiryDate': soon.isoformat()
+        }).execute()
+
+    result = EmailUser.send_password_expiry_notifications(sb=local_sb)
+    assert result['success'] and result['users_notified'] == 3
+    assert len(fake_sendgrid.requests) == 1
+    assert {n['email'] for n in result['notifications_sent']} == {f'user{n}@example.com' for n in range(3)}
+    subs = {p['to'][0]['email']: p['substitutions'] for p in fake_sendgrid.requests[0]['personalizations']}
+    assert subs['user1@example.com']['-username-'] == 'user1'
+    assert subs['user1@example.com']['-urgency-'] == 'in 2 days'
+    assert '-first_name-' in fake_sendgrid.requests[0]['content'][0]['value']
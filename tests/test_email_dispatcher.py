@@ -0,0 +1,47 @@
+import threading
+import time
+from EmailDispatcher import EmailDispatcher, TokenBucket
+
+
+def test_results_keep_input_order_and_failures_are_reported():
+    dispatcher = EmailDispatcher(max_workers=4, rate_per_second=1000, burst=100)
+
+    def send(n):
+        time.sleep(0.01 * (5 - n))
+        if n == 3:
+            raise RuntimeError('boom')
+        return {'success': True, 'n': n}
+
+    results, metrics = dispatcher.dispatch(send, range(5))
+    assert [r.get('n') for r in results] == [0, 1, 2, None, 4]
+    assert results[3] == {'success': False, 'error': 'boom'}
+    assert metrics['messages'] == 5 and metrics['failed'] == 1
+    assert dispatcher.stats() == {'sent': 4, 'failed': 1}
+    dispatcher.shutdown()
+
+
+def test_sends_overlap():
+    dispatcher = EmailDispatcher(max_workers=4, rate_per_second=1000, burst=100)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def send(_):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return {'success': True}
+
+    dispatcher.dispatch(send, range(8))
+    assert peak[0] > 1
+    dispatcher.shutdown()
+
+
+def test_token_bucket_enforces_rate():
+    bucket = TokenBucket(rate=50, burst=1)
+    started = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    # First token is free; the other five wait 1/50 s each
+    assert time.perf_counter() - started >= 0.09
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import EmailOutbox
+
+
+class StandInTransport:
+    """Records deliveries; fails the first `failures` sends."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def __call__(self, message):
+        if self.failures:
+            self.failures -= 1
+            return {'success': False, 'error': 'SendGrid unavailable'}
+        self.sent.append(message['receiver_email'])
+        return {'success': True}
+
+
+def _queue(local_sb, to='a@example.com'):
+    return EmailOutbox.enqueue_email('noreply@example.com', 'FinKen', to, 'Hi', '<p>Hi</p>', sb=local_sb)
+
+
+def _row(local_sb, outbox_id):
+    return local_sb.table('email_outbox').select('*').eq('id', outbox_id).single().execute().data
+
+
+def _make_due(local_sb, outbox_id):
+    past = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    local_sb.table('email_outbox').update({'next_attempt_at': past}).eq('id', outbox_id).execute()
+
+
+def test_enqueue_only_stores_the_message(local_sb):
+    result = _queue(local_sb)
+    assert result['success'] and result['queued'] == 1
+    row = _row(local_sb, result['id'])
+    assert row['status'] == 'pending' and row['attempts'] == 0
+
+
+def test_worker_delivers_due_messages(local_sb):
+    ids = [_queue(local_sb, f'{n}@example.com')['id'] for n in range(3)]
+    transport = StandInTransport()
+    assert EmailOutbox.deliver_pending(transport, sb=local_sb) == {'sent': 3, 'retried': 0, 'dead': 0}
+    assert sorted(transport.sent) == ['0@example.com', '1@example.com', '2@example.com']
+    assert all(_row(local_sb, i)['status'] == 'sent' for i in ids)
+    # Nothing is sent twice
+    assert EmailOutbox.deliver_pending(transport, sb=local_sb)['sent'] == 0
+
+
+def test_failures_back_off_then_succeed(local_sb):
+    outbox_id = _queue(local_sb)['id']
+    transport = StandInTransport(failures=1)
+    assert EmailOutbox.deliver_pending(transport, sb=local_sb)['retried'] == 1
+    row = _row(local_sb, outbox_id)
+    assert row['status'] == 'pending' and row['attempts'] == 1
+    assert row['last_error'] == 'SendGrid unavailable'
+
+    # Not due yet, so the next pass leaves it alone
+    assert EmailOutbox.deliver_pending(transport, sb=local_sb)['sent'] == 0
+    _make_due(local_sb, outbox_id)
+    assert EmailOutbox.deliver_pending(transport, sb=local_sb)['sent'] == 1
+    assert _row(local_sb, outbox_id)['attempts'] == 2
+
+
+def test_gives_up_after_max_attempts(local_sb, monkeypatch):
+    monkeypatch.setattr(EmailOutbox, 'EMAIL_MAX_ATTEMPTS', 2)
+    outbox_id = _queue(local_sb)['id']
+    transport = StandInTransport(failures=5)
+    EmailOutbox.deliver_pending(transport, sb=local_sb)
+    _make_due(local_sb, outbox_id)
+    assert EmailOutbox.deliver_pending(transport, sb=local_sb)['dead'] == 1
+    assert _row(local_sb, outbox_id)['status'] == 'dead'
+
+
+def test_transport_exceptions_count_as_failures(local_sb):
+    outbox_id = _queue(local_sb)['id']
+
+    def broken(message):
+        raise ConnectionError('reset by peer')
+
+    assert EmailOutbox.deliver_pending(broken, sb=local_sb)['retried'] == 1
+    assert _row(local_sb, outbox_id)['last_error'] == 'reset by peer'
+
+
+def test_stale_claims_are_released(local_sb):
+    outbox_id = _queue(local_sb)['id']
+    long_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    local_sb.table('email_outbox').update({'status': 'sending', 'locked_at': long_ago}).eq('id', outbox_id).execute()
+    assert EmailOutbox.deliver_pending(StandInTransport(), sb=local_sb)['sent'] == 1
+
+
+@pytest.mark.parametrize('attempts, low, high', [(1, 24, 36), (3, 96, 144), (20, 2880, 4320)])
+def test_retry_delay_is_exponential_and_capped(attempts, low, high):
+    assert low <= EmailOutbox.retry_delay(attempts) <= high
+
+
+def test_identical_messages_are_sent_together(local_sb):
+    for n in range(3):
+        _queue(local_sb, f'admin{n}@example.com')
+    EmailOutbox.enqueue_email('noreply@example.com', 'FinKen', 'other@example.com', 'Other', 'x', sb=local_sb)
+    transport = StandInTransport()
+    batches = []
+
+    def send_many(messages):
+        batches.append(sorted(m['receiver_email'] for m in messages))
+        return [{'success': True}] * len(messages)
+
+    transport.send_many = send_many
+    assert EmailOutbox.deliver_pending(transport, sb=local_sb)['sent'] == 4
+    assert batches == [['admin0@example.com', 'admin1@example.com', 'admin2@example.com']]
+    assert transport.sent == ['other@example.com']
@@ -0,0 +1,30 @@
+import EmailTemplates
+from EmailUser import PASSWORD_EXPIRY_FIELDS
+
+
+def test_render_escapes_user_input():
+    body = EmailTemplates.render_email('new_user_admin.html', full_name='<b>Eve</b>', email='eve@example.com')
+    assert '&lt;b&gt;Eve&lt;/b&gt;' in body
+    assert 'eve@example.com' in body
+
+
+def test_templates_are_compiled_once():
+    env = EmailTemplates._get_env()
+    assert env.get_template('signup_invitation.html') is env.get_template('signup_invitation.html')
+
+
+def test_shell_is_rendered_once_with_tags():
+    shell = EmailTemplates.email_shell('password_expiry.html', PASSWORD_EXPIRY_FIELDS)
+    assert shell is EmailTemplates.email_shell('password_expiry.html', PASSWORD_EXPIRY_FIELDS)
+    for field in PASSWORD_EXPIRY_FIELDS:
+        assert EmailTemplates.substitution_tag(field) in shell
+
+
+def test_shell_plus_substitutions_matches_full_render():
+    values = {'first_name': 'Ann & Co', 'username': 'ann1025', 'email': 'ann@example.com', 'urgency': 'tomorrow',
+              'urgency_color': '#fd7e14', 'urgency_message': 'Your password expires tomorrow!',
+              'expiry_date': 'October 18, 2025 at 09:00 AM UTC'}
+    body = EmailTemplates.email_shell('password_expiry.html', PASSWORD_EXPIRY_FIELDS)
+    for tag, value in EmailTemplates.substitutions(values).items():
+        body = body.replace(tag, value)
+    assert body == EmailTemplates.render_email('password_expiry.html', **values)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+import EventLogArchive
+from ImageStore import LocalImageStore
+
+NOW = datetime(2025, 6, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def _seed(sb, months=6, per_month=10):
+    user_id = sb.table('users').insert({
+        'Username': 'auditor', 'PasswordHash': 'x', 'FirstName': 'A', 'LastName': 'B', 'Email': 'a@example.com'
+    }).execute().data[0]['UserID']
+    rows = []
+    for month in range(months):
+        start = EventLogArchive._add_months(datetime(2025, 6, 1, tzinfo=timezone.utc), -month)
+        for n in range(per_month):
+            rows.append({'userid': user_id, 'timestamp': (start + timedelta(hours=n)).isoformat(),
+                         'actiontype': 'UPDATE' if n % 2 else 'INSERT', 'tablename': 'chart_of_accounts',
+                         'recordid': n})
+    sb.table('event_logs').insert(rows).execute()
+
+
+def _months_in_table(sb):
+    rows = sb.table('event_logs').select('timestamp').execute().data
+    return sorted({row['timestamp'][:7] for row in rows})
+
+
+def test_old_months_move_to_archives(local_sb, tmp_path):
+    _seed(local_sb, months=6)
+    store = LocalImageStore(str(tmp_path))
+    result = EventLogArchive.archive_event_logs(retention_months=2, sb=local_sb, store=store, now=NOW)
+
+    assert result['success'], result
+    assert [a['month'] for a in result['archived']] == ['2025-01', '2025-02', '2025-03']
+    assert all(a['rows'] == 10 for a in result['archived'])
+    assert _months_in_table(local_sb) == ['2025-04', '2025-05', '2025-06']
+    assert EventLogArchive.list_archived_months(store) == ['2025-03', '2025-02', '2025-01']
+
+    again = EventLogArchive.archive_event_logs(retention_months=2, sb=local_sb, store=store, now=NOW)
+    assert again['archived'] == []
+
+
+def test_archived_month_is_readable_with_filters(local_sb, tmp_path):
+    _seed(local_sb, months=4)
+    store = LocalImageStore(str(tmp_path))
+    EventLogArchive.archive_event_logs(retention_months=2, sb=local_sb, store=store, now=NOW)
+
+    page = EventLogArchive.get_archived_event_logs('2025-03', per_page=4, store=store)
+    assert page['pagination']['total_count'] == 10 and page['pagination']['has_next']
+    timestamps = [log['timestamp'] for log in page['logs']]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert page['logs'][0]['username'] == 'auditor'
+
+    updates = EventLogArchive.get_archived_event_logs('2025-03', action_filter='UPDATE', user_filter='AUDIT',
+                                                     store=store)
+    assert updates['pagination']['total_count'] == 5
+    assert {log['actiontype'] for log in updates['logs']} == {'UPDATE'}
+    assert not EventLogArchive.get_archived_event_logs('2024-01', store=store)['success']
+
+
+def test_late_rows_are_merged_into_the_archive(local_sb, tmp_path):
+    _seed(local_sb, months=4)
+    store = LocalImageStore(str(tmp_path))
+    EventLogArchive.archive_event_logs(retention_months=2, sb=local_sb, store=store, now=NOW)
+
+    user_id = local_sb.table('users').select('UserID').execute().data[0]['UserID']
+    local_sb.table('event_logs').insert({'userid': user_id, 'timestamp': '2025-03-20T00:00:00+00:00',
+                                         'actiontype': 'UPDATE', 'tablename': 'users', 'recordid': 99}).execute()
+    result = EventLogArchive.archive_event_logs(retention_months=2, sb=local_sb, store=store, now=NOW)
+
+    assert result['archived'] == [{'month': '2025-03', 'rows': 11}]
+    logs = EventLogArchive.get_archived_event_logs('2025-03', per_page=50, store=store)['logs']
+    assert len({log['logid'] for log in logs}) == 11 and logs[0]['recordid'] == 99
+
+
+def test_archived_month_filters_by_record(local_sb, tmp_path):
+    _seed(local_sb, months=4)
+    store = LocalImageStore(str(tmp_path))
+    EventLogArchive.archive_event_logs(retention_months=2, sb=local_sb, store=store, now=NOW)
+
+    page = EventLogArchive.get_archived_event_logs('2025-03', table_filter='chart_of_accounts', record_filter=3,
+                                                   store=store)
+    assert page['pagination']['total_count'] == 1
+    assert [log['recordid'] for log in page['logs']] == [3]
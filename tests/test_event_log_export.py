@@ -0,0 +1,73 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+import EventLogs
+from LocalBackend import seed_demo_data
+from QueryMetrics import max_queries
+
+
+def _all_logs(sb, **filters):
+    result = EventLogs.get_event_logs(sb=sb, per_page=10000, **filters)
+    return result['logs']
+
+
+def test_ndjson_export_matches_the_listing(local_sb, monkeypatch):
+    monkeypatch.setattr(EventLogs, 'EXPORT_BATCH_SIZE', 25)
+    seed_demo_data(local_sb, users=5, accounts=5, registrations=1, event_logs=120)
+
+    # 5 batches of 25 (the last short), plus one username lookup per new user
+    with max_queries(5 + 5) as log:
+        text = ''.join(EventLogs.export_event_logs('ndjson', sb=local_sb, batch_size=25))
+    exported = [json.loads(line) for line in text.splitlines()]
+    assert log.by_table()['event_logs'] == 5
+
+    expected = _all_logs(local_sb)
+    assert [row['logid'] for row in exported] == [row['logid'] for row in expected]
+    assert [row['username'] for row in exported] == [row['username'] for row in expected]
+
+
+def test_csv_export_applies_the_filters(local_sb):
+    seed_demo_data(local_sb, users=5, accounts=5, registrations=1, event_logs=80)
+    username = local_sb.table('users').select('Username').order('UserID').limit(1).execute().data[0]['Username']
+
+    text = ''.join(EventLogs.export_event_logs('csv', sb=local_sb, batch_size=7, action_filter='UPDATE',
+                                               user_filter=username))
+    rows = list(csv.DictReader(io.StringIO(text)))
+    expected = [row for row in _all_logs(local_sb, action_filter='UPDATE') if username in row['username']]
+    assert expected
+    assert [int(row['logid']) for row in rows] == [row['logid'] for row in expected]
+    assert all(row['actiontype'] == 'UPDATE' and username in row['username'] for row in rows)
+
+
+def test_gzip_export_round_trips(local_sb):
+    seed_demo_data(local_sb, users=3, accounts=3, registrations=1, event_logs=30)
+    plain = ''.join(EventLogs.export_event_logs('csv', sb=local_sb))
+    packed = b''.join(EventLogs.export_event_logs('csv', compress=True, sb=local_sb))
+    assert gzip.decompress(packed).decode('utf-8') == plain
+
+
+def test_unknown_user_exports_nothing(local_sb):
+    seed_demo_data(local_sb, users=3, accounts=3, registrations=1, event_logs=30)
+    text = ''.join(EventLogs.export_event_logs('ndjson', sb=local_sb, user_filter='no-such-user'))
+    assert text == ''
+
+
+def test_too_broad_user_filter_fails_before_streaming(local_sb, monkeypatch):
+    seed_demo_data(local_sb, users=4, accounts=1, registrations=1, event_logs=20)
+    username = local_sb.table('users').select('Username').limit(1).execute().data[0]['Username']
+    monkeypatch.setattr(EventLogs, 'EVENT_LOG_USER_MATCHES', 0)
+    # Raised by the call itself, not on the first chunk
+    with pytest.raises(ValueError):
+        EventLogs.export_event_logs('csv', sb=local_sb, user_filter=username)
+
+    from app import app
+    monkeypatch.setattr(EventLogs, '_sb', lambda: local_sb)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['user_role'] = 'administrator'
+    resp = client.get(f'/api/event-logs/export?format=ndjson&user={username}')
+    assert resp.status_code == 400
+    assert 'more specific' in resp.get_json()['message']
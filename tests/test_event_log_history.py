@@ -0,0 +1,50 @@
+import pytest
+import EventLogs
+from LocalBackend import seed_demo_data
+
+
+def test_history_lists_one_record_newest_first(local_sb):
+    seed_demo_data(local_sb, users=4, accounts=5, registrations=1, event_logs=150)
+    target = local_sb.table('event_logs').select('tablename, recordid').limit(1).execute().data[0]
+    expected = local_sb.table('event_logs').select('logid').eq('tablename', target['tablename']) \
+        .eq('recordid', target['recordid']).execute().data
+
+    seen, cursor = [], ''
+    while True:
+        page = EventLogs.get_record_history(target['tablename'], target['recordid'], per_page=4,
+                                            cursor=cursor, sb=local_sb)
+        seen += page['logs']
+        if not page['pagination']['has_next']:
+            break
+        cursor = page['pagination']['next_cursor']
+
+    assert sorted(log['logid'] for log in seen) == sorted(row['logid'] for row in expected)
+    assert {(log['tablename'], log['recordid']) for log in seen} == {(target['tablename'], target['recordid'])}
+    keys = [(log['timestamp'], log['logid']) for log in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_history_query_uses_the_composite_index(local_sb):
+    plan = local_sb.query(
+        'EXPLAIN QUERY PLAN SELECT logid FROM event_logs WHERE tablename = ? AND recordid = ? '
+        'ORDER BY timestamp DESC, logid DESC LIMIT 21', ('chart_of_accounts', 1))
+    assert any('event_logs_record_idx' in row['detail'] for row in plan)
+
+
+def test_user_filter_matches_on_userid(local_sb):
+    seed_demo_data(local_sb, users=4, accounts=5, registrations=1, event_logs=60)
+    user = local_sb.table('users').select('UserID, Username').order('UserID', desc=True).limit(1).execute().data[0]
+    result = EventLogs.get_event_logs(sb=local_sb, per_page=100, user_filter=user['Username'])
+    own = local_sb.table('event_logs').select('logid').eq('userid', user['UserID']).execute().data
+
+    assert sorted(log['logid'] for log in result['logs']) == sorted(row['logid'] for row in own)
+    assert EventLogs.get_event_logs(sb=local_sb, user_filter='no-such-user')['logs'] == []
+
+
+def test_too_broad_user_filter_is_refused(local_sb, monkeypatch):
+    seed_demo_data(local_sb, users=4, accounts=1, registrations=1, event_logs=0)
+    username = local_sb.table('users').select('Username').limit(1).execute().data[0]['Username']
+    monkeypatch.setattr(EventLogs, 'EVENT_LOG_USER_MATCHES', 0)
+    assert EventLogs.get_event_logs(sb=local_sb)['success']
+    with pytest.raises(ValueError):
+        EventLogs.get_event_logs(sb=local_sb, user_filter=username)
@@ -0,0 +1,40 @@
+import pytest
+import EventLogs
+from LocalBackend import seed_demo_data
+from QueryMetrics import max_queries
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    EventLogs.invalidate_event_log_tables()
+    yield
+    EventLogs.invalidate_event_log_tables()
+
+
+def test_tables_come_from_one_rpc_not_a_scan(local_sb):
+    seed_demo_data(local_sb, users=3, accounts=5, registrations=1, event_logs=200)
+    expected = sorted({row['tablename'] for row in local_sb.table('event_logs').select('tablename').execute().data})
+
+    with max_queries(1) as log:
+        tables = EventLogs.get_event_log_tables(sb=local_sb)
+    assert tables == expected
+    assert 'event_logs' not in log.by_table()
+
+
+def test_tables_are_cached_until_the_ttl(local_sb, monkeypatch):
+    seed_demo_data(local_sb, users=3, accounts=5, registrations=1, event_logs=20)
+    EventLogs.get_event_log_tables(sb=local_sb)
+    with max_queries(0):
+        EventLogs.get_event_log_tables(sb=local_sb)
+
+    monkeypatch.setattr(EventLogs, 'EVENT_LOG_TABLES_TTL', 0)
+    EventLogs.get_event_log_tables(sb=local_sb, refresh=True)
+    with max_queries(1):
+        EventLogs.get_event_log_tables(sb=local_sb)
+
+
+def test_event_log_pages_no_longer_carry_the_table_list(local_sb):
+    seed_demo_data(local_sb, users=3, accounts=5, registrations=1, event_logs=30)
+    with max_queries(1, table='event_logs'):
+        result = EventLogs.get_event_logs(sb=local_sb, cursor='', count='none')
+    assert result['success'] and 'available_tables' not in result
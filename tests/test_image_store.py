@@ -0,0 +1,102 @@
+import json
+import pickle
+import httpx
+import pytest
+from ImageStore import LocalImageStore, SupabaseImageStore, CachedImageStore, ImageNotFound, CHUNK_SIZE
+
+
+class FakeStorage:
+    """In-memory stand-in for the Supabase Storage REST API."""
+
+    def __init__(self):
+        self.objects = {}
+        self.downloads = 0
+
+    def __call__(self, request):
+        path = request.url.path
+        if request.method == 'POST' and path.startswith('/storage/v1/object/list/'):
+            body = json.loads(request.read())
+            return httpx.Response(200, json=[{'name': n} for n in self.objects if n.startswith(body['search'])])
+        if request.method == 'DELETE':
+            for name in json.loads(request.read())['prefixes']:
+                self.objects.pop(name, None)
+            return httpx.Response(200, json=[])
+        name = path.rsplit('/', 1)[-1]
+        if request.method == 'POST':
+            self.objects[name] = request.read()
+            return httpx.Response(200, json={'Key': name})
+        if name not in self.objects:
+            return httpx.Response(400, json={'error': 'not_found'})
+        if request.method == 'GET':
+            self.downloads += 1
+        return httpx.Response(200, content=self.objects[name] if request.method == 'GET' else b'')
+
+
+@pytest.fixture
+def storage():
+    return FakeStorage()
+
+
+@pytest.fixture
+def remote(storage):
+    return SupabaseImageStore('avatars', url='https://example.supabase.co', key='k',
+                              transport=httpx.MockTransport(storage))
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    store.put('a.webp', b'x' * (CHUNK_SIZE * 2 + 5))
+    assert store.exists('a.webp')
+    assert len(list(store.iter_chunks('a.webp'))) == 3
+    assert store.list('a') == ['a.webp']
+    store.delete(['a.webp', 'missing.webp'])
+    assert not store.exists('a.webp')
+    with pytest.raises(ImageNotFound):
+        store.get('a.webp')
+
+
+def test_names_cannot_escape_the_store(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.put('../evil.webp', b'x')
+
+
+def test_supabase_store_round_trip(remote, storage):
+    remote.put('u_1.webp', b'image-bytes')
+    assert storage.objects == {'u_1.webp': b'image-bytes'}
+    assert remote.get('u_1.webp') == b'image-bytes'
+    assert remote.exists('u_1.webp') and not remote.exists('u_2.webp')
+    assert remote.list('u_') == ['u_1.webp']
+    remote.delete(['u_1.webp'])
+    with pytest.raises(ImageNotFound):
+        remote.get('u_1.webp')
+
+
+def test_supabase_store_pickles_without_its_connection_pool(remote):
+    remote.client
+    clone = pickle.loads(pickle.dumps(remote))
+    assert clone._client is None and clone.bucket == 'avatars'
+
+
+def test_cache_downloads_once_per_node(remote, storage, tmp_path):
+    storage.objects['u_1.webp'] = b'remote'
+    node = CachedImageStore(remote, str(tmp_path / 'cache'))
+    first = node.local_path('u_1.webp')
+    assert node.local_path('u_1.webp') == first
+    assert open(first, 'rb').read() == b'remote'
+    assert storage.downloads == 1
+    assert node.local_path('u_2.webp') is None
+
+
+def test_upload_on_one_node_is_served_by_another(remote, tmp_path):
+    CachedImageStore(remote, str(tmp_path / 'a')).put('u_1.webp', b'shared')
+    other = CachedImageStore(remote, str(tmp_path / 'b'))
+    assert other.get('u_1.webp') == b'shared'
+
+
+def test_cache_is_trimmed_to_its_budget(remote, tmp_path):
+    node = CachedImageStore(remote, str(tmp_path / 'cache'), max_bytes=10)
+    node.put('old.webp', b'123456')
+    node.put('new.webp', b'123456')
+    assert node.cache.list() == ['new.webp']
+    assert node.get('old.webp') == b'123456'
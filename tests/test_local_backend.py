@@ -0,0 +1,99 @@
+import pytest
+from postgrest.exceptions import APIError
+import SupabaseClient
+from LocalBackend import LocalClient, seed_demo_data
+from AdminManagement import get_all_registration_requests
+from UserManagement import get_users_paginated
+
+
+def _add_user(sb, username, **extra):
+    row = {'Username': username, 'PasswordHash': 'x', 'FirstName': 'Test', 'LastName': 'User',
+           'Email': f'{username}@example.com'}
+    row.update(extra)
+    return sb.table('users').insert(row).execute().data[0]
+
+
+def test_insert_fills_defaults_and_returns_rows(local_sb):
+    user = _add_user(local_sb, 'tuser')
+    assert user['UserID'] == 1
+    assert user['RoleID'] == 3
+    assert user['IsActive'] is True
+    assert user['IsSuspended'] is False
+    assert user['DateCreated']
+
+
+def test_filters_order_and_range(local_sb):
+    for i in range(5):
+        _add_user(local_sb, f'user{i}', IsActive=i % 2 == 0)
+    resp = (local_sb.table('users').select('UserID, Username', count='exact')
+            .eq('IsActive', True).order('UserID', desc=True).range(0, 1).execute())
+    assert resp.count == 3
+    assert [r['Username'] for r in resp.data] == ['user4', 'user2']
+
+    resp = local_sb.table('users').select('Username').or_('Username.ilike.*3*,UserID.eq.1').execute()
+    assert sorted(r['Username'] for r in resp.data) == ['user0', 'user3']
+
+    resp = local_sb.table('users').select('Username').in_('UserID', [2, 4]).execute()
+    assert len(resp.data) == 2
+
+
+def test_embedded_resources(local_sb):
+    local_sb.table('roles').insert([{'RoleName': 'administrator'}, {'RoleName': 'manager'},
+                                    {'RoleName': 'accountant'}]).execute()
+    admin = _add_user(local_sb, 'admin', RoleID=1)
+    local_sb.table('registration_requests').insert({
+        'FirstName': 'A', 'LastName': 'B', 'Email': 'a@example.com', 'Status': 'Approved',
+        'ReviewedByUserID': admin['UserID']
+    }).execute()
+
+    user = local_sb.table('users').select('Username, roles(RoleName)').single().execute().data
+    assert user == {'Username': 'admin', 'roles': {'RoleName': 'administrator'}}
+
+    req = (local_sb.table('registration_requests')
+           .select('RequestID, reviewer:ReviewedByUserID(Username)').single().execute().data)
+    assert req['reviewer'] == {'Username': 'admin'}
+
+
+def test_single_and_unknown_column_errors(local_sb):
+    with pytest.raises(APIError) as exc:
+        local_sb.table('users').select('*').eq('UserID', 99).single().execute()
+    assert exc.value.code == 'PGRST116'
+    with pytest.raises(APIError) as exc:
+        local_sb.table('users').insert({'Nope': 1}).execute()
+    assert exc.value.code == 'PGRST204'
+
+
+def test_update_and_delete_return_rows(local_sb):
+    _add_user(local_sb, 'a')
+    _add_user(local_sb, 'b')
+    updated = local_sb.table('users').update({'IsSuspended': True}).eq('Username', 'a').execute().data
+    assert [u['IsSuspended'] for u in updated] == [True]
+    deleted = local_sb.table('users').delete().eq('Username', 'b').execute().data
+    assert [u['Username'] for u in deleted] == ['b']
+    assert len(local_sb.table('users').select('UserID').execute().data) == 1
+
+
+def test_app_functions_run_against_seeded_data(local_sb):
+    counts = seed_demo_data(local_sb, users=30, accounts=10, registrations=12, event_logs=20)
+    assert counts['users'] == 30
+
+    result = get_users_paginated(page=2, per_page=10, sb=local_sb)
+    assert result['success']
+    assert len(result['users']) == 10
+    assert result['pagination']['total_users'] == 30
+
+    result = get_all_registration_requests(sb=local_sb)
+    assert result['success']
+    assert len(result['requests']) == 12
+
+
+def test_sb_uses_local_backend_when_configured(monkeypatch, tmp_path):
+    monkeypatch.setenv('FINKEN_DB_BACKEND', 'local')
+    monkeypatch.setenv('FINKEN_LOCAL_DB', str(tmp_path / 'finken.db'))
+    SupabaseClient.reset_client()
+    try:
+        sb = SupabaseClient._sb()
+        assert isinstance(sb, LocalClient)
+        assert SupabaseClient._sb() is sb
+    finally:
+        SupabaseClient.reset_client()
@@ -0,0 +1,100 @@
+import pytest
+from AdminManagement import get_all_registration_requests
+from ChartOfAccounts import list_accounts
+from LocalBackend import seed_demo_data
+from QueryMetrics import max_queries
+from UserManagement import get_users_paginated
+
+
+def test_users_page_is_one_round_trip(local_sb):
+    seed_demo_data(local_sb, users=45, accounts=1, registrations=1, event_logs=0)
+    with max_queries(1):
+        result = get_users_paginated(page=2, per_page=20, sb=local_sb)
+    p = result['pagination']
+    assert len(result['users']) == 20
+    assert p['total_users'] == 45
+    assert p['total_pages'] == 3
+    assert p['has_prev'] and p['has_next'] and p['next_page'] == 3
+
+
+def test_last_page_has_no_next(local_sb):
+    seed_demo_data(local_sb, users=45, accounts=1, registrations=1, event_logs=0)
+    result = get_users_paginated(page=3, per_page=20, sb=local_sb)
+    assert len(result['users']) == 5
+    assert result['pagination']['has_next'] is False
+    assert result['pagination']['next_page'] is None
+
+
+def test_count_none_skips_total(local_sb):
+    seed_demo_data(local_sb, users=45, accounts=1, registrations=1, event_logs=0)
+    result = get_users_paginated(page=1, per_page=20, sb=local_sb, count='none')
+    p = result['pagination']
+    assert p['total_users'] is None
+    assert p['count_mode'] == 'none'
+    assert p['has_next'] is True
+    assert p['total_pages'] == 2
+
+
+def test_accounts_include_creator_in_one_round_trip(local_sb):
+    seed_demo_data(local_sb, users=3, accounts=30, registrations=1, event_logs=0)
+    with max_queries(1):
+        result = list_accounts(page=1, per_page=10, filters={'is_active': True}, sb=local_sb)
+    assert result['success']
+    assert all(a['createdby_username'] == 'admin' for a in result['accounts'])
+    assert all(a['isactive'] for a in result['accounts'])
+    active = local_sb.table('chart_of_accounts').select('accountid', count='exact').eq('isactive', True).execute()
+    assert result['pagination']['total_accounts'] == active.count
+
+
+def test_registrations_search_and_status(local_sb):
+    seed_demo_data(local_sb, users=3, accounts=1, registrations=30, event_logs=0)
+    with max_queries(1):
+        result = get_all_registration_requests(status_filter='Pending', search_term='applicant', sb=local_sb)
+    assert result['success']
+    assert all(r['Status'] == 'Pending' for r in result['requests'])
+    assert result['pagination']['total_requests'] == len(result['requests'])
+
+
+def test_cursor_walks_every_user_once(local_sb):
+    seed_demo_data(local_sb, users=45, accounts=1, registrations=1, event_logs=0)
+    # Give several users the same timestamp so the id tie-breaker matters
+    local_sb.table('users').update({'DateCreated': '2025-01-01T00:00:00+00:00'}).lte('UserID', 12).execute()
+
+    seen, cursor = [], ''
+    while True:
+        with max_queries(1):
+            result = get_users_paginated(per_page=10, sb=local_sb, cursor=cursor, count='none')
+        seen.extend(u['UserID'] for u in result['users'])
+        cursor = result['pagination']['next_cursor']
+        if not cursor:
+            break
+    assert sorted(seen) == list(range(1, 46))
+
+    rows = local_sb.table('users').select('UserID, DateCreated').execute().data
+    expected = sorted(rows, key=lambda u: (u['DateCreated'], u['UserID']), reverse=True)
+    assert [u['UserID'] for u in expected] == seen
+
+
+def test_cursor_accounts_and_event_logs(local_sb):
+    from EventLogs import get_event_logs
+    seed_demo_data(local_sb, users=3, accounts=25, registrations=1, event_logs=30)
+
+    first = list_accounts(per_page=10, sb=local_sb, cursor='')
+    second = list_accounts(per_page=10, sb=local_sb, cursor=first['pagination']['next_cursor'])
+    numbers = [a['accountnumber'] for a in first['accounts'] + second['accounts']]
+    assert numbers == sorted(numbers)
+    assert len(set(numbers)) == 20
+    assert first['pagination']['total_accounts'] == 25
+    assert second['pagination']['total_accounts'] is None
+
+    logs = get_event_logs(per_page=20, cursor='', sb=local_sb)
+    more = get_event_logs(per_page=20, cursor=logs['pagination']['next_cursor'], sb=local_sb)
+    assert len(logs['logs']) == 20 and len(more['logs']) == 10
+    assert more['pagination']['has_next'] is False
+    stamps = [l['timestamp'] for l in logs['logs'] + more['logs']]
+    assert stamps == sorted(stamps, reverse=True)
+
+
+def test_bad_cursor_is_rejected(local_sb):
+    with pytest.raises(ValueError):
+        get_users_paginated(per_page=10, sb=local_sb, cursor='not-a-cursor')
@@ -0,0 +1,102 @@
+import json
+from datetime import datetime, timedelta, timezone
+import httpx
+import pytest
+import EmailUser
+import JobCheckpoints
+
+
+class FakeSendGrid:
+    """Records the recipients of each mail/send request."""
+
+    def __init__(self):
+        self.recipients = []
+        self.failing = set()
+
+    def __call__(self, request):
+        payload = json.loads(request.read())
+        emails = [p['to'][0]['email'] for p in payload['personalizations']]
+        if self.failing & set(emails):
+            return httpx.Response(503, text='Service Unavailable')
+        self.recipients.extend(emails)
+        return httpx.Response(202)
+
+
+@pytest.fixture(autouse=True)
+def fake_sendgrid(monkeypatch):
+    sendgrid = FakeSendGrid()
+    monkeypatch.setenv('SENDGRID_API_KEY', 'test-key')
+    monkeypatch.setattr(EmailUser, '_http', httpx.Client(transport=httpx.MockTransport(sendgrid)))
+    return sendgrid
+
+
+def _add_users(sb, count, expires_in=timedelta(days=2, hours=1)):
+    expiry = (datetime.now(timezone.utc) + expires_in).isoformat()
+    for n in range(count):
+        sb.table('users').insert({
+            'Username': f'user{n}', 'PasswordHash': 'x', 'FirstName': f'First{n}', 'LastName': 'L',
+            'Email': f'user{n}@example.com', 'PasswordExpiryDate': expiry
+        }).execute()
+
+
+def test_rerun_does_not_email_anyone_twice(local_sb, fake_sendgrid):
+    _add_users(local_sb, 5)
+    first = EmailUser.send_password_expiry_notifications(sb=local_sb, page_size=2)
+    assert first['success'] and first['complete'] and first['users_notified'] == 5
+    assert len(fake_sendgrid.recipients) == 5
+
+    second = EmailUser.send_password_expiry_notifications(sb=local_sb, page_size=2)
+    assert second['success'] and second['users_notified'] == 0
+    assert second['already_notified'] == 5
+    assert len(fake_sendgrid.recipients) == 5
+
+
+def test_stopped_sweep_resumes_after_its_checkpoint(local_sb, fake_sendgrid):
+    _add_users(local_sb, 5)
+    first = EmailUser.send_password_expiry_notifications(sb=local_sb, page_size=2, time_budget_seconds=0)
+    assert first['complete'] is False and first['users_notified'] == 2
+
+    run_key = datetime.now(timezone.utc).date().isoformat()
+    assert JobCheckpoints.load_checkpoint(EmailUser.PASSWORD_EXPIRY_JOB, run_key, sb=local_sb) is not None
+
+    second = EmailUser.send_password_expiry_notifications(sb=local_sb, page_size=2)
+    assert second['complete'] and second['users_notified'] == 3
+    # Resumed past the checkpoint: the first page was not even re-read
+    assert second['already_notified'] == 0
+    assert sorted(fake_sendgrid.recipients) == sorted(f'user{n}@example.com' for n in range(5))
+    checkpoint = local_sb.table('job_checkpoints').select('run_key, status') \
+        .eq('job_name', EmailUser.PASSWORD_EXPIRY_JOB).single().execute().data
+    assert checkpoint == {'run_key': run_key, 'status': 'complete'}
+
+
+def test_failed_sends_are_retried_by_the_next_run(local_sb, fake_sendgrid):
+    _add_users(local_sb, 3)
+    fake_sendgrid.failing = {'user1@example.com'}
+    first = EmailUser.send_password_expiry_notifications(sb=local_sb, page_size=1)
+    assert first['users_notified'] == 2 and len(first['errors']) == 1
+
+    fake_sendgrid.failing = set()
+    second = EmailUser.send_password_expiry_notifications(sb=local_sb, page_size=1)
+    assert second['users_notified'] == 1
+    assert second['notifications_sent'][0]['email'] == 'user1@example.com'
+
+
+def test_new_expiry_date_gets_a_new_notice(local_sb, fake_sendgrid):
+    _add_users(local_sb, 1)
+    EmailUser.send_password_expiry_notifications(sb=local_sb)
+    later = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    local_sb.table('users').update({'PasswordExpiryDate': later}).eq('Username', 'user0').execute()
+
+    result = EmailUser.send_password_expiry_notifications(sb=local_sb)
+    assert result['users_notified'] == 1
+    assert fake_sendgrid.recipients == ['user0@example.com', 'user0@example.com']
+
+
+def test_each_page_is_a_bounded_number_of_queries(local_sb, fake_sendgrid):
+    import QueryMetrics
+    _add_users(local_sb, 6)
+    # Per page: users page, ledger lookup, ledger insert, checkpoint
+    with QueryMetrics.max_queries(4 * 3 + 4) as log:
+        result = EmailUser.send_password_expiry_notifications(sb=local_sb, page_size=2)
+    assert result['users_notified'] == 6
+    assert log.by_table()['users'] == 4
@@ -0,0 +1,44 @@
+import pytest
+import ImageStore
+import ProfilePictureHandler as pph
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    from app import app
+    monkeypatch.setattr(ImageStore, '_store', ImageStore.LocalImageStore(str(tmp_path)))
+    (tmp_path / 'user_3_profile_64_0123456789abcdef.webp').write_bytes(b'hashed-bytes')
+    (tmp_path / 'user_4_profile.webp').write_bytes(b'legacy-bytes')
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_hashed_image_is_immutable_and_conditional(client):
+    resp = client.get('/profile_images/user_3_profile_64_0123456789abcdef.webp')
+    assert resp.status_code == 200
+    assert resp.data == b'hashed-bytes'
+    assert 'immutable' in resp.headers['Cache-Control']
+    assert 'max-age=31536000' in resp.headers['Cache-Control']
+
+    again = client.get('/profile_images/user_3_profile_64_0123456789abcdef.webp',
+                       headers={'If-None-Match': resp.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_legacy_name_is_revalidated(client):
+    resp = client.get('/profile_images/user_4_profile.webp')
+    assert resp.status_code == 200
+    assert 'no-cache' in resp.headers['Cache-Control']
+
+
+def test_default_and_missing_served_from_memory(client):
+    resp = client.get('/profile_images/user_9_profile_64_ffffffffffffffff.webp')
+    assert resp.status_code == 200
+    assert resp.data == pph.default_profile_picture_bytes()
+    assert resp.mimetype == 'image/webp'
+
+    default = client.get('/profile_images/' + pph.DEFAULT_PROFILE_PICTURE)
+    assert default.data == resp.data
+    cached = client.get('/profile_images/' + pph.DEFAULT_PROFILE_PICTURE,
+                        headers={'If-None-Match': default.headers['ETag']})
+    assert cached.status_code == 304
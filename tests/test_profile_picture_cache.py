@@ -0,0 +1,69 @@
+import pytest
+import ProfilePictureHandler as pph
+
+
+class CountingHandler:
+    calls = 0
+
+    def get_profile_picture_url(self, user_id):
+        CountingHandler.calls += 1
+        return {'success': True, 'profile_picture': f'user_{user_id}_profile.webp', 'is_default': False}
+
+
+@pytest.fixture(autouse=True)
+def counting_handler(monkeypatch):
+    CountingHandler.calls = 0
+    monkeypatch.setattr(pph, '_handler', CountingHandler())
+    pph.invalidate_profile_picture_cache()
+    yield CountingHandler
+    pph.invalidate_profile_picture_cache()
+
+
+def test_repeat_lookups_hit_cache(counting_handler):
+    first = pph.get_user_profile_picture(7)
+    second = pph.get_user_profile_picture(7)
+    assert first == second
+    assert counting_handler.calls == 1
+
+
+def test_primed_at_sign_in_needs_no_lookup(counting_handler):
+    pph.prime_profile_picture_cache(8, None)
+    result = pph.get_user_profile_picture(8)
+    assert result['profile_picture'] == pph.DEFAULT_PROFILE_PICTURE
+    assert counting_handler.calls == 0
+
+
+def test_invalidate_forces_fresh_lookup(counting_handler):
+    pph.get_user_profile_picture(9)
+    pph.invalidate_profile_picture_cache(9)
+    pph.get_user_profile_picture(9)
+    assert counting_handler.calls == 2
+
+
+def test_expired_entries_are_refetched(counting_handler, monkeypatch):
+    monkeypatch.setattr(pph, 'PROFILE_CACHE_TTL', -1)
+    pph.get_user_profile_picture(10)
+    pph.get_user_profile_picture(10)
+    assert counting_handler.calls == 2
+
+
+def test_cache_is_bounded(counting_handler, monkeypatch):
+    monkeypatch.setattr(pph, 'PROFILE_CACHE_SIZE', 2)
+    for user_id in (1, 2, 3):
+        pph.get_user_profile_picture(user_id)
+    pph.get_user_profile_picture(1)
+    assert counting_handler.calls == 4
+
+
+def test_handler_is_a_lazy_singleton(monkeypatch):
+    monkeypatch.setattr(pph, '_handler', None)
+    first = pph.get_profile_picture_handler()
+    assert first is pph.get_profile_picture_handler()
+    assert first._supabase is None
+
+
+def test_default_avatar_bootstrap(monkeypatch, tmp_path):
+    monkeypatch.setattr(pph, 'PROFILE_IMAGES_DIR', str(tmp_path / 'images'))
+    path = pph.ensure_default_profile_picture()
+    assert path.endswith(pph.DEFAULT_PROFILE_PICTURE)
+    assert (tmp_path / 'images' / pph.DEFAULT_PROFILE_PICTURE).exists()
@@ -0,0 +1,105 @@
+import os
+import time
+from PIL import Image
+import ProfilePictureHandler as pph
+from ImageStore import LocalImageStore
+
+
+def _handler(local_sb, tmp_path):
+    local_sb.table('users').insert({'Username': 'pic', 'PasswordHash': 'x', 'FirstName': 'P',
+                                    'LastName': 'U', 'Email': 'pic@example.com'}).execute()
+    handler = pph.ProfilePictureHandler(sb=local_sb, store=LocalImageStore(str(tmp_path)))
+    return handler
+
+
+def test_upload_writes_each_variant(local_sb, tmp_path):
+    handler = _handler(local_sb, tmp_path)
+    result = handler.save_profile_picture(1, Image.new('RGB', (900, 600), 'navy'))
+    assert result['success']
+    assert set(result['variants']) == {str(s) for s in pph.PROFILE_VARIANT_SIZES}
+    assert result['filename'] == result['variants']['400']
+    assert all(pph.is_content_hashed(name) for name in result['variants'].values())
+    for size, name in result['variants'].items():
+        with Image.open(tmp_path / name) as img:
+            assert img.size == (int(size), int(size))
+
+    row = local_sb.table('users').select('ProfilePictureVariants').eq('UserID', 1).single().execute().data
+    assert row['ProfilePictureVariants'] == result['variants']
+
+    srcset = pph.profile_picture_srcset(result)
+    assert [w for _, w in srcset] == sorted(pph.PROFILE_VARIANT_SIZES)
+
+
+def test_delete_removes_every_variant(local_sb, tmp_path):
+    handler = _handler(local_sb, tmp_path)
+    handler.save_profile_picture(1, Image.new('RGB', (500, 500), 'red'))
+    assert handler.delete_profile_picture(1)['success']
+    assert os.listdir(tmp_path) == []
+    row = local_sb.table('users').select('ProfilePictureURL, ProfilePictureVariants').eq('UserID', 1).single().execute().data
+    assert row == {'ProfilePictureURL': None, 'ProfilePictureVariants': None}
+
+
+def test_srcset_empty_for_default_picture():
+    assert pph.profile_picture_srcset({'profile_picture': pph.DEFAULT_PROFILE_PICTURE, 'is_default': True}) == []
+
+
+def _upload(image, fmt='JPEG'):
+    import io
+    buf = io.BytesIO()
+    image.save(buf, fmt)
+    buf.seek(0)
+    return buf
+
+
+def test_async_upload_keeps_default_until_processed(local_sb, tmp_path):
+    handler = _handler(local_sb, tmp_path)
+    result = handler.save_profile_picture_async(1, _upload(Image.new('RGB', (3000, 2000), 'green')))
+    assert result['success'] and result['pending']
+    pph.wait_for_image_jobs()
+
+    row = local_sb.table('users').select('ProfilePictureURL, ProfilePictureVariants').eq('UserID', 1).single().execute().data
+    assert row['ProfilePictureURL'] == row['ProfilePictureVariants']['400']
+    assert set(row['ProfilePictureVariants']) == {str(s) for s in pph.PROFILE_VARIANT_SIZES}
+    assert (tmp_path / row['ProfilePictureVariants']['32']).exists()
+
+
+def test_oversized_upload_is_refused_before_decoding(local_sb, tmp_path, monkeypatch):
+    monkeypatch.setattr(pph, 'MAX_PROFILE_IMAGE_PIXELS', 1000 * 1000)
+    handler = _handler(local_sb, tmp_path)
+    result = handler.save_profile_picture_async(1, _upload(Image.new('RGB', (1200, 1000))))
+    assert result['success'] is False
+    assert 'too large' in result['message']
+    assert os.listdir(tmp_path) == []
+
+
+def test_jpeg_decoded_with_draft(monkeypatch):
+    image = pph._open_image(_upload(Image.new('RGB', (4000, 3000), 'blue')), (400, 400))
+    # draft() lets libjpeg scale down during decode (largest step still >= 400px)
+    assert image.size == (1000, 750)
+
+
+def test_reupload_gets_new_names_and_drops_old_files_later(local_sb, tmp_path, monkeypatch):
+    monkeypatch.setattr(pph, 'PROFILE_STALE_GRACE_SECONDS', 0.2)
+    handler = _handler(local_sb, tmp_path)
+    (tmp_path / 'user_1_profile.webp').write_bytes(b'legacy')
+    first = handler.save_profile_picture(1, Image.new('RGB', (500, 500), 'red'))
+    second = handler.save_profile_picture(1, Image.new('RGB', (500, 500), 'blue'))
+    assert set(first['variants'].values()).isdisjoint(second['variants'].values())
+    # Other workers may still serve the old names from their caches
+    assert set(first['variants'].values()) <= set(os.listdir(tmp_path))
+
+    deadline = time.monotonic() + 5
+    while sorted(os.listdir(tmp_path)) != sorted(second['variants'].values()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert sorted(os.listdir(tmp_path)) == sorted(second['variants'].values())
+
+
+def test_sweep_keeps_names_that_are_in_use_again(local_sb, tmp_path, monkeypatch):
+    monkeypatch.setattr(pph, 'PROFILE_STALE_GRACE_SECONDS', 60)
+    handler = _handler(local_sb, tmp_path)
+    red = handler.save_profile_picture(1, Image.new('RGB', (500, 500), 'red'))
+    blue = handler.save_profile_picture(1, Image.new('RGB', (500, 500), 'blue'))
+    # The red picture again, before the sweep of its files runs
+    handler.save_profile_picture(1, Image.new('RGB', (500, 500), 'red'))
+    handler._sweep_stale_files(1, list(red['variants'].values()) + list(blue['variants'].values()))
+    assert sorted(os.listdir(tmp_path)) == sorted(red['variants'].values())
@@ -0,0 +1,60 @@
+import httpx
+import pytest
+import QueryMetrics
+import SupabaseClient
+from LocalBackend import seed_demo_data
+from QueryMetrics import QueryBudgetExceeded, max_queries
+
+
+@pytest.fixture
+def app_client(monkeypatch):
+    monkeypatch.setenv('FINKEN_DB_BACKEND', 'local')
+    monkeypatch.setenv('FINKEN_LOCAL_DB', ':memory:')
+    SupabaseClient.reset_client()
+    seed_demo_data(SupabaseClient._sb(), users=25, accounts=5, registrations=5, event_logs=10)
+    from app import app
+    app.config['TESTING'] = True
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'admin'
+        sess['user_role'] = 'administrator'
+    yield client
+    SupabaseClient.reset_client()
+
+
+def test_response_reports_query_count(app_client):
+    resp = app_client.get('/api/users')
+    assert resp.status_code == 200
+    assert int(resp.headers[QueryMetrics.QUERY_COUNT_HEADER]) >= 1
+    assert float(resp.headers[QueryMetrics.QUERY_TIME_HEADER]) >= 0
+
+
+def test_budget_helper_counts_endpoint_queries(app_client):
+    with max_queries(2) as log:
+        app_client.get('/api/users')
+    assert set(log.by_table()) == {'users'}
+
+    with pytest.raises(QueryBudgetExceeded):
+        with max_queries(0):
+            app_client.get('/api/users')
+
+
+def test_repeated_queries_flagged_as_n_plus_one(local_sb):
+    with max_queries(10) as log:
+        for user_id in range(6):
+            local_sb.table('users').select('UserID').eq('UserID', user_id).execute()
+    assert log.repeated(threshold=5) == {('GET', 'users'): 6}
+
+
+def test_httpx_hooks_record_postgrest_calls():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=[]))
+    session = httpx.Client(transport=transport)
+    QueryMetrics.install_httpx_hooks(session)
+    with max_queries(5) as log:
+        session.get('https://example.supabase.co/rest/v1/chart_of_accounts?select=*')
+        session.post('https://example.supabase.co/rest/v1/rpc/unsuspend_expired_users')
+    assert [(q['method'], q['table'], q['status']) for q in log.queries] == [
+        ('GET', 'chart_of_accounts', 200),
+        ('POST', 'rpc:unsuspend_expired_users', 200),
+    ]
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from Scheduler import CronSchedule, Job, Scheduler, cleanup_old_records
+
+T0 = datetime(2025, 3, 14, 8, 59, 30, tzinfo=timezone.utc)  # a Friday
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('0 9 * * *', datetime(2025, 3, 14, 9, 0, tzinfo=timezone.utc)),
+    ('*/15 * * * *', datetime(2025, 3, 14, 9, 0, tzinfo=timezone.utc)),
+    ('30 3 * * *', datetime(2025, 3, 15, 3, 30, tzinfo=timezone.utc)),
+    ('0 0 1 * *', datetime(2025, 4, 1, 0, 0, tzinfo=timezone.utc)),
+    ('0 12 * * 1-5', datetime(2025, 3, 14, 12, 0, tzinfo=timezone.utc)),
+    ('0 12 * * 0,7', datetime(2025, 3, 16, 12, 0, tzinfo=timezone.utc)),
+])
+def test_next_after(expression, expected):
+    assert CronSchedule(expression).next_after(T0) == expected
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '5-1 * * * *', '*/0 * * * *'])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+class Counter:
+    def __init__(self, result=None):
+        self.calls = 0
+        self.result = result or {'success': True}
+
+    def __call__(self, sb):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def _instances(local_sb, job, n=2):
+    schedulers = [Scheduler([job], sb=local_sb, instance_id=f'node{i}') for i in range(n)]
+    schedulers[0].register_jobs(now=T0)
+    return schedulers
+
+
+def test_each_run_happens_once_across_instances(local_sb):
+    counter = Counter()
+    a, b = _instances(local_sb, Job('tick', '0 9 * * *', counter))
+    due = T0 + timedelta(minutes=1)
+    assert 'tick' in a.run_pending(now=due)
+    assert b.run_pending(now=due) == {}
+    assert counter.calls == 1
+
+    row = local_sb.table('scheduled_jobs').select('*').eq('job_name', 'tick').single().execute().data
+    assert row['last_status'] == 'success' and row['last_duration_ms'] is not None
+    # Scheduled from when the run finished, so missed slots aren't replayed
+    assert row['next_run_at'] > due.isoformat() and row['next_run_at'].endswith('T09:00:00.000000+00:00')
+
+
+def test_not_run_before_due_or_while_leased(local_sb):
+    counter = Counter()
+    a, b = _instances(local_sb, Job('tick', '0 9 * * *', counter))
+    assert a.run_pending(now=T0) == {}
+    # Another instance holds the lease (e.g. still running)
+    local_sb.table('scheduled_jobs').update({
+        'locked_by': 'node9', 'locked_until': (T0 + timedelta(hours=1)).isoformat()
+    }).eq('job_name', 'tick').execute()
+    assert b.run_pending(now=T0 + timedelta(minutes=1)) == {}
+    assert counter.calls == 0
+
+
+def test_registering_again_keeps_the_schedule(local_sb):
+    a, = _instances(local_sb, Job('tick', '0 9 * * *', Counter()), n=1)
+    a.register_jobs(now=T0 + timedelta(days=3))
+    row = local_sb.table('scheduled_jobs').select('next_run_at').eq('job_name', 'tick').single().execute().data
+    assert row['next_run_at'].startswith('2025-03-14T09:00')
+
+
+def test_runs_are_logged_with_duration(local_sb):
+    a, = _instances(local_sb, Job('boom', '0 9 * * *', Counter(RuntimeError('db down'))), n=1)
+    result = a.run_pending(now=T0 + timedelta(minutes=1))['boom']
+    assert result['success'] is False and 'duration_ms' in result
+    log = local_sb.table('cron_job_logs').select('*').eq('job_name', 'boom').single().execute().data
+    assert log['status'] == 'failed'
+    assert 'db down' in log['response_body']
+    assert log['notes'].startswith('duration_ms=')
+
+
+def test_changed_schedule_is_written_back(local_sb):
+    a, = _instances(local_sb, Job('tick', '0 9 * * *', Counter()), n=1)
+    Scheduler([Job('tick', '30 3 * * *', Counter())], sb=local_sb).register_jobs(now=T0)
+    row = local_sb.table('scheduled_jobs').select('*').eq('job_name', 'tick').single().execute().data
+    assert row['schedule'] == '30 3 * * *'
+    assert row['next_run_at'].startswith('2025-03-15T03:30')
+
+
+def test_incomplete_run_is_resumed_at_the_next_poll(local_sb):
+    counter = Counter({'success': True, 'complete': False})
+    a, b = _instances(local_sb, Job('sweep', '0 0 1 1 *', counter))
+    # The run is stamped with the real finish time, so use real time here
+    now = datetime.now(timezone.utc)
+    local_sb.table('scheduled_jobs').update({'next_run_at': (now - timedelta(minutes=1)).isoformat()}) \
+        .eq('job_name', 'sweep').execute()
+    assert 'sweep' in a.run_pending(now=now)
+    # Due again straight away, for whichever instance polls next
+    assert 'sweep' in b.run_pending(now=datetime.now(timezone.utc) + timedelta(seconds=1))
+    assert counter.calls == 2
+
+
+def test_cleanup_deletes_old_cron_logs(local_sb):
+    now = datetime.now(timezone.utc)
+    local_sb.table('cron_job_logs').insert([
+        {'job_name': 'tick', 'status': 'success', 'execution_time': (now - timedelta(days=400)).isoformat()},
+        {'job_name': 'tick', 'status': 'success', 'execution_time': now.isoformat()},
+    ]).execute()
+    assert cleanup_old_records(local_sb)['logs_deleted'] == 1
+    assert len(local_sb.table('cron_job_logs').select('id').execute().data) == 1
@@ -0,0 +1,68 @@
+import threading
+import types
+import httpx
+import SupabaseClient
+
+
+class FakeClient:
+    def __init__(self):
+        self.postgrest = types.SimpleNamespace(
+            session=httpx.Client(),
+            aclose=lambda: None
+        )
+    def rpc(self, fn, params):
+        raise AssertionError('no RPC round trip expected')
+
+
+def _patch_client(monkeypatch):
+    created = []
+    def fake_create_client(url, key):
+        client = FakeClient()
+        created.append(client)
+        return client
+    monkeypatch.setenv('SUPABASE_URL', 'https://example.supabase.co')
+    monkeypatch.setenv('SUPABASE_ANON_KEY', 'anon-key')
+    monkeypatch.setattr(SupabaseClient, 'create_client', fake_create_client)
+    SupabaseClient.reset_client()
+    return created
+
+
+def test_sb_reuses_one_client(monkeypatch):
+    created = _patch_client(monkeypatch)
+    first = SupabaseClient._sb()
+    second = SupabaseClient._sb()
+    assert first is second
+    assert len(created) == 1
+    SupabaseClient.reset_client()
+
+
+def test_sb_shared_across_threads(monkeypatch):
+    created = _patch_client(monkeypatch)
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(SupabaseClient._sb())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(created) == 1
+    assert all(c is created[0] for c in seen)
+    SupabaseClient.reset_client()
+
+
+def test_audit_user_travels_as_request_header(monkeypatch):
+    created = _patch_client(monkeypatch)
+    SupabaseClient.set_current_user(42)
+    sb = SupabaseClient._sb()
+    hooks = sb.postgrest.session.event_hooks['request']
+    assert SupabaseClient._attach_audit_user in hooks
+
+    request = httpx.Request('GET', 'https://example.supabase.co/rest/v1/users')
+    SupabaseClient._attach_audit_user(request)
+    assert request.headers[SupabaseClient.AUDIT_USER_HEADER] == '42'
+
+    SupabaseClient.set_current_user(None)
+    request = httpx.Request('GET', 'https://example.supabase.co/rest/v1/users')
+    SupabaseClient._attach_audit_user(request)
+    assert SupabaseClient.AUDIT_USER_HEADER not in request.headers
+    assert len(created) == 1
+    SupabaseClient.reset_client()
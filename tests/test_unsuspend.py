@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import LocalBackend
+from QueryMetrics import max_queries
+from UserManagement import check_and_unsuspend_users
+
+
+@pytest.fixture
+def suspensions(local_sb):
+    now = datetime.now(timezone.utc)
+    ends = [now - timedelta(days=3), now - timedelta(hours=1), now - timedelta(minutes=1), now + timedelta(days=2)]
+    for n, end in enumerate(ends):
+        local_sb.table('users').insert({
+            'Username': f'susp{n}', 'PasswordHash': 'x', 'FirstName': f'S{n}', 'LastName': 'User',
+            'Email': f'susp{n}@example.com', 'IsSuspended': True, 'SuspensionEndDate': end.isoformat(),
+            'SuspensionReason': 'Weekend'
+        }).execute()
+    return local_sb
+
+
+def _still_suspended(sb):
+    return [u['Username'] for u in sb.table('users').select('Username').eq('IsSuspended', True).execute().data]
+
+
+def test_expired_suspensions_cleared_in_one_call(suspensions):
+    with max_queries(1, table='rpc:unsuspend_expired_users'):
+        result = check_and_unsuspend_users(sb=suspensions)
+    assert result['success'] and result['unsuspended_count'] == 3
+    assert {u['Name'] for u in result['unsuspended_users']} == {'S0 User', 'S1 User', 'S2 User'}
+    assert all(u['SuspensionEndDate'] for u in result['unsuspended_users'])
+    assert _still_suspended(suspensions) == ['susp3']
+
+
+def test_fallback_without_database_function(suspensions, monkeypatch):
+    monkeypatch.delitem(LocalBackend._RPC_FUNCTIONS, 'unsuspend_expired_users')
+    with max_queries(2, table='users'):
+        result = check_and_unsuspend_users(sb=suspensions)
+    assert result['unsuspended_count'] == 3
+    assert _still_suspended(suspensions) == ['susp3']
+
+
+def test_nothing_to_do(local_sb):
+    result = check_and_unsuspend_users(sb=local_sb)
+    assert result == {'success': True, 'unsuspended_count': 0, 'unsuspended_users': [],
+                      'message': 'Automatically unsuspended 0 users'}
@@ -28,7 +28,7 @@ def test_user_context_propagation():
         set_current_user(test_user_id)
         print(f"✓ Set user context to: {test_user_id}")
         
-        # Get Supabase client (this should set the session variable)
+        # Get Supabase client (requests will carry the X-Audit-User-Id header)
         sb = _sb()
         print("✓ Created Supabase client with user context")
         
@@ -125,6 +125,6 @@ if __name__ == "__main__":
     else:
         print("\n❌ User context propagation needs debugging")
         print("\nTroubleshooting steps:")
-        print("1. Make sure you've run enhanced_audit_with_context.sql")
-        print("2. Verify the RPC function set_audit_user_context exists")
+        print("1. Make sure you've run audit_user_context.sql")
+        print("2. Verify the audit triggers use public.current_audit_user_id()")
         print("3. Check if user ID exists in your users table")
\ No newline at end of file
@@ -0,0 +1,28 @@
+-- Bulk unsuspend
+-- check_and_unsuspend_users (UserManagement.py) calls this through
+-- sb.rpc('unsuspend_expired_users'): one set-based UPDATE clears every
+-- suspension that has ended, instead of one request per user. The rows are
+-- returned with the end date they had, for the response summary.
+
+CREATE OR REPLACE FUNCTION public.unsuspend_expired_users()
+RETURNS TABLE ("UserID" integer, "FirstName" text, "LastName" text, "SuspensionEndDate" timestamp with time zone)
+LANGUAGE sql
+AS $$
+    WITH expired AS (
+        SELECT u."UserID", u."SuspensionEndDate"
+        FROM public.users u
+        WHERE u."IsSuspended" AND u."SuspensionEndDate" <= now()
+        FOR UPDATE
+    )
+    UPDATE public.users u
+    SET "IsSuspended" = false,
+        "SuspensionEndDate" = NULL,
+        "SuspensionReason" = NULL
+    FROM expired e
+    WHERE u."UserID" = e."UserID"
+    RETURNING u."UserID", u."FirstName", u."LastName", e."SuspensionEndDate";
+$$;
+
+-- Suspended users are few; keep the lookup off a full scan of users
+CREATE INDEX IF NOT EXISTS users_suspension_end_idx
+    ON public.users ("SuspensionEndDate") WHERE "IsSuspended";